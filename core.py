@@ -2,6 +2,8 @@
 Shared application state and utilities.
 Imported by route modules to access the WebSocket manager, pending tasks, and caches.
 """
+import asyncio
+import time
 from typing import Dict, Set, Optional
 from pathlib import Path
 
@@ -79,6 +81,30 @@ facebook_upload_status: Dict[str, dict] = {}
 effects_render_status: Dict[str, dict] = {}
 
 
+# =============================================================================
+# Event Loop Watchdog
+# =============================================================================
+
+# Blocking calls inside coroutines stall every WebSocket update and request
+loop_lag_stats: Dict[str, float] = {"max_lag_ms": 0.0, "stalls": 0, "last_stall_ms": 0.0}
+
+
+async def monitor_event_loop(interval: float = 0.1, threshold_ms: float = 250.0):
+    """
+    Sleep in short ticks and measure how late each wake-up is. A late wake-up
+    means something ran on the loop without yielding for that long.
+    """
+    while True:
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lag_ms = (time.perf_counter() - started - interval) * 1000
+        loop_lag_stats["max_lag_ms"] = max(loop_lag_stats["max_lag_ms"], round(lag_ms, 1))
+        if lag_ms > threshold_ms:
+            loop_lag_stats["stalls"] += 1
+            loop_lag_stats["last_stall_ms"] = round(lag_ms, 1)
+            print(f"[LOOP WARNING] Event loop blocked for {lag_ms:.0f} ms")
+
+
 # =============================================================================
 # Shared Helpers
 # =============================================================================
@@ -111,3 +137,18 @@ def url_to_local_path(url_or_path: str) -> str:
     if s.startswith("/outputs/"):
         return str(OUTPUTS_DIR / s[len("/outputs/"):])
     return s
+
+
+def input_video_path(file_id: str) -> Optional[Path]:
+    """
+    inputs/{file_id} (".mp4" added when the id has no suffix) for an id sent by
+    a client. None for anything that is not a plain file name inside inputs/.
+    """
+    from utils.config import INPUTS_DIR
+
+    if not file_id or Path(file_id).name != file_id or file_id in (".", ".."):
+        return None
+    path = (INPUTS_DIR / (file_id if Path(file_id).suffix else f"{file_id}.mp4")).resolve()
+    if path.parent != INPUTS_DIR.resolve():
+        return None
+    return path
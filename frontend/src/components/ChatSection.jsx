@@ -4,6 +4,7 @@
  */
 import { useState, useRef, useEffect, useContext } from 'react';
 import { VideoEditorContext, MAX_HISTORY_LENGTH } from './VideoEditorContext';
+import { appendVideoToForm } from './resumableUpload';
 
 function ChatSection({ isInTab = false }) {
   const ctx = useContext(VideoEditorContext);
@@ -336,7 +337,12 @@ function ChatSection({ isInTab = false }) {
 
       try {
         const formData = new FormData();
-        formData.append('video', ctx.videoFile);
+        await appendVideoToForm(apiUrl, formData, ctx.videoFile, {
+          onError: (err) => {
+            ctx.setIsProcessing(false);
+            addMessage('assistant', `❌ העלאת הסרטון נכשלה: ${err.message}`);
+          },
+        });
 
         // Subtitles options - CRITICAL: Always enable by default
         const doSubtitles = opts.doSubtitles ?? action.subtitles ?? true;
@@ -484,6 +490,8 @@ function ChatSection({ isInTab = false }) {
                 isActive: true,
                 entries: subtitles,
                 pendingFileId: fileId,
+                version: msgData.version ?? 0,
+                preview: msgData.preview || null,
               };
               console.log('[ChatSection] Setting subtitleReview:', subtitles.length, 'entries for', fileId);
 
@@ -5,6 +5,7 @@
  */
 import { useState, useContext, useEffect, useRef } from 'react';
 import { VideoEditorContext } from './VideoEditorContext';
+import { appendVideoToForm } from './resumableUpload';
 
 // =============================================================================
 // THE ULTIMATE FONT-STYLE & COLOR MAP
@@ -512,7 +513,12 @@ function ManualEditor() {
 
     try {
       const formData = new FormData();
-      formData.append('video', ctx.videoFile);
+      await appendVideoToForm(apiUrl, formData, ctx.videoFile, {
+        onError: (err) => {
+          ctx.setIsProcessing(false);
+          setProcessError(`העלאת הסרטון נכשלה: ${err.message}`);
+        },
+      });
 
       // Subtitles
       const doSubtitles = opts.doSubtitles ?? true;
@@ -602,6 +608,8 @@ function ManualEditor() {
                 isActive: true,
                 entries: subtitles,
                 pendingFileId: data.file_id,
+                version: msg.version ?? 0,
+                preview: msg.preview || null,
               });
             }
             ctx.setIsProcessing(false);
@@ -3,6 +3,15 @@
  *
  * Collapsed = inline notification bar in the editor flow.
  * Expanded  = FIXED full-screen overlay (z-[9999]) so no parent can clip it.
+ *
+ * The preview plays the original video with a styled WebVTT track built from
+ * the saved SRT - no burn-in render while reviewing. Local edits update the
+ * matching cues in place.
+ *
+ * Edits are saved as line-level PATCHes against the version the review started
+ * from. If the subtitles changed meanwhile (409), the edits are replayed on the
+ * server's current lines; lines that were changed on both sides are shown to
+ * the user instead of being overwritten.
  */
 import { useState, useContext, useEffect, useRef } from 'react';
 import { VideoEditorContext } from './VideoEditorContext';
@@ -14,6 +23,34 @@ function formatTime(seconds) {
   return `${m.toString().padStart(2, '0')}:${s.toString().padStart(2, '0')}`;
 }
 
+const MAX_SAVE_ATTEMPTS = 3;
+
+/**
+ * Replay the text edits made on `base` on top of the server's `current` lines.
+ * Lines are matched by their timing. A line whose text also changed on the
+ * server (or that is gone there) is a conflict and is not edited.
+ * Returns { edits, merged, conflicts } - merged = current + the replayed edits.
+ */
+function rebaseEdits(base, local, current) {
+  const merged = current.map(entry => ({ ...entry }));
+  const edits = [];
+  const conflicts = [];
+  local.forEach((entry, i) => {
+    const original = base[i];
+    if (!original || entry.text === original.text) return;
+    const index = current.findIndex(line => line.start === original.start && line.end === original.end);
+    const theirs = index >= 0 ? current[index].text : null;
+    if (theirs === entry.text) return;
+    if (theirs === original.text) {
+      merged[index].text = entry.text;
+      edits.push({ op: 'update', index, text: entry.text });
+    } else {
+      conflicts.push({ index, start: original.start, mine: entry.text, theirs });
+    }
+  });
+  return { edits, merged, conflicts };
+}
+
 function SubtitleReviewPanel() {
   const ctx = useContext(VideoEditorContext);
   const subtitleReview = ctx?.subtitleReview || { isActive: false, entries: [], pendingFileId: null };
@@ -24,7 +61,9 @@ function SubtitleReviewPanel() {
   const [localEntries, setLocalEntries] = useState([]);
   const [isSubmitting, setIsSubmitting] = useState(false);
   const [hasChanges, setHasChanges] = useState(false);
+  const [conflicts, setConflicts] = useState([]);
   const prevIsActive = useRef(false);
+  const videoRef = useRef(null);
 
   // === MOUNT / ACTIVATION LOG ===
   useEffect(() => {
@@ -47,12 +86,14 @@ function SubtitleReviewPanel() {
       console.log('[SubtitleReviewPanel] NEW session -', subtitleReview.entries.length, 'entries');
       setLocalEntries([...subtitleReview.entries]);
       setHasChanges(false);
+      setConflicts([]);
       setIsExpanded(false);
     }
     if (!subtitleReview.isActive) {
       setIsExpanded(false);
       setLocalEntries([]);
       setHasChanges(false);
+      setConflicts([]);
     }
   }, [subtitleReview.isActive, subtitleReview.entries]);
 
@@ -72,13 +113,29 @@ function SubtitleReviewPanel() {
     updated[index] = { ...updated[index], text: newText };
     setLocalEntries(updated);
     setHasChanges(true);
+
+    // Reflect the edit in the preview track without reloading it
+    const track = videoRef.current?.textTracks?.[0];
+    const cue = track?.cues?.[index];
+    if (cue) cue.text = newText;
+  };
+
+  const seekPreview = (seconds) => {
+    if (videoRef.current && typeof seconds === 'number') {
+      videoRef.current.currentTime = seconds;
+    }
   };
 
-  const resetAndResume = () => {
+  const resolveConflict = (conflict, useMine) => {
+    if (useMine && conflict.index >= 0) updateEntry(conflict.index, conflict.mine);
+    setConflicts(prev => prev.filter(c => c !== conflict));
+  };
+
+  const resetAndResume = (version = subtitleReview.version) => {
     if (typeof setSubtitleReview === 'function') {
       // Preserve entries + fileId for other tabs (Effects Studio etc.) - only dismiss the panel
       const finalEntries = localEntries.length > 0 ? localEntries : (subtitleReview.entries || []);
-      setSubtitleReview({ isActive: false, entries: finalEntries, pendingFileId: subtitleReview.pendingFileId });
+      setSubtitleReview({ isActive: false, entries: finalEntries, pendingFileId: subtitleReview.pendingFileId, version, preview: subtitleReview.preview });
     }
     setIsExpanded(false);
     setLocalEntries([]);
@@ -105,16 +162,47 @@ function SubtitleReviewPanel() {
     if (!fileId) return;
     setIsSubmitting(true);
     try {
+      let version = subtitleReview.version ?? 0;
       if (hasChanges && localEntries.length > 0) {
-        const saveRes = await fetch(`${apiUrl}/update-subtitles/${fileId}`, {
-          method: 'POST',
-          headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ subtitles: localEntries }),
-        });
-        if (!saveRes.ok) throw new Error('Save failed: ' + await saveRes.text());
+        // Send only the edited lines; the server marks just those ranges stale
+        const base = subtitleReview.entries || [];
+        let edits = localEntries
+          .map((entry, index) => ({ op: 'update', index, text: entry.text }))
+          .filter(edit => edit.text !== base[edit.index]?.text);
+        for (let attempt = 1; edits.length > 0; attempt++) {
+          const saveRes = await fetch(`${apiUrl}/subtitles/${fileId}`, {
+            method: 'PATCH',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ version, edits }),
+          });
+          if (saveRes.ok) {
+            version = (await saveRes.json()).version;
+            break;
+          }
+          if (saveRes.status !== 409) throw new Error('Save failed: ' + await saveRes.text());
+          if (attempt >= MAX_SAVE_ATTEMPTS) throw new Error('הכתוביות משתנות כרגע במקום אחר - נסה שוב');
+
+          // Edited elsewhere meanwhile - replay our edits on the current lines
+          const currentRes = await fetch(`${apiUrl}/subtitles/${fileId}`);
+          if (!currentRes.ok) throw new Error('Reload failed: ' + await currentRes.text());
+          const current = await currentRes.json();
+          const rebased = rebaseEdits(base, localEntries, current.subtitles);
+          if (rebased.conflicts.length > 0) {
+            // Same lines changed on both sides - let the user decide, save nothing
+            if (typeof setSubtitleReview === 'function') {
+              setSubtitleReview({ ...subtitleReview, entries: current.subtitles, version: current.version });
+            }
+            setLocalEntries(rebased.merged);
+            setConflicts(rebased.conflicts);
+            setIsExpanded(true);
+            return;
+          }
+          version = current.version;
+          edits = rebased.edits;
+        }
       }
       const res = await fetch(`${apiUrl}/continue-processing/${fileId}`, { method: 'POST' });
-      if (res.ok) resetAndResume();
+      if (res.ok) resetAndResume(version);
       else throw new Error('Continue failed: ' + await res.text());
     } catch (e) { alert('שגיאה: ' + e.message); }
     finally { setIsSubmitting(false); }
@@ -186,6 +274,61 @@ function SubtitleReviewPanel() {
           </button>
         </div>
 
+        {/* Conflicts - lines edited elsewhere since this review started */}
+        {conflicts.length > 0 && (
+          <div className="px-6 py-3 border-b border-amber-500/40 bg-amber-500/10 shrink-0 space-y-2" dir="rtl">
+            <p className="text-sm text-amber-300">
+              הכתוביות נערכו במקביל במקום אחר. השורות הבאות שונו בשני המקומות - בחר איזו גרסה לשמור:
+            </p>
+            {conflicts.map((conflict, i) => (
+              <div key={i} className="flex flex-col gap-1 p-2 bg-[#252830] rounded-lg text-sm">
+                <span className="text-xs text-gray-400 font-mono">
+                  {conflict.index >= 0 ? `שורה ${conflict.index + 1}` : 'שורה שנמחקה'} · {formatTime(conflict.start)}
+                </span>
+                <span className="text-gray-200">שלך: {conflict.mine}</span>
+                <span className="text-gray-400">בשרת: {conflict.theirs ?? '(נמחקה)'}</span>
+                <div className="flex gap-2">
+                  {conflict.index >= 0 && (
+                    <button
+                      onClick={() => resolveConflict(conflict, true)}
+                      className="px-3 py-1 bg-[#00C8C8] text-black rounded text-xs font-semibold hover:bg-[#00B0B0]"
+                    >
+                      השתמש בשלי
+                    </button>
+                  )}
+                  <button
+                    onClick={() => resolveConflict(conflict, false)}
+                    className="px-3 py-1 bg-[#2a2d38] text-gray-200 rounded text-xs hover:bg-[#3a3d48]"
+                  >
+                    השאר את הגרסה מהשרת
+                  </button>
+                </div>
+              </div>
+            ))}
+          </div>
+        )}
+
+        {/* Preview - original video with the caption track, nothing burned in */}
+        {subtitleReview.preview?.video_url && (
+          <div className="bg-black shrink-0 flex justify-center">
+            <video
+              ref={videoRef}
+              src={subtitleReview.preview.video_url}
+              controls
+              crossOrigin="anonymous"
+              className="max-h-[35vh] w-full"
+            >
+              <track
+                kind="subtitles"
+                srcLang="he"
+                label="עברית"
+                src={`${subtitleReview.preview.vtt_url}?v=${subtitleReview.version ?? 0}`}
+                default
+              />
+            </video>
+          </div>
+        )}
+
         {/* Subtitle entries - scrollable */}
         <div className="flex-1 overflow-y-auto p-4 space-y-2 bg-[#1a1c24]">
           {entries.length === 0 ? (
@@ -202,9 +345,13 @@ function SubtitleReviewPanel() {
                 <span className="flex-shrink-0 w-8 text-center text-xs text-gray-500 font-mono">
                   {i + 1}
                 </span>
-                <span className="flex-shrink-0 w-14 text-xs text-[#00C8C8] font-mono">
+                <button
+                  type="button"
+                  onClick={() => seekPreview(entry.start)}
+                  className="flex-shrink-0 w-14 text-xs text-[#00C8C8] font-mono text-left hover:underline"
+                >
                   {formatTime(entry.start)}
-                </span>
+                </button>
                 <input
                   type="text"
                   value={entry.text || ''}
@@ -241,7 +388,7 @@ function SubtitleReviewPanel() {
             </button>
             <button
               onClick={handleConfirm}
-              disabled={isSubmitting}
+              disabled={isSubmitting || conflicts.length > 0}
               className="px-6 py-2.5 bg-[#00C8C8] text-black font-semibold rounded-lg text-sm
                          hover:bg-[#00B0B0] active:bg-[#009999] transition-all
                          disabled:opacity-50 disabled:cursor-not-allowed"
@@ -0,0 +1,89 @@
+/**
+ * Resumable chunked upload against /uploads (see routes/uploads.py).
+ *
+ * startResumableUpload() creates the upload and returns its id right away, so
+ * /process can be called with upload_id while the bytes are still going up.
+ * Chunks that fail are retried from the server's offset (HEAD /uploads/{id}).
+ */
+
+const CHUNK_SIZE = 8 * 1024 * 1024;
+const MAX_RETRIES = 5;
+
+const sleep = (ms) => new Promise((resolve) => setTimeout(resolve, ms));
+
+async function serverOffset(apiUrl, uploadId) {
+  const response = await fetch(`${apiUrl}/uploads/${uploadId}`, { method: 'HEAD' });
+  if (!response.ok) throw new Error(`Upload ${uploadId} not found`);
+  return Number(response.headers.get('Upload-Offset') || 0);
+}
+
+async function sendChunks(apiUrl, uploadId, file, onProgress) {
+  let offset = 0;
+  let retries = 0;
+
+  while (offset < file.size) {
+    const chunk = file.slice(offset, offset + CHUNK_SIZE);
+    try {
+      const response = await fetch(`${apiUrl}/uploads/${uploadId}`, {
+        method: 'PATCH',
+        headers: {
+          'Upload-Offset': String(offset),
+          'Content-Type': 'application/offset+octet-stream',
+        },
+        body: chunk,
+      });
+      if (response.status === 409) {
+        const data = await response.json();
+        offset = data.detail?.offset ?? await serverOffset(apiUrl, uploadId);
+        continue;
+      }
+      if (!response.ok) throw new Error(`Chunk upload failed (${response.status})`);
+      offset = Number(response.headers.get('Upload-Offset') || offset + chunk.size);
+      retries = 0;
+      if (onProgress) onProgress(Math.round((offset / file.size) * 100));
+    } catch (err) {
+      if (++retries > MAX_RETRIES) throw err;
+      console.warn(`[Upload] ${err.message} - resuming (attempt ${retries})`);
+      await sleep(1000 * retries);
+      offset = await serverOffset(apiUrl, uploadId).catch(() => offset);
+    }
+  }
+}
+
+/**
+ * Returns { uploadId, done } - `done` resolves when the last chunk is stored.
+ * If the upload fails for good it is deleted on the server, so a job queued
+ * on it fails right away instead of waiting, and `done` rejects.
+ * Throws if the server refuses the upload (caller can fall back to multipart).
+ */
+export async function startResumableUpload(apiUrl, file, onProgress) {
+  const response = await fetch(`${apiUrl}/uploads`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ length: file.size, filename: file.name || 'video.mp4' }),
+  });
+  if (!response.ok) throw new Error(`Could not start upload (${response.status})`);
+  const { upload_id: uploadId } = await response.json();
+
+  const done = sendChunks(apiUrl, uploadId, file, onProgress).catch(async (err) => {
+    console.error('[Upload] Resumable upload failed:', err);
+    await fetch(`${apiUrl}/uploads/${uploadId}`, { method: 'DELETE' }).catch(() => {});
+    throw err;
+  });
+  return { uploadId, done };
+}
+
+/**
+ * Add the video to a /process form: upload_id when the resumable upload starts,
+ * the file otherwise. `onError` is called if the upload later fails.
+ */
+export async function appendVideoToForm(apiUrl, formData, file, { onProgress, onError } = {}) {
+  try {
+    const { uploadId, done } = await startResumableUpload(apiUrl, file, onProgress);
+    done.catch((err) => onError && onError(err));
+    formData.append('upload_id', uploadId);
+  } catch (err) {
+    console.warn('[Upload] Falling back to single-request upload:', err.message);
+    formData.append('video', file);
+  }
+}
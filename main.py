@@ -56,6 +56,7 @@ Main entry point. Routes are organized in the routes/ package.
 from utils.helpers import setup_ssl_bypass
 setup_ssl_bypass()
 
+import asyncio
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
@@ -66,10 +67,14 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from utils.config import INPUTS_DIR, OUTPUTS_DIR
+from utils.config import INPUTS_DIR, OUTPUTS_DIR, MUSIC_DIR, EVENT_LOOP_BLOCK_WARN_MS
+from core import monitor_event_loop
+from services.audio_service import warm_music_library
+from utils.llm_clients import warm_llm_clients
 
 # Import route modules
 from routes.video import router as video_router
+from routes.uploads import router as uploads_router
 from routes.media import router as media_router
 from routes.marketing import router as marketing_router
 from routes.library import router as library_router
@@ -99,7 +104,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
-    expose_headers=["Content-Length", "Content-Range", "Content-Disposition"],
+    expose_headers=["Content-Length", "Content-Range", "Content-Disposition", "Upload-Offset", "Upload-Length", "Location"],
     max_age=3600,
 )
 
@@ -132,6 +137,7 @@ app.mount("/assets", StaticFiles(directory="assets"), name="assets")
 # =============================================================================
 
 app.include_router(video_router)
+app.include_router(uploads_router)
 app.include_router(media_router)
 app.include_router(marketing_router)
 app.include_router(library_router)
@@ -144,6 +150,28 @@ app.include_router(settings_router)
 app.include_router(landing_router)
 
 
+# =============================================================================
+# Startup
+# =============================================================================
+
+@app.on_event("startup")
+async def warm_music_index():
+    """Index the music library once so requests never glob the directory."""
+    warm_music_library(str(MUSIC_DIR))
+
+
+@app.on_event("startup")
+async def start_loop_watchdog():
+    """Warn when a blocking call stalls the event loop."""
+    asyncio.create_task(monitor_event_loop(threshold_ms=EVENT_LOOP_BLOCK_WARN_MS))
+
+
+@app.on_event("startup")
+async def warm_llm_providers():
+    """Create shared LLM clients and open their connections ahead of the first request."""
+    warm_llm_clients()
+
+
 # =============================================================================
 # Entry Point
 # =============================================================================
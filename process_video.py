@@ -910,7 +910,8 @@ def prepare_hebrew_text(text):
 def extract_text_from_video_ocr(video_path, progress_callback=None):
     """
     Extract text from video frames using Tesseract OCR (for videos without audio).
-    Samples the bottom portion of frames every 2 seconds where subtitles typically appear.
+    Delegates to services.ocr_service, which decodes only the sampled frames,
+    skips unchanged subtitle bands and runs Tesseract in a process pool.
 
     Args:
         video_path: Path to video file
@@ -919,111 +920,8 @@ def extract_text_from_video_ocr(video_path, progress_callback=None):
     Returns:
         tuple: (extracted_text, list of dict entries with 'start', 'end', 'text' keys)
     """
-    if progress_callback:
-        progress_callback(0, "סורק כתוביות מהמסך (OCR)...")
-
-    print(f"[INFO] Starting OCR extraction from video: {video_path}")
-
-    try:
-        cap = cv2.VideoCapture(str(video_path))
-
-        if not cap.isOpened():
-            print(f"[ERROR] Could not open video: {video_path}")
-            return "", []
-
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        duration = total_frames / fps if fps > 0 else 0
-
-        print(f"[INFO] Video: {duration:.1f}s, {fps:.1f} FPS, {total_frames} frames")
-
-        # Sample every 2 seconds
-        sample_interval = 2.0
-        segment_duration = 3.0  # Default subtitle duration
-        frame_interval = int(fps * sample_interval)
-
-        extracted_entries = []  # List of dicts with start, end, text
-        seen_texts = set()  # To avoid duplicates
-
-        frame_num = 0
-        samples_taken = 0
-        total_samples = int(duration / sample_interval) + 1
-
-        while True:
-            ret, frame = cap.read()
-            if not ret:
-                break
-
-            # Only process every frame_interval frames
-            if frame_num % frame_interval == 0:
-                current_time = frame_num / fps
-
-                if progress_callback:
-                    pct = int((samples_taken / max(total_samples, 1)) * 80)
-                    progress_callback(pct, f"סורק פריים {samples_taken + 1}/{total_samples}...")
-
-                # Get frame dimensions
-                height, width = frame.shape[:2]
-
-                # Crop to bottom 25% where subtitles usually appear
-                subtitle_region = frame[int(height * 0.75):height, :]
-
-                # Convert to grayscale for better OCR
-                gray = cv2.cvtColor(subtitle_region, cv2.COLOR_BGR2GRAY)
-
-                # Apply threshold to get black text on white background
-                # Try both normal and inverted for different subtitle colors
-                _, thresh = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY)
-                _, thresh_inv = cv2.threshold(gray, 150, 255, cv2.THRESH_BINARY_INV)
-
-                # Try OCR on both versions
-                text1 = pytesseract.image_to_string(thresh, lang='heb+eng', config='--psm 6')
-                text2 = pytesseract.image_to_string(thresh_inv, lang='heb+eng', config='--psm 6')
-
-                # Use the one with more content
-                text = text1 if len(text1.strip()) > len(text2.strip()) else text2
-
-                # Clean the text
-                text = text.strip()
-                text = re.sub(r'\s+', ' ', text)  # Normalize whitespace
-                text = re.sub(r'[^\w\s\u0590-\u05FF.,!?\'\"()-]', '', text)  # Keep Hebrew, English, punctuation
-
-                # Only add if text is meaningful (at least 3 chars) and not a duplicate
-                if len(text) >= 3:
-                    # Create a normalized version for duplicate detection
-                    normalized = text.lower().strip()
-                    if normalized not in seen_texts:
-                        seen_texts.add(normalized)
-                        # Use new dict format (same as Gemini function)
-                        extracted_entries.append({
-                            'start': current_time,
-                            'end': min(current_time + segment_duration, duration),
-                            'text': text
-                        })
-                        print(f"[OCR] {current_time:.1f}s: {text[:50]}...")
-
-                samples_taken += 1
-
-            frame_num += 1
-
-        cap.release()
-
-        if progress_callback:
-            progress_callback(85, "מעבד טקסט שחולץ...")
-
-        # Combine all unique texts into one string (using dict format)
-        all_text = ' '.join([entry['text'] for entry in extracted_entries])
-
-        print(f"[SUCCESS] OCR extracted {len(extracted_entries)} unique text segments")
-        print(f"[INFO] Total text length: {len(all_text)} chars")
-
-        return all_text, extracted_entries
-
-    except Exception as e:
-        print(f"[ERROR] OCR extraction failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return "", []
+    from services.ocr_service import extract_text_from_video_ocr as run_ocr
+    return run_ocr(str(video_path), progress_callback)
 
 
 def fix_subtitles_with_ai(srt_path, progress_callback=None):
@@ -2258,38 +2156,9 @@ def parse_srt_file(srt_path):
     Parse SRT file and return list of subtitle entries.
     Each entry: {'index': int, 'start': float, 'end': float, 'text': str}
     """
-    entries = []
+    from utils.subtitles import SubtitleTrack
     try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Split by double newlines (subtitle blocks)
-        blocks = re.split(r'\n\n+', content.strip())
-
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                try:
-                    index = int(lines[0])
-                    # Parse timing line: 00:00:01,000 --> 00:00:04,500
-                    timing_match = re.match(
-                        r'(\d{2}):(\d{2}):(\d{2}),(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}),(\d{3})',
-                        lines[1]
-                    )
-                    if timing_match:
-                        g = timing_match.groups()
-                        start = int(g[0])*3600 + int(g[1])*60 + int(g[2]) + int(g[3])/1000
-                        end = int(g[4])*3600 + int(g[5])*60 + int(g[6]) + int(g[7])/1000
-                        text = ' '.join(lines[2:]).strip()
-                        entries.append({
-                            'index': index,
-                            'start': start,
-                            'end': end,
-                            'text': text
-                        })
-                except (ValueError, IndexError):
-                    continue
-
+        entries = SubtitleTrack.from_file(srt_path).to_entries()
         print(f"[INFO] Parsed {len(entries)} subtitle entries from SRT")
         return entries
 
@@ -2420,11 +2289,8 @@ def write_srt_from_entries(entries, output_path):
     """
     Write SRT file from cleaned entries.
     """
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for i, entry in enumerate(entries, 1):
-            start_str = format_srt_time(entry['start'])
-            end_str = format_srt_time(entry['end'])
-            f.write(f"{i}\n{start_str} --> {end_str}\n{entry['text']}\n\n")
+    from utils.subtitles import SubtitleTrack
+    SubtitleTrack.from_entries(entries).write_srt(output_path)
     print(f"[INFO] Written {len(entries)} entries to {output_path}")
 
 
@@ -21,6 +21,7 @@ export interface EffectsCompositionProps {
 	// Video
 	videoSrc: string;
 	useOffthreadVideo?: boolean;
+	videoStartFrom?: number;  // Trim start in frames (lyrics are already relative to it)
 
 	// Lyrics / Subtitles
 	lyrics: LyricsData;
@@ -53,6 +54,7 @@ export interface EffectsCompositionProps {
 export const EffectsComposition: React.FC<EffectsCompositionProps> = ({
 	videoSrc,
 	useOffthreadVideo = true,
+	videoStartFrom = 0,
 	lyrics,
 	subtitleStyle = 'karaoke',
 	fontSize = 56,
@@ -94,6 +96,7 @@ export const EffectsComposition: React.FC<EffectsCompositionProps> = ({
 						{videoSrc && (
 							<VideoComponent
 								src={videoSrc}
+								startFrom={videoStartFrom}
 								style={{ width: '100%', height: '100%', objectFit: 'cover' }}
 							/>
 						)}
@@ -1,14 +1,16 @@
 """
 AI Editor Chat route — multi-intent styling commands via Groq LLM.
 """
+import asyncio
 import json
 import re
 
 from fastapi import APIRouter, Form, HTTPException
-from groq import Groq
 
 from services.audio_service import list_music_library
 from utils.config import GROQ_API_KEY, MUSIC_DIR
+from utils.llm_clients import get_groq_client
+from utils.llm_scheduler import PRIORITY_INTERACTIVE, run_llm_call, estimate_tokens
 
 router = APIRouter()
 
@@ -113,9 +115,17 @@ async def ai_editor_chat(
             messages.append({"role": msg.get("role", "user"), "content": msg.get("content", "")})
         messages.append({"role": "user", "content": message})
 
-        client = Groq(api_key=GROQ_API_KEY)
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile", messages=messages, temperature=0.7, max_tokens=500,
+        # Groq call (and any rate-limit wait) runs off the event loop
+        loop = asyncio.get_event_loop()
+        response = await loop.run_in_executor(
+            None, lambda: run_llm_call(
+                "groq", lambda: get_groq_client().chat.completions.create(
+                    model="llama-3.3-70b-versatile", messages=messages, temperature=0.7, max_tokens=500,
+                ),
+                priority=PRIORITY_INTERACTIVE,
+                estimated_tokens=estimate_tokens(messages, 500),
+                hedge=True,
+            ),
         )
 
         ai_response = response.choices[0].message.content.strip()
@@ -9,6 +9,7 @@ from fastapi import APIRouter, BackgroundTasks
 from pydantic import BaseModel
 
 from core import effects_render_status, url_to_local_path
+from services.proxy_service import source_for
 from services.remotion_render_service import render_effects_video
 from utils.config import INPUTS_DIR, OUTPUTS_DIR
 
@@ -86,6 +87,10 @@ async def render_effects(req: EffectsRenderRequest, background_tasks: Background
                 candidates.sort(key=lambda f: f.stat().st_mtime, reverse=True)
                 video_path = str(candidates[0])
 
+        # Normalized mezzanine of an upload, if normalization produced one
+        if video_path:
+            video_path = source_for(video_path)
+
         # Find SRT
         if video_path:
             base = Path(video_path).stem
@@ -7,7 +7,7 @@ from pathlib import Path
 
 from fastapi import APIRouter, Form, HTTPException
 
-from core import marketing_cache
+from core import marketing_cache, parse_bool
 from services.audio_service import transcribe_with_groq
 from services.video_service import (
     get_video_duration,
@@ -24,7 +24,7 @@ router = APIRouter()
 
 
 @router.post("/generate-marketing-text")
-async def generate_marketing_text(video_id: str = Form(...)):
+async def generate_marketing_text(video_id: str = Form(...), regenerate: str = Form("false")):
     """Generate marketing text content: titles, description, tags, viral moments."""
     v_path = INPUTS_DIR / video_id
     file_id = video_id.split('.')[0]
@@ -38,6 +38,7 @@ async def generate_marketing_text(video_id: str = Form(...)):
         has_audio = check_video_has_audio(str(v_path))
         loop = asyncio.get_event_loop()
         transcript_text = ""
+        srt_path = None
 
         if has_audio:
             srt_path = OUTPUTS_DIR / f"{file_id}_marketing.srt"
@@ -53,7 +54,10 @@ async def generate_marketing_text(video_id: str = Form(...)):
             transcript_text = "סרטון ללא מלל מזוהה"
 
         marketing_data = await loop.run_in_executor(
-            None, lambda: generate_marketing_kit(transcript_text, video_duration, None)
+            None, lambda: generate_marketing_kit(
+                transcript_text, video_duration, None, bypass_cache=parse_bool(regenerate),
+                srt_path=str(srt_path) if srt_path else None
+            )
         )
 
         if not marketing_data:
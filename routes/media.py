@@ -12,9 +12,11 @@ from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from pydantic import BaseModel
 
 from services.audio_service import (
-    generate_voiceover_sync,
+    generate_voiceover,
     generate_voiceover_elevenlabs_sync,
+    get_elevenlabs_metrics,
     list_music_library,
+    analyze_music_track,
     download_audio_from_url,
 )
 from services.text_service import extract_text_from_file
@@ -88,6 +90,7 @@ async def download_yt_audio(url: str = Form(...)):
 
         loop = asyncio.get_event_loop()
         await loop.run_in_executor(None, _do_download)
+        await loop.run_in_executor(None, analyze_music_track, file_path)
 
         return {
             "status": "success",
@@ -191,7 +194,7 @@ async def generate_voiceover_endpoint(video_id: str = Form(...), text: str = For
     """Generate voiceover using Edge-TTS (free)."""
     output_path = OUTPUTS_DIR / f"{video_id}_voiceover.mp3"
     try:
-        success = generate_voiceover_sync(text, str(output_path), None)
+        success = await generate_voiceover(text, str(output_path), None)
         if success and output_path.exists():
             return {"status": "success", "voiceover_url": f"{SERVER_BASE_URL}/outputs/{output_path.name}"}
         raise HTTPException(status_code=500, detail="Failed to generate voiceover")
@@ -210,17 +213,30 @@ async def generate_voiceover_elevenlabs_endpoint(
         file_id = str(uuid.uuid4())[:8]
         output_path = OUTPUTS_DIR / f"{file_id}_elevenlabs_voiceover.mp3"
 
-        success = generate_voiceover_elevenlabs_sync(
-            text=text, output_path=str(output_path), emotion=emotion, voice_id=voice_id
+        loop = asyncio.get_event_loop()
+        success, ttfa_ms = await loop.run_in_executor(
+            None, lambda: generate_voiceover_elevenlabs_sync(
+                text=text, output_path=str(output_path), emotion=emotion, voice_id=voice_id
+            )
         )
 
         if success and output_path.exists():
-            return {"status": "success", "voiceover_url": f"{SERVER_BASE_URL}/outputs/{output_path.name}"}
+            return {
+                "status": "success",
+                "voiceover_url": f"{SERVER_BASE_URL}/outputs/{output_path.name}",
+                "time_to_first_audio_ms": round(ttfa_ms, 1),
+            }
         raise HTTPException(status_code=500, detail="Failed to generate voiceover")
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/voiceover-metrics")
+async def get_voiceover_metrics():
+    """Get ElevenLabs latency metrics (time-to-first-audio)."""
+    return {"status": "success", "elevenlabs": get_elevenlabs_metrics()}
+
+
 # =============================================================================
 # Text Extraction & Music Library
 # =============================================================================
@@ -1,11 +1,20 @@
 """
 Settings routes — frontend settings sync and health check.
 """
+import asyncio
+from pathlib import Path
 from typing import Optional
 
 from fastapi import APIRouter
 from pydantic import BaseModel
 
+from core import loop_lag_stats, input_video_path
+from services.font_service import ensure_font_available
+from services.video_service import render_subtitle_style_preview
+from utils.config import OUTPUTS_DIR, SERVER_BASE_URL
+from utils.llm_cache import get_llm_cache_stats
+from utils.llm_scheduler import get_llm_scheduler_stats
+
 router = APIRouter()
 
 
@@ -16,6 +25,8 @@ class UpdateSettingsRequest(BaseModel):
     fontSize: Optional[int] = None
     subtitleText: Optional[str] = None
     timestamp: Optional[int] = None
+    fileId: Optional[str] = None  # With a style change, a preview frame of this video is returned
+    previewTime: Optional[float] = None
 
 
 @router.post("/update-settings")
@@ -23,10 +34,40 @@ async def update_settings(request: UpdateSettingsRequest):
     """Receive font/style settings from frontend."""
     settings_dict = request.model_dump(exclude_none=True)
     print(f"[SETTINGS] Received: {settings_dict}")
-    return {"status": "success", "message": "Settings received", "received": settings_dict}
+    response = {"status": "success", "message": "Settings received", "received": settings_dict}
+
+    style_changed = request.font or request.fontColor or request.fontSize
+    if request.fileId and style_changed:
+        v_path = input_video_path(request.fileId)
+        if v_path and v_path.exists():
+            loop = asyncio.get_event_loop()
+            font_name = await loop.run_in_executor(None, ensure_font_available, request.font or "Arial")
+            preview_path = await loop.run_in_executor(
+                None, lambda: render_subtitle_style_preview(
+                    str(v_path), request.previewTime or 0.0, font_name,
+                    request.fontColor or "#FFFFFF", request.fontSize or 24,
+                    str(OUTPUTS_DIR / f"{v_path.stem}.srt"), request.subtitleText
+                )
+            )
+            if preview_path:
+                response["preview_url"] = f"{SERVER_BASE_URL}/outputs/previews/{Path(preview_path).name}"
+
+    return response
+
+
+@router.get("/llm-cache-stats")
+async def llm_cache_stats():
+    """LLM response cache hit/miss counters and size."""
+    return {"status": "success", **get_llm_cache_stats()}
+
+
+@router.get("/llm-scheduler-stats")
+async def llm_scheduler_stats():
+    """Per-provider throttle, retry and hedge counters for outbound AI calls."""
+    return {"status": "success", "providers": get_llm_scheduler_stats()}
 
 
 @router.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "ok", "version": "2.0.0"}
+    return {"status": "ok", "version": "2.0.0", "event_loop": loop_lag_stats}
@@ -0,0 +1,116 @@
+"""
+Resumable upload routes — tus-style chunked uploads with offset queries.
+
+    POST   /uploads              {"length", "filename"} -> upload_id
+    HEAD   /uploads/{id}         Upload-Offset / Upload-Length headers
+    GET    /uploads/{id}         offset, sha256, early probe result
+    PATCH  /uploads/{id}         raw bytes starting at the Upload-Offset header
+    DELETE /uploads/{id}         cancel
+
+The upload_id can be passed to /process as soon as the upload is created; the
+job starts once the bytes are in.
+"""
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+from starlette.requests import ClientDisconnect
+
+from services.upload_service import (
+    UploadOffsetMismatch,
+    create_upload,
+    get_upload,
+    append_chunk,
+    delete_upload,
+)
+
+router = APIRouter()
+
+
+class CreateUploadRequest(BaseModel):
+    length: int
+    filename: str = ""
+
+
+def _public_state(state: dict) -> dict:
+    return {
+        "upload_id": state["upload_id"],
+        "offset": state["offset"],
+        "length": state["length"],
+        "complete": state["complete"],
+        "sha256": state["sha256"],
+        "probe": state["probe"],
+        "video_id": f"{state['upload_id']}{state['suffix']}" if state["complete"] else None,
+    }
+
+
+def _offset_headers(state: dict) -> dict:
+    return {
+        "Upload-Offset": str(state["offset"]),
+        "Upload-Length": str(state["length"]),
+        "Cache-Control": "no-store",
+    }
+
+
+@router.post("/uploads", status_code=201)
+async def start_upload(request: CreateUploadRequest, response: Response):
+    """Create a resumable upload."""
+    try:
+        state = create_upload(request.length, request.filename)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    response.headers["Location"] = f"/uploads/{state['upload_id']}"
+    return {"status": "success", **_public_state(state)}
+
+
+@router.head("/uploads/{upload_id}")
+async def upload_offset(upload_id: str):
+    """Current offset - where a resumed upload continues."""
+    state = get_upload(upload_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return Response(status_code=200, headers=_offset_headers(state))
+
+
+@router.get("/uploads/{upload_id}")
+async def upload_status(upload_id: str):
+    """Offset, hash (once complete) and the early probe result."""
+    state = get_upload(upload_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return {"status": "success", **_public_state(state)}
+
+
+@router.patch("/uploads/{upload_id}")
+async def upload_chunk(upload_id: str, request: Request, upload_offset: Optional[int] = Header(None)):
+    """Append the request body at Upload-Offset. 409 with the real offset if it does not match."""
+    if upload_offset is None:
+        raise HTTPException(status_code=400, detail="Upload-Offset header is required")
+
+    try:
+        state = await append_chunk(upload_id, upload_offset, request.stream())
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except UploadOffsetMismatch as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "offset": e.expected})
+    except ValueError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except ClientDisconnect:
+        # Bytes received before the drop are kept - the client asks HEAD and resumes
+        print(f"[UPLOAD] {upload_id}: client disconnected mid-chunk")
+        return Response(status_code=499)
+
+    return JSONResponse({"status": "success", **_public_state(state)}, headers=_offset_headers(state))
+
+
+@router.delete("/uploads/{upload_id}")
+async def cancel_upload(upload_id: str):
+    """Cancel an unfinished upload."""
+    state = get_upload(upload_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if state["complete"]:
+        raise HTTPException(status_code=409, detail="Upload already complete")
+    delete_upload(upload_id)
+    return {"status": "success"}
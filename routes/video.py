@@ -5,24 +5,28 @@ import os
 import asyncio
 import shutil
 import uuid
-import random
 from pathlib import Path
 
+from typing import Optional
+
 from fastapi import APIRouter, UploadFile, File, Form, WebSocket, WebSocketDisconnect, BackgroundTasks, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
 
-from core import manager, pending_tasks, parse_bool
+from core import manager, pending_tasks, parse_bool, input_video_path
 from services.audio_service import (
     transcribe_with_groq,
-    generate_voiceover_from_srt_sync,
+    generate_voiceover_from_srt,
     get_random_music,
     download_audio_from_url,
+    speech_intervals_from_entries,
 )
 from services.video_service import (
     get_video_duration,
     get_video_resolution,
     check_video_has_audio,
     merge_final_video,
+    render_subtitle_style_preview,
     cut_viral_shorts,
     generate_thumbnail,
     generate_ai_thumbnail_image,
@@ -30,12 +34,30 @@ from services.video_service import (
 )
 from services.text_service import (
     convert_srt_to_ass,
+    build_ass_document,
+    build_styled_webvtt,
     fix_subtitles_with_ai,
     parse_srt_file,
-    write_srt_from_entries,
+)
+from services.subtitle_edit_service import (
+    SubtitleVersionConflict,
+    apply_subtitle_edits,
+    replace_subtitles,
+    load_edit_state,
+    clear_stale,
 )
 from services.font_service import ensure_font_available
-from services.marketing_service import generate_marketing_kit
+from services.upload_service import get_upload, wait_for_upload
+from services.proxy_service import (
+    ensure_normalized,
+    ensure_proxy,
+    prepare_media,
+    proxy_for,
+    register_artifact,
+    load_manifest,
+)
+from utils.subtitles import load_track
+from services.marketing_service import generate_marketing_kit, analyze_transcript_combined
 from core import ai_thumbnail_original_urls
 from utils.config import INPUTS_DIR, OUTPUTS_DIR, MUSIC_DIR, MUSIC_TEMP_DIR, SERVER_BASE_URL
 
@@ -50,10 +72,25 @@ class UpdateSubtitlesRequest(BaseModel):
     subtitles: list[dict]
 
 
+class PatchSubtitlesRequest(BaseModel):
+    version: int
+    edits: list[dict]
+
+
 # =============================================================================
 # Helper
 # =============================================================================
 
+def _copy_upload(upload: UploadFile, path: Path):
+    with open(path, "wb") as buffer:
+        shutil.copyfileobj(upload.file, buffer)
+
+
+async def _save_upload(upload: UploadFile, path: Path):
+    """Copy a multipart upload to disk without blocking the event loop."""
+    await asyncio.get_event_loop().run_in_executor(None, _copy_upload, upload, path)
+
+
 def cleanup_source_file(v_path: Path, out_path: Path):
     # Keep source file for Effects Studio tab (Remotion rendering needs it)
     if out_path.exists() and out_path.stat().st_size > 0:
@@ -67,17 +104,17 @@ def cleanup_source_file(v_path: Path, out_path: Path):
 # =============================================================================
 
 @router.post("/upload-video")
-async def upload_video(video: UploadFile = File(...)):
-    """Upload a video file and return its video_id."""
+async def upload_video(background_tasks: BackgroundTasks, video: UploadFile = File(...)):
+    """Upload a video file and return its video_id (normalization and proxy run in the background)."""
     file_id = uuid.uuid4().hex[:8]
     suffix = Path(video.filename).suffix
     filename = f"{file_id}{suffix}"
     v_path = INPUTS_DIR / filename
 
     try:
-        with open(v_path, "wb") as f:
-            shutil.copyfileobj(video.file, f)
+        await _save_upload(video, v_path)
         print(f"[UPLOAD] Video saved: {v_path}")
+        background_tasks.add_task(prepare_media, str(v_path))
         return {"status": "success", "video_id": filename}
     except Exception as e:
         print(f"[UPLOAD ERROR] {e}")
@@ -110,7 +147,8 @@ async def websocket_progress(websocket: WebSocket, file_id: str):
 @router.post("/process")
 async def process_video_api(
     background_tasks: BackgroundTasks,
-    video: UploadFile = File(...),
+    video: UploadFile | None = File(None),
+    upload_id: str = Form(""),
     music_file: UploadFile | None = File(None),
     do_subtitles: str = Form("true"),
     do_music: str = Form("true"),
@@ -129,8 +167,13 @@ async def process_video_api(
     font_size: str = Form("24"),
     music_volume: str = Form("0.15"),
     ducking: str = Form("true"),
+    combined_analysis: str = Form("false"),
 ):
-    """Main video processing endpoint."""
+    """
+    Main video processing endpoint. Takes either the video itself or the
+    upload_id of a resumable upload (see routes/uploads.py), which may still
+    be in progress - the job then starts as soon as the last chunk lands.
+    """
     do_subtitles_bool = parse_bool(do_subtitles)
     do_music_bool = parse_bool(do_music)
     do_marketing_bool = parse_bool(do_marketing)
@@ -140,6 +183,7 @@ async def process_video_api(
     do_voiceover_bool = parse_bool(do_voiceover)
     do_ai_thumbnail_bool = parse_bool(do_ai_thumbnail)
     ducking_bool = parse_bool(ducking)
+    combined_analysis_bool = parse_bool(combined_analysis)
 
     try:
         font_size_int = int(font_size)
@@ -157,14 +201,23 @@ async def process_video_api(
     print(f"[PROCESS] Music Source: {music_source}, Style: {music_style}")
     print(f"{'='*60}\n")
 
-    file_id = str(uuid.uuid4())[:8]
-    v_path = INPUTS_DIR / f"{file_id}.mp4"
-
-    try:
-        with open(v_path, "wb") as buffer:
-            shutil.copyfileobj(video.file, buffer)
-    except Exception as e:
-        return {"error": f"Failed to save uploaded file: {e}"}
+    if upload_id:
+        upload = get_upload(upload_id)
+        if upload is None:
+            return {"error": "Upload not found"}
+        if (upload.get("probe") or {}).get("ok") is False:
+            return {"error": "The uploaded file is not a readable video"}
+        file_id = upload_id
+        v_path = INPUTS_DIR / f"{upload_id}{upload['suffix']}"
+    elif video is not None:
+        file_id = str(uuid.uuid4())[:8]
+        v_path = INPUTS_DIR / f"{file_id}.mp4"
+        try:
+            await _save_upload(video, v_path)
+        except Exception as e:
+            return {"error": f"Failed to save uploaded file: {e}"}
+    else:
+        return {"error": "No video provided"}
 
     # Handle music source
     selected_music_path = None
@@ -178,8 +231,7 @@ async def process_video_api(
         elif music_source == "upload" and music_file:
             music_upload_path = MUSIC_TEMP_DIR / f"{file_id}_uploaded.mp3"
             try:
-                with open(music_upload_path, "wb") as buffer:
-                    shutil.copyfileobj(music_file.file, buffer)
+                await _save_upload(music_file, music_upload_path)
                 selected_music_path = music_upload_path
             except Exception as e:
                 print(f"[ERROR] Failed to save uploaded music: {e}")
@@ -193,12 +245,13 @@ async def process_video_api(
     out_path = OUTPUTS_DIR / f"{file_id}_final.mp4"
 
     background_tasks.add_task(
-        process_video_task,
+        process_video_task if not upload_id else process_after_upload,
         file_id, v_path, srt_path, out_path,
         do_music_bool, do_subtitles_bool, do_marketing_bool, do_shorts_bool,
         do_thumbnail_bool, do_styled_subtitles_bool, do_voiceover_bool,
         do_ai_thumbnail_bool, music_style, selected_music_path,
         font_name, font_color, font_size_int, music_volume_float, ducking_bool,
+        combined_analysis_bool,
     )
 
     return {"file_id": file_id, "status": "processing", "message": "העיבוד התחיל"}
@@ -210,28 +263,158 @@ async def process_video_api(
 
 @router.post("/update-subtitles/{file_id}")
 async def update_subtitles(file_id: str, request: UpdateSubtitlesRequest):
-    """Save user-edited subtitles to SRT file."""
+    """Save user-edited subtitles to SRT file (only changed lines are marked stale)."""
     srt_path = OUTPUTS_DIR / f"{file_id}.srt"
 
     try:
-        entries = []
-        for i, sub in enumerate(request.subtitles):
-            entries.append({
-                'index': i + 1,
-                'start': sub.get('start', 0),
-                'end': sub.get('end', 0),
-                'text': sub.get('text', '')
-            })
-
-        write_srt_from_entries(entries, str(srt_path))
-        print(f"[SUBTITLE UPDATE] Saved {len(entries)} edited entries to {srt_path}")
-        return {"status": "success", "message": f"Saved {len(entries)} subtitles"}
+        result = replace_subtitles(str(srt_path), request.subtitles)
+        print(f"[SUBTITLE UPDATE] Saved {len(request.subtitles)} edited entries to {srt_path}")
+        return {"status": "success", "message": f"Saved {len(request.subtitles)} subtitles", **result}
 
     except Exception as e:
         print(f"[ERROR] Failed to update subtitles: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/subtitles/{file_id}")
+async def get_subtitles(file_id: str):
+    """Current subtitles with their version and stale downstream ranges."""
+    srt_path = OUTPUTS_DIR / f"{file_id}.srt"
+    if not srt_path.exists():
+        raise HTTPException(status_code=404, detail="Subtitles not found")
+
+    state = load_edit_state(str(srt_path))
+    return {
+        "subtitles": parse_srt_file(str(srt_path)),
+        "version": state["version"],
+        "stale": state["stale"],
+    }
+
+
+@router.patch("/subtitles/{file_id}")
+async def patch_subtitles(file_id: str, request: PatchSubtitlesRequest):
+    """
+    Apply line-level edits ({"op": "update"|"insert"|"delete", "index", ...})
+    on top of `version`. 409 if the subtitles changed since that version.
+    """
+    srt_path = OUTPUTS_DIR / f"{file_id}.srt"
+    if not srt_path.exists():
+        raise HTTPException(status_code=404, detail="Subtitles not found")
+
+    try:
+        result = apply_subtitle_edits(str(srt_path), request.version, request.edits)
+        return {"status": "success", **result}
+
+    except SubtitleVersionConflict as e:
+        raise HTTPException(status_code=409, detail={"message": str(e), "version": e.current})
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"[ERROR] Failed to patch subtitles: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+def _media_url(path: Path) -> str:
+    """Public URL of a file under inputs/ or outputs/."""
+    path = Path(path).resolve()
+    if OUTPUTS_DIR.resolve() in path.parents:
+        return f"{SERVER_BASE_URL}/outputs/{path.relative_to(OUTPUTS_DIR.resolve()).as_posix()}"
+    return f"{SERVER_BASE_URL}/inputs/{path.name}"
+
+
+def subtitle_preview_urls(file_id: str, v_path: Path) -> dict:
+    """Unburned proxy video plus caption tracks generated from the current SRT."""
+    return {
+        "video_url": _media_url(proxy_for(str(v_path))),
+        "vtt_url": f"{SERVER_BASE_URL}/subtitles/{file_id}/preview.vtt",
+        "ass_url": f"{SERVER_BASE_URL}/subtitles/{file_id}/preview.ass",
+    }
+
+
+def _preview_style(file_id: str, font_name: Optional[str], font_color: Optional[str], font_size: Optional[int]):
+    """Style for a preview track - query values override the pending job's settings."""
+    task = pending_tasks.get(file_id) or {}
+    width, height = task.get("video_width"), task.get("video_height")
+    if not width or not height:
+        v_path = INPUTS_DIR / f"{file_id}.mp4"
+        width, height = get_video_resolution(v_path) if v_path.exists() else (1920, 1080)
+    return {
+        "video_width": width,
+        "video_height": height,
+        "font_name": font_name or task.get("font_name") or "Arial",
+        "font_color": font_color or task.get("font_color") or "#FFFFFF",
+        "font_size": font_size or task.get("font_size") or 24,
+    }
+
+
+def _preview_track(file_id: str):
+    srt_path = OUTPUTS_DIR / f"{file_id}.srt"
+    if not srt_path.exists():
+        raise HTTPException(status_code=404, detail="Subtitles not found")
+    return load_track(str(srt_path))
+
+
+@router.get("/subtitles/{file_id}/preview.vtt")
+async def subtitle_preview_vtt(
+    file_id: str, font_name: Optional[str] = None, font_color: Optional[str] = None, font_size: Optional[int] = None
+):
+    """Styled WebVTT of the current subtitles - shown over the original video, nothing is encoded."""
+    style = _preview_style(file_id, font_name, font_color, font_size)
+    vtt = build_styled_webvtt(
+        _preview_track(file_id), style["video_height"],
+        style["font_name"], style["font_color"], style["font_size"]
+    )
+    return Response(vtt, media_type="text/vtt; charset=utf-8", headers={"Cache-Control": "no-store"})
+
+
+@router.get("/subtitles/{file_id}/preview.ass")
+async def subtitle_preview_ass(
+    file_id: str, font_name: Optional[str] = None, font_color: Optional[str] = None, font_size: Optional[int] = None
+):
+    """The ASS the final export would burn in, for client-side ASS renderers."""
+    style = _preview_style(file_id, font_name, font_color, font_size)
+    ass = build_ass_document(_preview_track(file_id), **style)
+    return Response(ass, media_type="text/x-ssa; charset=utf-8", headers={"Cache-Control": "no-store"})
+
+
+@router.get("/subtitle-style-preview/{file_id}")
+async def subtitle_style_preview(
+    file_id: str,
+    t: float = 0.0,
+    font_name: str = "Arial",
+    font_color: str = "#FFFFFF",
+    font_size: int = 24,
+    text: Optional[str] = None
+):
+    """One styled frame at t seconds - font/color/size feedback without a full render."""
+    v_path = input_video_path(file_id)
+    if not v_path or not v_path.exists():
+        raise HTTPException(status_code=404, detail="Video not found")
+    srt_path = OUTPUTS_DIR / f"{v_path.stem}.srt"
+
+    loop = asyncio.get_event_loop()
+    font_name = await loop.run_in_executor(None, ensure_font_available, font_name)
+    preview_path = await loop.run_in_executor(
+        None, lambda: render_subtitle_style_preview(
+            str(v_path), t, font_name, font_color, font_size, str(srt_path), text
+        )
+    )
+    if not preview_path:
+        raise HTTPException(status_code=500, detail="Preview render failed")
+    return {"status": "success", "preview_url": f"{SERVER_BASE_URL}/outputs/previews/{Path(preview_path).name}"}
+
+
+@router.get("/artifacts/{file_id}")
+async def get_artifacts(file_id: str):
+    """Artifacts produced for a job (proxy, subtitles, final video, ...)."""
+    manifest = load_manifest(file_id)
+    artifacts = {
+        name: {**entry, "url": _media_url(Path(entry["path"]))}
+        for name, entry in manifest["artifacts"].items() if os.path.exists(entry["path"])
+    }
+    return {"status": "success", "file_id": file_id, "artifacts": artifacts}
+
+
 @router.post("/continue-processing/{file_id}")
 async def continue_processing(file_id: str, background_tasks: BackgroundTasks):
     """Resume video processing after subtitle review."""
@@ -249,6 +432,19 @@ async def continue_processing(file_id: str, background_tasks: BackgroundTasks):
 # Video Processing Pipeline
 # =============================================================================
 
+async def process_after_upload(file_id: str, v_path: Path, *args):
+    """Run process_video_task once the resumable upload `file_id` has fully arrived."""
+    upload = get_upload(file_id) or {}
+    if not upload.get("complete"):
+        await manager.send_progress(file_id, 0, "processing", "ממתין לסיום ההעלאה...")
+    video_path = await wait_for_upload(file_id)
+    if not video_path:
+        print(f"[TASK] Upload {file_id} did not complete as a readable video")
+        await manager.send_progress(file_id, 100, "error", "שגיאה: ההעלאה לא הושלמה או שהקובץ אינו וידאו תקין")
+        return
+    await process_video_task(file_id, Path(video_path), *args)
+
+
 async def process_video_task(
     file_id: str, v_path: Path, srt_path: Path, out_path: Path,
     do_music: bool, do_subtitles: bool, do_marketing: bool, do_shorts: bool,
@@ -257,6 +453,7 @@ async def process_video_task(
     selected_music_path: Path = None,
     font_name: str = "Arial", font_color: str = "#FFFFFF", font_size: int = 24,
     music_volume: float = 0.15, ducking: bool = True,
+    combined_analysis: bool = False,
 ):
     """Process video with all selected features."""
     print(f"[TASK] Using font: {font_name}, color: {font_color}, size: {font_size}")
@@ -268,15 +465,39 @@ async def process_video_task(
     ai_thumbnail_url = None
     voiceover_audio_path = None
     chosen_music = selected_music_path
+    analysis = None
 
     def progress_callback(progress: int, message: str):
         asyncio.run_coroutine_threadsafe(
             manager.send_progress(file_id, progress, "processing", message), loop,
         )
 
+    async def correct_subtitles():
+        """One combined analysis call when requested, otherwise the windowed correction pass."""
+        if combined_analysis:
+            await manager.send_progress(file_id, 18, "processing", "מנתח תמליל עם AI...")
+            result = await loop.run_in_executor(
+                None, lambda: analyze_transcript_combined(
+                    str(srt_path), video_duration, do_marketing, do_voiceover, progress_callback
+                )
+            )
+            if result:
+                return result
+        await manager.send_progress(file_id, 18, "processing", "מתקן כתוביות עם AI...")
+        await loop.run_in_executor(
+            None, lambda: fix_subtitles_with_ai(str(srt_path), progress_callback)
+        )
+        return None
+
     try:
         await manager.send_progress(file_id, 0, "processing", "מתחיל עיבוד...")
 
+        # VFR / HEVC / 4K uploads are transcoded once; every later stage reads the result
+        v_path = Path(await loop.run_in_executor(None, ensure_normalized, str(v_path)))
+
+        # Analysis proxy - encoded alongside transcription, awaited before frame analysis
+        proxy_future = loop.run_in_executor(None, ensure_proxy, str(v_path))
+
         # 1) Video properties
         video_duration = get_video_duration(v_path)
         video_width, video_height = get_video_resolution(v_path)
@@ -295,20 +516,15 @@ async def process_video_task(
                     transcript_text = ""
                 else:
                     if srt_path.exists():
-                        await manager.send_progress(file_id, 18, "processing", "מתקן כתוביות עם AI...")
-                        await loop.run_in_executor(
-                            None, lambda: fix_subtitles_with_ai(str(srt_path), progress_callback)
-                        )
+                        analysis = await correct_subtitles()
             else:
                 await manager.send_progress(file_id, 10, "processing", "מחלץ כתוביות מהוידאו...")
+                await proxy_future
                 transcript_text, entries = await loop.run_in_executor(
                     None, lambda: extract_text_huggingface(str(v_path), progress_callback, str(srt_path))
                 )
                 if srt_path.exists() and srt_path.stat().st_size > 0:
-                    await manager.send_progress(file_id, 18, "processing", "מתקן כתוביות עם AI...")
-                    await loop.run_in_executor(
-                        None, lambda: fix_subtitles_with_ai(str(srt_path), progress_callback)
-                    )
+                    analysis = await correct_subtitles()
                 elif transcript_text:
                     try:
                         with open(str(srt_path), 'w', encoding='utf-8') as f:
@@ -316,6 +532,9 @@ async def process_video_task(
                     except Exception as save_err:
                         print(f"[ERROR] Fallback save failed: {save_err}")
 
+        if srt_path.exists() and srt_path.stat().st_size > 0:
+            register_artifact(file_id, "subtitles", str(srt_path), source_path=str(v_path))
+
         # Subtitle review pause
         if do_subtitles and srt_path.exists() and srt_path.stat().st_size > 0:
             srt_entries = parse_srt_file(str(srt_path))
@@ -336,11 +555,14 @@ async def process_video_task(
                     "video_duration": video_duration,
                     "video_width": video_width, "video_height": video_height,
                     "has_audio": has_audio,
+                    "analysis": analysis,
                 }
 
                 await manager.send_progress(
                     file_id, 20, "subtitle_review", "כתוביות מוכנות לעריכה",
-                    {"subtitles": srt_entries, "total_entries": len(srt_entries)}
+                    {"subtitles": srt_entries, "total_entries": len(srt_entries),
+                     "version": load_edit_state(str(srt_path))["version"],
+                     "preview": subtitle_preview_urls(file_id, v_path)}
                 )
                 return
 
@@ -354,6 +576,7 @@ async def process_video_task(
             get_video_duration(v_path),
             *get_video_resolution(v_path),
             check_video_has_audio(v_path),
+            analysis=analysis,
         )
 
     except Exception as e:
@@ -371,6 +594,7 @@ async def continue_video_task(
     font_name: str, font_color: str, font_size: int,
     music_volume: float, ducking: bool, transcript_text: str,
     video_duration: float, video_width: int, video_height: int, has_audio: bool,
+    analysis: dict = None,
 ):
     """Continue video processing after subtitle review."""
     loop = asyncio.get_event_loop()
@@ -390,6 +614,7 @@ async def continue_video_task(
             music_style, selected_music_path, font_name, font_color, font_size,
             music_volume, ducking, transcript_text,
             video_duration, video_width, video_height, has_audio,
+            analysis=analysis,
         )
 
     except Exception as e:
@@ -406,8 +631,13 @@ async def _run_post_subtitle_pipeline(
     music_style, chosen_music, font_name, font_color, font_size,
     music_volume, ducking, transcript_text,
     video_duration, video_width, video_height, has_audio,
+    analysis=None,
 ):
-    """Shared pipeline logic: marketing, music, ASS, voiceover, merge, shorts, thumbnail."""
+    """
+    Shared pipeline logic: marketing, music, ASS, voiceover, merge, shorts, thumbnail.
+    `analysis` holds the combined post-transcript results; any part it is missing
+    falls back to its own AI call.
+    """
     marketing_data = None
     shorts_paths = []
     thumbnail_url = None
@@ -415,21 +645,21 @@ async def _run_post_subtitle_pipeline(
     voiceover_audio_path = None
 
     # 3) Marketing + Music
-    if do_marketing and transcript_text:
+    if do_marketing and analysis and analysis.get("marketing"):
+        marketing_data = analysis["marketing"]
+    elif do_marketing and transcript_text:
         await manager.send_progress(file_id, 25, "processing", "יוצר ערכת שיווק...")
         marketing_data = await loop.run_in_executor(
-            None, lambda: generate_marketing_kit(transcript_text, video_duration, progress_callback)
+            None, lambda: generate_marketing_kit(
+                transcript_text, video_duration, progress_callback, srt_path=str(srt_path)
+            )
         )
-        if marketing_data and do_music and not chosen_music:
-            auto_style = marketing_data.get("music_style", music_style)
-            chosen_music = get_random_music(auto_style, str(MUSIC_DIR))
+    if marketing_data and do_music and not chosen_music:
+        auto_style = marketing_data.get("music_style", music_style)
+        chosen_music = get_random_music(auto_style, str(MUSIC_DIR))
 
     if do_music and not chosen_music:
         chosen_music = get_random_music(music_style, str(MUSIC_DIR))
-        if not chosen_music:
-            all_music = list(MUSIC_DIR.glob("*.mp3"))
-            if all_music:
-                chosen_music = random.choice(all_music)
 
     # 4) ASS subtitles
     subtitle_path = srt_path
@@ -452,18 +682,22 @@ async def _run_post_subtitle_pipeline(
         if ok:
             subtitle_path = ass_path
             use_ass = True
+            clear_stale(str(srt_path), "ass")
+            register_artifact(file_id, "ass", str(ass_path), source_path=str(srt_path))
 
     # 5) Voiceover
     if do_voiceover and srt_path.exists():
         await manager.send_progress(file_id, 55, "processing", "מייצר קריינות...")
         voiceover_audio_path = OUTPUTS_DIR / f"{file_id}_voiceover.mp3"
-        ok = await loop.run_in_executor(
-            None, lambda: generate_voiceover_from_srt_sync(
-                str(srt_path), str(voiceover_audio_path), video_duration, progress_callback
-            ),
+        ok = await generate_voiceover_from_srt(
+            str(srt_path), str(voiceover_audio_path), video_duration, progress_callback,
+            cleaned_texts=analysis.get("voiceover_texts") if analysis else None,
         )
         if not ok:
             voiceover_audio_path = None
+        else:
+            clear_stale(str(srt_path), "tts")
+            register_artifact(file_id, "voiceover", str(voiceover_audio_path), source_path=str(srt_path))
 
     # 6) Final merge
     await manager.send_progress(file_id, 75, "processing", "ממזג את כל הערוצים...")
@@ -476,18 +710,28 @@ async def _run_post_subtitle_pipeline(
     elif do_subtitles and srt_path.exists() and os.path.getsize(str(srt_path)) > 0:
         final_subtitle_path = str(srt_path)
 
+    # Transcript timings drive the ducking envelope (no audio analysis needed)
+    speech_intervals = None
+    if ducking and chosen_music and srt_path.exists():
+        speech_intervals = speech_intervals_from_entries(parse_srt_file(str(srt_path))) or None
+
     merge_success = await loop.run_in_executor(
         None, lambda: merge_final_video(
             v_input=str(v_path),
             srt_input=final_subtitle_path,
             v_output=str(out_path),
             music_path=str(chosen_music) if chosen_music else None,
-            voice_path=str(voiceover_audio_path) if voiceover_audio_path else None
+            voice_path=str(voiceover_audio_path) if voiceover_audio_path else None,
+            music_volume=music_volume,
+            ducking=ducking,
+            speech_intervals=speech_intervals,
         ),
     )
 
     if not merge_success or not out_path.exists():
         raise RuntimeError("FFmpeg merge failed - קובץ פלט לא נוצר")
+    clear_stale(str(srt_path), "render")
+    register_artifact(file_id, "final", str(out_path), source_path=str(v_path))
 
     # 7) Shorts
     if do_shorts and marketing_data and marketing_data.get("viral_moments"):
@@ -512,6 +756,7 @@ async def _run_post_subtitle_pipeline(
         )
         if ok and thumb_out.exists():
             thumbnail_url = f"{SERVER_BASE_URL}/outputs/{thumb_out.name}"
+            register_artifact(file_id, "thumbnail", str(thumb_out), source_path=str(v_path))
 
     # 9) AI Thumbnail
     if do_ai_thumbnail and marketing_data:
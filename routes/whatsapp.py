@@ -19,6 +19,9 @@ from services.marketing_service import generate_marketing_kit
 from services.greenapi_service import is_configured as greenapi_is_configured, check_connection as greenapi_check
 from services.whatsapp_chat_service import handle_whatsapp_message
 from utils.config import GROQ_API_KEY, INPUTS_DIR, OUTPUTS_DIR, SERVER_BASE_URL
+from utils.llm_cache import cached_completion
+from utils.llm_clients import get_groq_client
+from utils.llm_scheduler import PRIORITY_INTERACTIVE, run_llm_call, estimate_tokens
 from routes.video import process_video_task
 
 router = APIRouter()
@@ -33,7 +36,6 @@ class WhatsAppCommandRequest(BaseModel):
 async def whatsapp_command(req: WhatsAppCommandRequest):
     """Unified AI command endpoint for n8n / WhatsApp integration."""
     import json as _json
-    from groq import Groq
 
     message = req.message.strip()
     media_url = req.media_url
@@ -53,18 +55,24 @@ async def whatsapp_command(req: WhatsAppCommandRequest):
 החזר JSON: {"intent": "editing|script|marketing|chat", "summary": "תיאור קצר"}"""
 
     try:
-        client = Groq(api_key=GROQ_API_KEY)
+        client = get_groq_client()
         loop = asyncio.get_event_loop()
 
-        classify_response = await loop.run_in_executor(
-            None, lambda: client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[{"role": "system", "content": classify_prompt}, {"role": "user", "content": message}],
-                temperature=0.1, max_tokens=150,
+        classify_messages = [{"role": "system", "content": classify_prompt}, {"role": "user", "content": message}]
+        raw_intent = await loop.run_in_executor(
+            None, lambda: cached_completion(
+                "groq/llama-3.3-70b-versatile", classify_messages,
+                lambda: client.chat.completions.create(
+                    model="llama-3.3-70b-versatile",
+                    messages=classify_messages,
+                    temperature=0.1, max_tokens=150,
+                ).choices[0].message.content,
+                temperature=0.1,
+                priority=PRIORITY_INTERACTIVE,
+                max_output_tokens=150,
             ),
         )
-
-        raw_intent = classify_response.choices[0].message.content.strip()
+        raw_intent = raw_intent.strip()
         cleaned = raw_intent
         if cleaned.startswith("```"):
             parts = cleaned.split("```")
@@ -109,6 +117,7 @@ async def whatsapp_command(req: WhatsAppCommandRequest):
             video_duration = get_video_duration(str(video_path))
             has_audio = check_video_has_audio(str(video_path))
             transcript_text = ""
+            srt_path = None
 
             if has_audio:
                 srt_path = OUTPUTS_DIR / f"{file_id}_wa_marketing.srt"
@@ -121,7 +130,10 @@ async def whatsapp_command(req: WhatsAppCommandRequest):
                 )
 
             marketing_data = await loop.run_in_executor(
-                None, lambda: generate_marketing_kit(transcript_text or "סרטון ללא מלל", video_duration, None)
+                None, lambda: generate_marketing_kit(
+                    transcript_text or "סרטון ללא מלל", video_duration, None,
+                    srt_path=str(srt_path) if srt_path else None
+                )
             )
             if not marketing_data:
                 return {"type": "error", "message": "נכשל ביצירת תוכן שיווקי"}
@@ -154,14 +166,19 @@ async def whatsapp_command(req: WhatsAppCommandRequest):
 
     # General chat
     try:
+        chat_messages = [
+            {"role": "system", "content": "אתה עוזר AI מקצועי לעריכת וידאו בעברית. ענה בצורה ידידותית וקצרה."},
+            {"role": "user", "content": message},
+        ]
         chat_response = await loop.run_in_executor(
-            None, lambda: client.chat.completions.create(
-                model="llama-3.3-70b-versatile",
-                messages=[
-                    {"role": "system", "content": "אתה עוזר AI מקצועי לעריכת וידאו בעברית. ענה בצורה ידידותית וקצרה."},
-                    {"role": "user", "content": message},
-                ],
-                temperature=0.7, max_tokens=500,
+            None, lambda: run_llm_call(
+                "groq", lambda: client.chat.completions.create(
+                    model="llama-3.3-70b-versatile", messages=chat_messages,
+                    temperature=0.7, max_tokens=500,
+                ),
+                priority=PRIORITY_INTERACTIVE,
+                estimated_tokens=estimate_tokens(chat_messages, 500),
+                hedge=True,
             ),
         )
         return {"type": "text", "content": chat_response.choices[0].message.content.strip(), "message": "תשובה מה-AI"}
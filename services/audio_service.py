@@ -3,9 +3,15 @@ Audio Service - Handles voiceover generation, audio processing, and music manage
 Supports Edge-TTS (free) and ElevenLabs (premium) for voice synthesis.
 """
 import os
+import re
+import json
+import shutil
 import subprocess
 import asyncio
+import importlib.util
 import random
+import threading
+import time
 import uuid
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
@@ -14,29 +20,184 @@ from utils.config import (
     ELEVENLABS_API_KEY,
     ELEVENLABS_VOICE_ID,
     ELEVENLABS_MODEL,
-    ELEVENLABS_EMOTION_SETTINGS,
+    ELEVENLABS_CHUNK_CHARS,
+    ELEVENLABS_MAX_PARALLEL,
+    ELEVENLABS_STREAM_CHUNK_BYTES,
     EDGE_TTS_VOICE,
     EDGE_TTS_RATE,
+    VOICEOVER_TTS_CONCURRENCY,
+    VOICEOVER_CACHE_DIR,
+    VOICEOVER_CACHE_MAX_BYTES,
     MUSIC_STYLE_KEYWORDS,
+    MUSIC_ANALYSIS_INDEX,
+    MUSIC_TARGET_LUFS,
+    MUSIC_PEAK_CEILING_DB,
+    MUSIC_MAX_GAIN_DB,
+    DUCKING_ATTACK_SECONDS,
+    DUCKING_RELEASE_SECONDS,
+    DUCKING_MAX_INTERVALS,
     GROQ_API_KEY
 )
 from utils.helpers import clean_text_for_voiceover
-from services.text_service import parse_srt_file, clean_and_merge_srt, write_srt_from_entries, clean_srt_text_with_ai
+from utils.llm_clients import get_groq_client
+from utils.llm_scheduler import run_llm_call
+from services.text_service import (
+    parse_srt_file,
+    clean_and_merge_srt,
+    write_srt_from_entries,
+    clean_srt_text_with_ai,
+    save_asr_confidence
+)
 
 
 # =============================================================================
 # ElevenLabs Voiceover (Premium)
 # =============================================================================
 
+ELEVENLABS_API_BASE = "https://api.elevenlabs.io/v1"
+
+# Pooled HTTP session shared by all ElevenLabs requests (keep-alive, reused TLS)
+_elevenlabs_session = None
+_elevenlabs_session_lock = threading.Lock()
+
+# Latency metrics for the most recent and all ElevenLabs syntheses (updated from worker threads)
+_elevenlabs_metrics_lock = threading.Lock()
+elevenlabs_metrics: Dict[str, float] = {
+    "requests": 0,
+    "last_time_to_first_audio_ms": 0.0,
+    "avg_time_to_first_audio_ms": 0.0,
+    "last_total_ms": 0.0,
+}
+
+
+def _get_elevenlabs_session():
+    """Return the process-wide pooled requests.Session for ElevenLabs."""
+    global _elevenlabs_session
+    if _elevenlabs_session is None:
+        with _elevenlabs_session_lock:
+            if _elevenlabs_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=1,
+                    pool_maxsize=ELEVENLABS_MAX_PARALLEL * 2,
+                )
+                session.mount("https://", adapter)
+                session.headers.update({
+                    "Accept": "audio/mpeg",
+                    "Content-Type": "application/json",
+                })
+                _elevenlabs_session = session
+    return _elevenlabs_session
+
+
+def _record_elevenlabs_metrics(time_to_first_audio_ms: float, total_ms: float):
+    """Update running time-to-first-audio metrics."""
+    with _elevenlabs_metrics_lock:
+        count = elevenlabs_metrics["requests"] + 1
+        avg = elevenlabs_metrics["avg_time_to_first_audio_ms"]
+        elevenlabs_metrics["requests"] = count
+        elevenlabs_metrics["last_time_to_first_audio_ms"] = round(time_to_first_audio_ms, 1)
+        elevenlabs_metrics["avg_time_to_first_audio_ms"] = round(avg + (time_to_first_audio_ms - avg) / count, 1)
+        elevenlabs_metrics["last_total_ms"] = round(total_ms, 1)
+
+
+def get_elevenlabs_metrics() -> Dict[str, float]:
+    """Return a snapshot of ElevenLabs latency metrics."""
+    with _elevenlabs_metrics_lock:
+        return dict(elevenlabs_metrics)
+
+
+def split_text_for_tts(text: str, max_chars: int = ELEVENLABS_CHUNK_CHARS) -> List[str]:
+    """
+    Split text into chunks of at most max_chars, breaking at sentence boundaries.
+    A single sentence longer than max_chars is split at word boundaries.
+    """
+    text = text.strip()
+    if len(text) <= max_chars:
+        return [text] if text else []
+
+    sentences = [s.strip() for s in re.split(r'(?<=[.!?:;\n])\s+', text) if s.strip()]
+
+    chunks = []
+    current = ""
+    for sentence in sentences:
+        if len(sentence) > max_chars:
+            if current:
+                chunks.append(current)
+                current = ""
+            words = sentence.split()
+            part = ""
+            for word in words:
+                if part and len(part) + 1 + len(word) > max_chars:
+                    chunks.append(part)
+                    part = word
+                else:
+                    part = f"{part} {word}" if part else word
+            if part:
+                current = part
+            continue
+
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            chunks.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _stream_elevenlabs_to_file(
+    url: str,
+    payload: dict,
+    output_path: str,
+    started_at: float
+) -> Tuple[bool, float]:
+    """
+    POST to the ElevenLabs streaming endpoint and write audio chunks to disk as they arrive.
+    Returns (success, time_to_first_audio_ms).
+    """
+    session = _get_elevenlabs_session()
+    headers = {"xi-api-key": ELEVENLABS_API_KEY}
+    time_to_first_audio_ms = 0.0
+
+    with session.post(url, json=payload, headers=headers, stream=True, timeout=(10, 120)) as response:
+        if response.status_code != 200:
+            try:
+                error_msg = response.json().get('detail', {}).get('message', response.text)
+            except Exception:
+                error_msg = response.text
+            print(f"[ERROR] ElevenLabs API error: {response.status_code} - {error_msg}")
+            return False, 0.0
+
+        with open(output_path, 'wb') as f:
+            for chunk in response.iter_content(chunk_size=ELEVENLABS_STREAM_CHUNK_BYTES):
+                if not chunk:
+                    continue
+                if not time_to_first_audio_ms:
+                    time_to_first_audio_ms = (time.perf_counter() - started_at) * 1000
+                f.write(chunk)
+
+    return os.path.exists(output_path) and os.path.getsize(output_path) > 0, time_to_first_audio_ms
+
+
 def generate_voiceover_elevenlabs(
     text: str,
     output_path: str,
     emotion: str = 'neutral',
     voice_id: str = None,
     progress_callback=None
-) -> bool:
+) -> Tuple[bool, Optional[float]]:
     """
-    Generate voiceover using ElevenLabs API.
+    Generate voiceover using the ElevenLabs streaming API.
+
+    Audio is written to disk as it arrives. Texts longer than ELEVENLABS_CHUNK_CHARS
+    are split at sentence boundaries, synthesized in parallel and concatenated in order.
+    Time-to-first-audio is returned and also folded into elevenlabs_metrics.
 
     Args:
         text: Text to convert to speech
@@ -46,91 +207,110 @@ def generate_voiceover_elevenlabs(
         progress_callback: Optional progress callback
 
     Returns:
-        bool: True if successful, False otherwise
+        (success, time-to-first-audio in ms or None on failure)
     """
     if not ELEVENLABS_API_KEY:
         print("[ERROR] ElevenLabs API key not configured")
-        return False
+        return False, None
 
     if not text or not text.strip():
         print("[ERROR] No text provided for voiceover")
-        return False
+        return False, None
 
     try:
-        import requests
-
         if progress_callback:
             progress_callback(10, "מתחיל יצירת קריינות עם ElevenLabs...")
 
-        # Get voice settings based on emotion
-        emotion_lower = emotion.lower()
-        settings = ELEVENLABS_EMOTION_SETTINGS.get(emotion_lower, ELEVENLABS_EMOTION_SETTINGS['neutral'])
-
         # Use provided voice_id or default
         vid = voice_id or ELEVENLABS_VOICE_ID
+        url = f"{ELEVENLABS_API_BASE}/text-to-speech/{vid}/stream"
 
-        url = f"https://api.elevenlabs.io/v1/text-to-speech/{vid}"
-
-        headers = {
-            "Accept": "audio/mpeg",
-            "Content-Type": "application/json",
-            "xi-api-key": ELEVENLABS_API_KEY
+        voice_settings = {
+            "stability": 0.4,           # יציבות הקול
+            "similarity_boost": 0.8,    # דמיון לקול המקור
+            "style": 0.5,               # הגזמת סגנון (רגש)
+            "use_speaker_boost": True
         }
 
-        # payload = {
-        #     "text": text,
-        #     "model_id": ELEVENLABS_MODEL,
-        #     "voice_settings": {
-        #         "stability": settings['stability'],
-        #         "similarity_boost": settings['similarity_boost'],
-        #         "style": settings['style'],
-        #         "use_speaker_boost": settings['use_speaker_boost']
-        #     }
-        # }
-        print(f"--- DEBUG ELEVENLABS ---")
-        print(f"Original text: {text}")
-        print(f"Voice ID: {vid}")
-        print(f"------------------------")
-
-        payload = {
-            "text": text,
-            "model_id": "eleven_turbo_v2_5",  # זה מה שהופך את זה מג'יבריש לעברית
-            "voice_settings": {
-                "stability": 0.4,           # יציבות הקול
-                "similarity_boost": 0.8,    # דמיון לקול המקור
-                "style": 0.5,               # הגזמת סגנון (רגש)
-                "use_speaker_boost": True
+        chunks = split_text_for_tts(text)
+        print(f"[INFO] ElevenLabs: voice {vid}, {len(text)} chars in {len(chunks)} chunk(s)")
+
+        def build_payload(i: int) -> dict:
+            payload = {
+                "text": chunks[i],
+                "model_id": "eleven_turbo_v2_5",  # זה מה שהופך את זה מג'יבריש לעברית
+                "voice_settings": voice_settings,
             }
-        }
+            # Neighbouring text keeps prosody continuous across chunk boundaries
+            if i > 0:
+                payload["previous_text"] = chunks[i - 1]
+            if i + 1 < len(chunks):
+                payload["next_text"] = chunks[i + 1]
+            return payload
 
         if progress_callback:
             progress_callback(30, "שולח בקשה ל-ElevenLabs...")
 
-        response = requests.post(url, json=payload, headers=headers, timeout=120)
+        started_at = time.perf_counter()
 
-        if response.status_code == 200:
-            if progress_callback:
-                progress_callback(80, "שומר קובץ אודיו...")
+        if len(chunks) == 1:
+            ok, ttfa_ms = _stream_elevenlabs_to_file(url, build_payload(0), output_path, started_at)
+            if not ok:
+                return False, None
+        else:
+            from concurrent.futures import ThreadPoolExecutor
 
-            with open(output_path, 'wb') as f:
-                f.write(response.content)
+            part_paths = [f"{output_path}.part{i:03d}" for i in range(len(chunks))]
+            results = [None] * len(chunks)
+            completed = 0
 
-            if progress_callback:
-                progress_callback(100, "קריינות נוצרה בהצלחה!")
+            try:
+                with ThreadPoolExecutor(max_workers=ELEVENLABS_MAX_PARALLEL) as pool:
+                    futures = [
+                        pool.submit(_stream_elevenlabs_to_file, url, build_payload(i), part_paths[i], started_at)
+                        for i in range(len(chunks))
+                    ]
+                    for i, future in enumerate(futures):
+                        results[i] = future.result()
+                        completed += 1
+                        if progress_callback:
+                            pct = 30 + int(completed / len(chunks) * 50)
+                            progress_callback(pct, f"מייצר קריינות... ({completed}/{len(chunks)})")
+
+                if not all(ok for ok, _ in results):
+                    print("[ERROR] ElevenLabs: one or more chunks failed")
+                    return False, None
+
+                # MP3 frames are self-contained, so ordered byte concatenation is a valid stream
+                with open(output_path, 'wb') as out:
+                    for part in part_paths:
+                        with open(part, 'rb') as f:
+                            shutil.copyfileobj(f, out)
+            finally:
+                for part in part_paths:
+                    try:
+                        os.remove(part)
+                    except OSError:
+                        pass
+
+            ttfa_ms = results[0][1]
+
+        total_ms = (time.perf_counter() - started_at) * 1000
+        _record_elevenlabs_metrics(ttfa_ms, total_ms)
+        print(f"[METRIC] ElevenLabs time-to-first-audio: {ttfa_ms:.0f} ms, total: {total_ms:.0f} ms")
 
-            print(f"[SUCCESS] ElevenLabs voiceover saved to: {output_path}")
-            return True
-        else:
-            error_msg = response.json().get('detail', {}).get('message', response.text)
-            print(f"[ERROR] ElevenLabs API error: {response.status_code} - {error_msg}")
-            return False
+        if progress_callback:
+            progress_callback(100, "קריינות נוצרה בהצלחה!")
+
+        print(f"[SUCCESS] ElevenLabs voiceover saved to: {output_path}")
+        return True, ttfa_ms
 
     except ImportError:
         print("[ERROR] requests library not installed")
-        return False
+        return False, None
     except Exception as e:
         print(f"[ERROR] ElevenLabs voiceover failed: {e}")
-        return False
+        return False, None
 
 
 def generate_voiceover_elevenlabs_sync(
@@ -139,7 +319,7 @@ def generate_voiceover_elevenlabs_sync(
     emotion: str = 'neutral',
     voice_id: str = None,
     progress_callback=None
-) -> bool:
+) -> Tuple[bool, Optional[float]]:
     """Synchronous wrapper for ElevenLabs voiceover."""
     return generate_voiceover_elevenlabs(text, output_path, emotion, voice_id, progress_callback)
 
@@ -197,106 +377,224 @@ async def generate_voiceover(text: str, output_path: str, progress_callback=None
         return False
 
 
+async def _run_ffmpeg_async(cmd: List[str]) -> int:
+    """
+    Run an ffmpeg command without blocking the event loop. Returns the exit code.
+    Uses the executor rather than asyncio subprocesses, which are unavailable
+    under the selector event loop uvicorn may use on Windows.
+    """
+    loop = asyncio.get_running_loop()
+    result = await loop.run_in_executor(None, lambda: subprocess.run(cmd, capture_output=True))
+    return result.returncode
+
+
+def _segment_cache_key(entry: Dict) -> str:
+    """Narration text, voice and slot length - a segment is reusable while these match."""
+    import hashlib
+    slot = round(entry['end'] - entry['start'], 3)
+    key = f"{EDGE_TTS_VOICE}|{EDGE_TTS_RATE}|{slot}|{entry['text']}"
+    return hashlib.sha1(key.encode('utf-8')).hexdigest()[:20]
+
+
+def _prune_voiceover_cache():
+    """Drop least recently used segments until the cache is under VOICEOVER_CACHE_MAX_BYTES."""
+    with os.scandir(VOICEOVER_CACHE_DIR) as it:
+        files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in it if e.is_file()]
+    total = sum(size for _, size, _ in files)
+    if total <= VOICEOVER_CACHE_MAX_BYTES:
+        return
+    files.sort()
+    target = int(VOICEOVER_CACHE_MAX_BYTES * 0.9)
+    for _, size, path in files:
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+
+
+async def _synthesize_timed_segment(
+    index: int,
+    entry: Dict,
+    temp_dir: Path,
+    semaphore: asyncio.Semaphore,
+    cache_dir: Optional[Path] = None
+) -> Optional[Path]:
+    """
+    Synthesize one subtitle entry and speed it up (max 1.5x) if it overruns its slot.
+    Returns the path of the audio to place on the timeline, or None on failure.
+
+    With a cache_dir, finished segments are kept there by _segment_cache_key, so
+    re-rendering after a subtitle edit only synthesizes the lines that changed.
+    """
+    cached_file = cache_dir / f"{_segment_cache_key(entry)}.mp3" if cache_dir else None
+    if cached_file and cached_file.exists():
+        try:
+            os.utime(cached_file, None)  # Recently used - pruned last
+        except OSError:
+            pass
+        return cached_file
+
+    async with semaphore:
+        temp_file = temp_dir / f"segment_{index:04d}.mp3"
+        if not await generate_voiceover_segment(entry['text'], temp_file) or not temp_file.exists():
+            return None
+
+        result_file = temp_file
+        available_duration = entry['end'] - entry['start']
+        segment_duration = await asyncio.get_running_loop().run_in_executor(
+            None, get_audio_duration, str(temp_file)
+        )
+
+        # Speed up if needed
+        if segment_duration > available_duration > 0:
+            speed_factor = segment_duration / available_duration
+            if speed_factor < 1.5:
+                sped_up_file = temp_dir / f"segment_{index:04d}_fast.mp3"
+                await _run_ffmpeg_async([
+                    "ffmpeg", "-y", "-i", str(temp_file),
+                    "-filter:a", f"atempo={min(speed_factor, 1.5)}",
+                    str(sped_up_file)
+                ])
+                if sped_up_file.exists():
+                    result_file = sped_up_file
+
+        if cached_file:
+            try:
+                shutil.copyfile(result_file, cached_file)
+                return cached_file
+            except OSError as e:
+                print(f"[WARNING] Could not cache voiceover segment {index}: {e}")
+        return result_file
+
+
+def _mix_voiceover_segments(
+    segment_paths: List[Optional[Path]],
+    entries: List[Dict],
+    total_duration_ms: int,
+    output_path: str
+) -> bool:
+    """
+    Overlay synthesized segments onto a silent track at their subtitle start times.
+    CPU-bound: run in an executor, not on the event loop.
+    """
+    from pydub import AudioSegment
+
+    combined = AudioSegment.silent(duration=total_duration_ms)
+    for i, (segment_path, entry) in enumerate(zip(segment_paths, entries)):
+        if not segment_path:
+            continue
+        try:
+            segment = AudioSegment.from_mp3(str(segment_path))
+            start_ms = int(entry['start'] * 1000)
+            if start_ms < total_duration_ms:
+                combined = combined.overlay(segment, position=start_ms)
+        except Exception as e:
+            print(f"[WARNING] Failed to process segment {i}: {e}")
+
+    combined.export(str(output_path), format="mp3")
+    return True
+
+
+def _prepare_voiceover_entries(srt_path: str, cleaned_texts: Optional[Dict[str, str]] = None) -> List[Dict]:
+    """
+    Parse and de-duplicate SRT entries for voiceover (blocking).
+    cleaned_texts maps subtitle text to narration text (from the combined analysis).
+    """
+    raw_entries = parse_srt_file(srt_path)
+    if not raw_entries:
+        return []
+    if cleaned_texts:
+        for entry in raw_entries:
+            entry['text'] = cleaned_texts.get(entry['text'], entry['text'])
+    return clean_and_merge_srt(raw_entries)
+
+
 async def generate_voiceover_from_srt(
     srt_path: str,
     output_path: str,
     video_duration: float,
-    progress_callback=None
+    progress_callback=None,
+    cleaned_texts: Optional[Dict[str, str]] = None
 ) -> bool:
     """
     Generate synchronized voiceover from SRT file.
     Creates audio segments for each subtitle entry and combines them.
+    When cleaned_texts is given (narration text already produced by the combined
+    transcript analysis) the separate AI cleaning pass is skipped.
+
+    Runs natively on the caller's event loop: Edge-TTS segments are synthesized
+    concurrently (bounded by VOICEOVER_TTS_CONCURRENCY), while blocking work
+    (parsing, AI cleaning, ffmpeg, mixing) is offloaded to the default executor.
     """
     if not os.path.exists(srt_path):
         print(f"[ERROR] SRT file not found: {srt_path}")
         return False
 
+    loop = asyncio.get_running_loop()
+
     if progress_callback:
         progress_callback(0, "מייצר קריינות מסונכרנת...")
 
-    try:
-        from pydub import AudioSegment
-    except ImportError:
+    if importlib.util.find_spec("pydub") is None:
         print("[WARNING] pydub not available, falling back to simple voiceover")
-        entries = parse_srt_file(srt_path)
-        entries = clean_and_merge_srt(entries)
+        entries = await loop.run_in_executor(None, _prepare_voiceover_entries, srt_path, cleaned_texts)
         full_text = ' '.join([clean_text_for_voiceover(e['text']) for e in entries])
         return await generate_voiceover(full_text, output_path, progress_callback)
 
     # Parse and clean SRT entries
-    raw_entries = parse_srt_file(srt_path)
-    if not raw_entries:
-        return False
-
     if progress_callback:
         progress_callback(5, "מנקה כפילויות וחפיפות...")
 
-    entries = clean_and_merge_srt(raw_entries)
+    entries = await loop.run_in_executor(None, _prepare_voiceover_entries, srt_path, cleaned_texts)
     if not entries:
         return False
 
     # AI text cleaning
-    if progress_callback:
-        progress_callback(8, "מנקה טקסט עם AI...")
-    entries = clean_srt_text_with_ai(entries, progress_callback)
+    if cleaned_texts is None:
+        if progress_callback:
+            progress_callback(8, "מנקה טקסט עם AI...")
+        entries = await loop.run_in_executor(None, clean_srt_text_with_ai, entries, progress_callback)
 
     # Save cleaned SRT
     cleaned_srt_path = Path(srt_path).parent / f"{Path(srt_path).stem}_cleaned.srt"
-    write_srt_from_entries(entries, str(cleaned_srt_path))
+    await loop.run_in_executor(None, write_srt_from_entries, entries, str(cleaned_srt_path))
 
-    temp_dir = Path(output_path).parent / "temp_voiceover"
+    # Per-job temp dir so concurrent voiceovers don't clobber each other's segments.
+    # Finished segments go to the shared cache so a re-render after edits reuses them.
+    temp_dir = Path(output_path).parent / f"temp_voiceover_{Path(output_path).stem}"
     temp_dir.mkdir(exist_ok=True)
+    cache_dir = VOICEOVER_CACHE_DIR
+    cache_dir.mkdir(parents=True, exist_ok=True)
 
     try:
         total_duration_ms = int(video_duration * 1000)
-        combined = AudioSegment.silent(duration=total_duration_ms)
         total_entries = len(entries)
+        semaphore = asyncio.Semaphore(VOICEOVER_TTS_CONCURRENCY)
+        completed = 0
 
-        for i, entry in enumerate(entries):
+        async def synthesize(i: int, entry: Dict) -> Optional[Path]:
+            nonlocal completed
+            result = await _synthesize_timed_segment(i, entry, temp_dir, semaphore, cache_dir)
+            completed += 1
             if progress_callback:
-                pct = int(10 + (i / total_entries) * 70)
-                progress_callback(pct, f"מייצר קריינות... ({i+1}/{total_entries})")
-
-            temp_file = temp_dir / f"segment_{i:04d}.mp3"
-            success = await generate_voiceover_segment(entry['text'], temp_file)
-
-            if success and temp_file.exists():
-                try:
-                    segment = AudioSegment.from_mp3(str(temp_file))
-                    start_ms = int(entry['start'] * 1000)
-                    available_duration_ms = int((entry['end'] - entry['start']) * 1000)
-
-                    # Speed up if needed
-                    if len(segment) > available_duration_ms > 0:
-                        speed_factor = len(segment) / available_duration_ms
-                        if speed_factor < 1.5:
-                            sped_up_file = temp_dir / f"segment_{i:04d}_fast.mp3"
-                            speed_cmd = [
-                                "ffmpeg", "-y", "-i", str(temp_file),
-                                "-filter:a", f"atempo={min(speed_factor, 1.5)}",
-                                str(sped_up_file)
-                            ]
-                            subprocess.run(speed_cmd, capture_output=True)
-                            if sped_up_file.exists():
-                                segment = AudioSegment.from_mp3(str(sped_up_file))
-
-                    if start_ms < total_duration_ms:
-                        combined = combined.overlay(segment, position=start_ms)
-
-                except Exception as e:
-                    print(f"[WARNING] Failed to process segment {i}: {e}")
+                pct = int(10 + (completed / total_entries) * 70)
+                progress_callback(pct, f"מייצר קריינות... ({completed}/{total_entries})")
+            return result
+
+        segment_paths = await asyncio.gather(
+            *[synthesize(i, entry) for i, entry in enumerate(entries)]
+        )
 
         if progress_callback:
             progress_callback(90, "שומר קובץ קריינות...")
 
-        combined.export(str(output_path), format="mp3")
-
-        # Cleanup temp files
-        for f in temp_dir.glob("*.mp3"):
-            try:
-                f.unlink()
-            except:
-                pass
+        await loop.run_in_executor(
+            None, _mix_voiceover_segments, segment_paths, entries, total_duration_ms, str(output_path)
+        )
+        await loop.run_in_executor(None, _prune_voiceover_cache)
 
         if progress_callback:
             progress_callback(100, "קריינות נוצרה!")
@@ -307,9 +605,16 @@ async def generate_voiceover_from_srt(
         print(f"[ERROR] Failed to generate voiceover from SRT: {e}")
         return False
 
+    finally:
+        # Cleanup temp files
+        shutil.rmtree(temp_dir, ignore_errors=True)
+
 
 def generate_voiceover_sync(text: str, output_path: str, progress_callback=None) -> bool:
-    """Synchronous wrapper for generate_voiceover."""
+    """
+    Synchronous wrapper for generate_voiceover.
+    For scripts only - inside the app, await generate_voiceover directly.
+    """
     return asyncio.run(generate_voiceover(text, output_path, progress_callback))
 
 
@@ -319,7 +624,10 @@ def generate_voiceover_from_srt_sync(
     video_duration: float,
     progress_callback=None
 ) -> bool:
-    """Synchronous wrapper for generate_voiceover_from_srt."""
+    """
+    Synchronous wrapper for generate_voiceover_from_srt.
+    For scripts only - inside the app, await generate_voiceover_from_srt directly.
+    """
     return asyncio.run(generate_voiceover_from_srt(srt_path, output_path, video_duration, progress_callback))
 
 
@@ -373,39 +681,236 @@ def extract_and_compress_audio(video_path: str, output_audio_path: str, progress
         return False
 
 
+# =============================================================================
+# Music Ducking
+# =============================================================================
+
+def speech_intervals_from_entries(entries: List[Dict]) -> List[Tuple[float, float]]:
+    """Build speech activity intervals from transcript/subtitle entry times."""
+    return [
+        (float(e['start']), float(e['end']))
+        for e in entries
+        if e.get('text', '').strip() and e['end'] > e['start']
+    ]
+
+
+def detect_speech_intervals(
+    audio_path: str,
+    frame_seconds: float = 0.05,
+    min_speech_seconds: float = 0.2
+) -> List[Tuple[float, float]]:
+    """
+    Detect speech activity with a single cheap RMS pass over 8 kHz mono PCM.
+    Used when no transcript timings are available. Returns [] on failure.
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        print("[WARNING] numpy not available, cannot detect speech for ducking")
+        return []
+
+    sample_rate = 8000
+    cmd = [
+        "ffmpeg", "-v", "error", "-i", str(audio_path),
+        "-vn", "-ac", "1", "-ar", str(sample_rate),
+        "-f", "s16le", "-"
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, timeout=300)
+    except Exception as e:
+        print(f"[WARNING] Speech detection failed: {e}")
+        return []
+
+    samples = np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32)
+    frame_len = int(sample_rate * frame_seconds)
+    n_frames = len(samples) // frame_len
+    if n_frames == 0:
+        return []
+
+    frames = samples[:n_frames * frame_len].reshape(n_frames, frame_len)
+    rms = np.sqrt(np.mean(frames * frames, axis=1))
+
+    # Relative threshold so quiet recordings still register speech; absolute floor ignores hiss
+    threshold = max(0.1 * float(np.percentile(rms, 95)), 300.0)
+    active = np.concatenate(([False], rms > threshold, [False]))
+    edges = np.flatnonzero(active[1:] != active[:-1])
+
+    intervals = []
+    for start_frame, end_frame in zip(edges[::2], edges[1::2]):
+        start, end = start_frame * frame_seconds, end_frame * frame_seconds
+        if end - start >= min_speech_seconds:
+            intervals.append((round(start, 3), round(end, 3)))
+
+    print(f"[DUCKING] Detected {len(intervals)} speech intervals via RMS")
+    return intervals
+
+
+def _merge_speech_intervals(
+    intervals: List[Tuple[float, float]],
+    min_gap: float,
+    max_intervals: int
+) -> List[Tuple[float, float]]:
+    """Merge overlapping/close intervals, then the closest pairs until under max_intervals."""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start - merged[-1][1] < min_gap:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    while len(merged) > max_intervals:
+        i = min(range(len(merged) - 1), key=lambda k: merged[k + 1][0] - merged[k][1])
+        merged[i:i + 2] = [(merged[i][0], merged[i + 1][1])]
+
+    return merged
+
+
+def build_ducking_volume_expr(
+    speech_intervals: List[Tuple[float, float]],
+    base_volume: float,
+    ducked_volume: float,
+    attack: float = DUCKING_ATTACK_SECONDS,
+    release: float = DUCKING_RELEASE_SECONDS
+) -> Optional[str]:
+    """
+    Compile speech intervals into a piecewise FFmpeg `volume` expression.
+
+    Music sits at base_volume, ramps down to ducked_volume over `attack` seconds
+    before each speech interval and back up over `release` seconds after it.
+    Intervals are merged so their ramps never overlap, which lets the expression
+    sum per-interval terms instead of taking a max. Returns None if no speech.
+    """
+    intervals = _merge_speech_intervals(speech_intervals, attack + release, DUCKING_MAX_INTERVALS)
+    if not intervals:
+        return None
+
+    terms = [
+        f"clip((t-{start - attack:.3f})/{attack},0,1)*clip(({end + release:.3f}-t)/{release},0,1)"
+        for start, end in intervals
+    ]
+    depth = base_volume - ducked_volume
+    return f"{base_volume:.4f}-{depth:.4f}*({'+'.join(terms)})"
+
+
 # =============================================================================
 # Music Library Management
 # =============================================================================
 
-def get_random_music(style: str, music_dir: str) -> Optional[Path]:
+MUSIC_EXTENSIONS = ('.mp3', '.wav', '.m4a', '.ogg')
+
+# In-memory library indexes, one per music directory:
+# {dir: {'mtime': float, 'tracks': [track, ...], 'by_style': {style: [track, ...]}}}
+_music_library_indexes: Dict[str, Dict] = {}
+_music_library_lock = threading.Lock()
+
+
+def _music_moods(filename: str) -> List[str]:
+    """Mood tags for a track, matched from MUSIC_STYLE_KEYWORDS against its filename."""
+    name = filename.lower()
+    return [
+        style for style, keywords in MUSIC_STYLE_KEYWORDS.items()
+        if any(keyword in name for keyword in keywords)
+    ]
+
+
+def _build_music_library_index(music_path: Path) -> Dict:
+    """Scan a music directory once and group its tracks by mood."""
+    tracks = []
+    with os.scandir(music_path) as it:
+        for entry in it:
+            if not entry.is_file() or 'temp' in entry.name.lower():
+                continue
+            f = Path(entry.path)
+            if f.suffix.lower() not in MUSIC_EXTENSIONS:
+                continue
+            analysis = get_cached_music_analysis(f)
+            tracks.append({
+                'name': f.stem,
+                'filename': f.name,
+                'path': str(f),
+                'duration': analysis.get('duration') if analysis else None,
+                'moods': _music_moods(f.name),
+            })
+
+    tracks.sort(key=lambda x: x['name'].lower())
+
+    by_style: Dict[str, List[Dict]] = {style: [] for style in MUSIC_STYLE_KEYWORDS}
+    for track in tracks:
+        for mood in track['moods']:
+            by_style[mood].append(track)
+
+    return {'mtime': music_path.stat().st_mtime, 'tracks': tracks, 'by_style': by_style}
+
+
+def get_music_library_index(music_dir: str) -> Optional[Dict]:
     """
-    Get a random music file matching the given style.
+    Return the in-memory index for a music directory.
+
+    The directory is rescanned only when its mtime changes (a track was added,
+    removed or renamed), so steady-state lookups cost a single stat call.
     """
     music_path = Path(music_dir)
     if not music_path.exists():
-        print(f"[WARNING] Music directory not found: {music_dir}")
         return None
 
-    keywords = MUSIC_STYLE_KEYWORDS.get(style.lower(), [style.lower()])
+    key = str(music_path.resolve())
+    mtime = music_path.stat().st_mtime
 
-    all_music = list(music_path.glob("*.mp3"))
-    matching_files = []
+    with _music_library_lock:
+        index = _music_library_indexes.get(key)
+        if index is None or index['mtime'] != mtime:
+            index = _build_music_library_index(music_path)
+            _music_library_indexes[key] = index
+            print(f"[INFO] Indexed {len(index['tracks'])} music files in {music_dir}")
+        return index
 
-    for music_file in all_music:
-        if 'temp' in str(music_file).lower():
-            continue
-        filename_lower = music_file.name.lower()
-        for keyword in keywords:
-            if keyword in filename_lower:
-                matching_files.append(music_file)
-                break
-
-    if matching_files:
-        selected = random.choice(matching_files)
+
+def warm_music_library(music_dir: str):
+    """
+    Build the library index at startup and analyze new tracks in the background.
+    Durations and loudness land in the analysis cache; the index picks them up.
+    """
+    index = get_music_library_index(music_dir)
+    if not index:
+        return
+
+    pending = [t['path'] for t in index['tracks'] if t['duration'] is None]
+    if not pending:
+        return
+
+    def _analyze_pending():
+        for path in pending:
+            analysis = analyze_music_track(path)
+            if analysis:
+                for track in index['tracks']:
+                    if track['path'] == path:
+                        track['duration'] = analysis.get('duration')
+        print(f"[INFO] Analyzed {len(pending)} new music files")
+
+    threading.Thread(target=_analyze_pending, daemon=True).start()
+
+
+def get_random_music(style: str, music_dir: str) -> Optional[Path]:
+    """
+    Get a random music file matching the given style.
+    """
+    index = get_music_library_index(music_dir)
+    if index is None:
+        print(f"[WARNING] Music directory not found: {music_dir}")
+        return None
+
+    style = style.lower()
+    matching = index['by_style'].get(style)
+    if matching is None:
+        # Not a known mood - treat the style itself as a filename keyword
+        matching = [t for t in index['tracks'] if style in t['filename'].lower()]
+
+    if matching:
+        selected = Path(random.choice(matching)['path'])
         print(f"[INFO] Selected music for style '{style}': {selected.name}")
         return selected
-    elif all_music:
-        selected = random.choice([f for f in all_music if 'temp' not in str(f).lower()])
+    elif index['tracks']:
+        selected = Path(random.choice(index['tracks'])['path'])
         print(f"[INFO] No music matches for style '{style}', using random: {selected.name}")
         return selected
     else:
@@ -415,26 +920,144 @@ def get_random_music(style: str, music_dir: str) -> Optional[Path]:
 
 def list_music_library(music_dir: str) -> List[Dict]:
     """
-    List all music files in the library directory.
+    List all music files in the library directory, sorted by name.
     """
-    music_path = Path(music_dir)
-    if not music_path.exists():
+    index = get_music_library_index(music_dir)
+    if index is None:
         return []
+    return [dict(track) for track in index['tracks']]
 
-    music_files = []
-    for ext in ['*.mp3', '*.wav', '*.m4a', '*.ogg']:
-        for f in music_path.glob(ext):
-            if 'temp' in str(f).lower():
-                continue
-            music_files.append({
-                'name': f.stem,
-                'filename': f.name,
-                'path': str(f)
-            })
 
-    music_files.sort(key=lambda x: x['name'].lower())
-    print(f"[INFO] Found {len(music_files)} music files in library")
-    return music_files
+# =============================================================================
+# Music Loudness Analysis
+# =============================================================================
+
+# Per-track analysis cache: {resolved path: {mtime, size, duration, integrated_lufs, true_peak_db}}
+_music_analysis_index: Optional[Dict[str, Dict]] = None
+_music_analysis_lock = threading.Lock()
+
+
+def _load_music_analysis_index() -> Dict[str, Dict]:
+    """Load the persisted analysis index once per process."""
+    global _music_analysis_index
+    if _music_analysis_index is None:
+        _music_analysis_index = {}
+        if MUSIC_ANALYSIS_INDEX.exists():
+            try:
+                with open(MUSIC_ANALYSIS_INDEX, 'r', encoding='utf-8') as f:
+                    _music_analysis_index = json.load(f)
+            except Exception as e:
+                print(f"[WARNING] Could not read music analysis index: {e}")
+    return _music_analysis_index
+
+
+def _save_music_analysis_index(index: Dict[str, Dict]):
+    """Persist the analysis index, dropping entries whose file is gone."""
+    for key in [k for k in index if not os.path.exists(k)]:
+        del index[key]
+    try:
+        tmp_path = MUSIC_ANALYSIS_INDEX.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, MUSIC_ANALYSIS_INDEX)
+    except Exception as e:
+        print(f"[WARNING] Could not save music analysis index: {e}")
+
+
+def _measure_loudness(audio_path: str) -> Optional[Dict]:
+    """
+    Measure integrated loudness (LUFS) and true peak (dBTP) in one decode pass.
+    Uses loudnorm in analysis-only mode; nothing is written.
+    """
+    cmd = [
+        'ffmpeg', '-hide_banner', '-nostats', '-i', str(audio_path),
+        '-af', 'loudnorm=print_format=json', '-f', 'null', '-'
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+        match = re.search(r'\{[^{}]*"input_i"[^{}]*\}', result.stderr)
+        if not match:
+            print(f"[WARNING] Loudness analysis produced no stats for {audio_path}")
+            return None
+        stats = json.loads(match.group(0))
+        integrated = float(stats['input_i'])
+        peak = float(stats['input_tp'])
+        if integrated == float('-inf') or integrated < -70:
+            return None  # Silent track - no meaningful gain
+        return {'integrated_lufs': integrated, 'true_peak_db': peak}
+    except Exception as e:
+        print(f"[WARNING] Loudness analysis failed for {audio_path}: {e}")
+        return None
+
+
+def get_cached_music_analysis(audio_path) -> Optional[Dict]:
+    """Return the stored analysis for a track without running ffmpeg."""
+    key = str(Path(audio_path).resolve())
+    with _music_analysis_lock:
+        cached = _load_music_analysis_index().get(key)
+    if cached and os.path.exists(key):
+        stat = os.stat(key)
+        if cached.get('mtime') == stat.st_mtime and cached.get('size') == stat.st_size:
+            return cached
+    return None
+
+
+def analyze_music_track(audio_path, force: bool = False) -> Optional[Dict]:
+    """
+    Return cached loudness/duration/peak analysis for a music track.
+
+    The analysis runs once per file version (path + mtime + size) and is stored
+    in MUSIC_ANALYSIS_INDEX, so repeat jobs with the same track cost nothing.
+    Call it when a track enters the library; merges fall back to calling it lazily.
+    """
+    if not audio_path or not os.path.exists(str(audio_path)):
+        return None
+
+    key = str(Path(audio_path).resolve())
+    stat = os.stat(key)
+
+    with _music_analysis_lock:
+        index = _load_music_analysis_index()
+        cached = index.get(key)
+        if (cached and not force and cached.get('mtime') == stat.st_mtime
+                and cached.get('size') == stat.st_size):
+            return cached
+
+    loudness = _measure_loudness(key)
+    entry = {
+        'mtime': stat.st_mtime,
+        'size': stat.st_size,
+        'duration': get_audio_duration(key),
+        'integrated_lufs': loudness['integrated_lufs'] if loudness else None,
+        'true_peak_db': loudness['true_peak_db'] if loudness else None,
+    }
+
+    with _music_analysis_lock:
+        index = _load_music_analysis_index()
+        index[key] = entry
+        _save_music_analysis_index(index)
+
+    if loudness:
+        print(f"[INFO] Analyzed music {Path(key).name}: "
+              f"{entry['integrated_lufs']:.1f} LUFS, peak {entry['true_peak_db']:.1f} dBTP")
+    return entry
+
+
+def get_music_gain(audio_path) -> float:
+    """
+    Linear gain that brings a track to MUSIC_TARGET_LUFS.
+
+    Limited so the true peak stays under MUSIC_PEAK_CEILING_DB and clamped to
+    +/- MUSIC_MAX_GAIN_DB. Returns 1.0 when the track could not be analyzed.
+    """
+    analysis = analyze_music_track(audio_path)
+    if not analysis or analysis.get('integrated_lufs') is None:
+        return 1.0
+
+    gain_db = MUSIC_TARGET_LUFS - analysis['integrated_lufs']
+    gain_db = min(gain_db, MUSIC_PEAK_CEILING_DB - analysis['true_peak_db'])
+    gain_db = max(-MUSIC_MAX_GAIN_DB, min(MUSIC_MAX_GAIN_DB, gain_db))
+    return 10 ** (gain_db / 20)
 
 
 def download_audio_from_url(url: str, output_dir: str, progress_callback=None) -> Optional[Path]:
@@ -485,6 +1108,7 @@ def download_audio_from_url(url: str, output_dir: str, progress_callback=None) -
 
             if expected_file.exists():
                 print(f"[SUCCESS] Audio downloaded: {expected_file}")
+                analyze_music_track(expected_file)
                 return expected_file
 
             for f in output_path.glob(f"downloaded_{file_id}.*"):
@@ -499,7 +1123,9 @@ def download_audio_from_url(url: str, output_dir: str, progress_callback=None) -
                         subprocess.run(convert_cmd, capture_output=True)
                         if mp3_path.exists():
                             f.unlink()
+                            analyze_music_track(mp3_path)
                             return mp3_path
+                    analyze_music_track(f)
                     return f
 
         return None
@@ -523,9 +1149,7 @@ def transcribe_with_groq(video_path: str, srt_path: str, progress_callback=None)
         return False, ""
 
     try:
-        from groq import Groq
-
-        client = Groq(api_key=GROQ_API_KEY)
+        client = get_groq_client()
 
         audio_path = Path(video_path).parent / f"{Path(video_path).stem}_temp_audio.mp3"
 
@@ -538,13 +1162,15 @@ def transcribe_with_groq(video_path: str, srt_path: str, progress_callback=None)
         print(f"[INFO] Sending audio to Groq API...")
 
         with open(audio_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                file=(audio_path.name, audio_file.read()),
-                model="whisper-large-v3",
-                language="he",
-                response_format="verbose_json",
-                temperature=0.0
-            )
+            audio_bytes = audio_file.read()
+
+        transcription = run_llm_call('groq-asr', lambda: client.audio.transcriptions.create(
+            file=(audio_path.name, audio_bytes),
+            model="whisper-large-v3",
+            language="he",
+            response_format="verbose_json",
+            temperature=0.0
+        ))
 
         if progress_callback:
             progress_callback(18, "מעבד תוצאות תמלול...")
@@ -577,6 +1203,19 @@ def transcribe_with_groq(video_path: str, srt_path: str, progress_callback=None)
 
         print(f"[INFO] SRT created with max {MAX_WORDS_PER_SUBTITLE} words per subtitle")
 
+        # Whisper confidence per segment - decides whether the AI correction pass is needed
+        if segments:
+            save_asr_confidence(srt_path, [
+                {
+                    'start': seg.get('start', 0),
+                    'end': seg.get('end', 0),
+                    'avg_logprob': seg.get('avg_logprob'),
+                    'compression_ratio': seg.get('compression_ratio'),
+                    'no_speech_prob': seg.get('no_speech_prob'),
+                }
+                for seg in segments
+            ])
+
         # Cleanup temp audio
         try:
             audio_path.unlink()
@@ -86,6 +86,65 @@ def send_file_by_url(chat_id: str, file_url: str, filename: str, caption: str =
         return {"error": str(e)}
 
 
+# ============================================================================
+# Async senders - for coroutines (webhook handlers run on the event loop)
+# ============================================================================
+
+_async_client = None
+
+
+def _get_async_client():
+    """Shared httpx.AsyncClient with keep-alive to api.greenapi.com."""
+    global _async_client
+    if _async_client is None:
+        import httpx
+        _async_client = httpx.AsyncClient(verify=False, timeout=60)
+    return _async_client
+
+
+async def send_text_message_async(chat_id: str, text: str) -> dict:
+    """Non-blocking send_text_message."""
+    if not is_configured():
+        print("[GreenAPI] Not configured, skipping send")
+        return {"error": "not configured"}
+
+    try:
+        resp = await _get_async_client().post(
+            _api_url("sendMessage"),
+            json={"chatId": chat_id, "message": text},
+            timeout=30,
+        )
+        result = resp.json()
+        print(f"[GreenAPI] sendMessage -> {result}")
+        return result
+    except Exception as e:
+        print(f"[GreenAPI] sendMessage error: {e}")
+        return {"error": str(e)}
+
+
+async def send_file_by_url_async(chat_id: str, file_url: str, filename: str, caption: str = "") -> dict:
+    """Non-blocking send_file_by_url."""
+    if not is_configured():
+        return {"error": "not configured"}
+
+    try:
+        payload = {
+            "chatId": chat_id,
+            "urlFile": file_url,
+            "fileName": filename,
+        }
+        if caption:
+            payload["caption"] = caption
+
+        resp = await _get_async_client().post(_api_url("sendFileByUrl"), json=payload)
+        result = resp.json()
+        print(f"[GreenAPI] sendFileByUrl -> {result}")
+        return result
+    except Exception as e:
+        print(f"[GreenAPI] sendFileByUrl error: {e}")
+        return {"error": str(e)}
+
+
 def download_media(download_url: str) -> str | None:
     """
     Download incoming media (video) from Green API CDN to inputs/ folder.
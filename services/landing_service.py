@@ -9,18 +9,9 @@ def landing_page_chat(
     conversation_history: list = None,
     current_html: str = ""
 ) -> dict:
-    import os
-    import sys
-    import ssl
-    import certifi
-
-    # SSL fix (same as video_planner_chat)
-    if 'HTTPLIB2_CA_CERTS' in os.environ:
-        del os.environ['HTTPLIB2_CA_CERTS']
-    os.environ['HTTPLIB2_CA_CERTS'] = certifi.where()
-    ssl._create_default_https_context = ssl._create_unverified_context
-
-    import google.generativeai as genai
+    from utils.llm_cache import cached_completion
+    from utils.llm_clients import get_gemini_model
+    from utils.llm_scheduler import PRIORITY_INTERACTIVE
 
     if not user_message or not user_message.strip():
         return {"success": False, "html": current_html, "ai_message": "", "error": "No message provided"}
@@ -251,26 +242,23 @@ document.querySelectorAll('.reveal').forEach(el => observer.observe(el));
 - testimonials: ציטוטים שנשמעים אנושיים ואמיתיים, לא גנריים"""
 
     try:
-        genai.configure(transport='rest')
-
-        model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash',
-            system_instruction=system_prompt
-        )
+        model = get_gemini_model('gemini-2.0-flash', system_prompt)
 
         history_for_gemini = []
         for msg in conversation_history:
             role = "user" if msg.get("role") == "user" else "model"
             history_for_gemini.append({"role": role, "parts": [msg.get("content", "")]})
 
-        chat = model.start_chat(history=history_for_gemini)
-
         full_input = user_message
         if current_html and current_html.strip():
             full_input = f"הדף הנוכחי:\n```html\n{current_html}\n```\n\nבקשת המשתמש: {user_message}"
 
-        response = chat.send_message(full_input)
-        response_text = response.text.strip()
+        response_text = cached_completion(
+            'gemini/gemini-2.0-flash',
+            {"system": system_prompt, "history": history_for_gemini, "input": full_input},
+            lambda: model.start_chat(history=history_for_gemini).send_message(full_input).text,
+            priority=PRIORITY_INTERACTIVE
+        ).strip()
 
         # Parse: extract AI message and HTML separately
         ai_message = ""
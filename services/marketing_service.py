@@ -2,10 +2,21 @@
 Marketing Service - Handles marketing kit generation using AI.
 """
 import json
+import os
 import re
-from typing import Dict, Optional
+import shutil
+from typing import Dict, List, Optional
 
-from utils.config import GROQ_API_KEY
+from utils.config import (
+    GROQ_API_KEY,
+    GEMINI_API_KEY,
+    COMBINED_ANALYSIS_MAX_LINES,
+    MARKETING_MAP_CHUNK_CHARS,
+    MARKETING_MAP_MAX_PARALLEL,
+    MARKETING_MAP_GROQ_MAX_CHUNKS
+)
+from utils.llm_cache import cached_completion
+from utils.llm_clients import get_groq_client, get_gemini_model
 
 
 def clean_json_from_ai_response(text: str) -> str:
@@ -88,35 +99,36 @@ def safe_parse_marketing_json(text: str) -> Optional[Dict]:
         return None
 
 
-def generate_marketing_kit(
-    transcript_text: str,
-    video_duration: float,
-    progress_callback=None
-) -> Optional[Dict]:
-    """
-    Use Groq LLM to generate marketing content.
-    Returns: titles, post, keywords, hashtags, viral_moments, image_prompt, music_style
-    """
-    if not transcript_text:
-        print("[WARNING] No transcript for marketing kit")
-        return None
+def _validate_viral_moments(moments, video_duration: float) -> List[Dict]:
+    """Keep moments inside the video, at least 10 seconds long (max 3 shorts)."""
+    valid_moments = []
+    for moment in moments or []:
+        if not isinstance(moment, dict):
+            continue
+        start = moment.get('start', 0)
+        end = moment.get('end', start + 30)
 
-    if not GROQ_API_KEY:
-        print("[ERROR] Groq API key not configured")
-        return None
+        # Ensure moments are within video duration
+        if start < video_duration:
+            # Clamp end to video duration
+            end = min(end, video_duration)
+            # Ensure minimum duration of 10 seconds
+            if end - start >= 10:
+                valid_moments.append({
+                    'start': start,
+                    'end': end,
+                    'reason': moment.get('reason', 'רגע מעניין')
+                })
 
-    try:
-        from groq import Groq
+    print(f"[INFO] Valid viral moments: {len(valid_moments)}")
+    return valid_moments[:3]
 
-        if progress_callback:
-            progress_callback(22, "יוצר ערכת שיווק...")
 
-        client = Groq(api_key=GROQ_API_KEY)
+def _marketing_kit_prompt(material: str, video_duration: float) -> str:
+    """Final marketing kit prompt; `material` is the transcript or the map-stage summary."""
+    return f"""אתה מומחה שיווק דיגיטלי. נתח את התמליל הבא של סרטון וצור חומרי שיווק.
 
-        prompt = f"""אתה מומחה שיווק דיגיטלי. נתח את התמליל הבא של סרטון וצור חומרי שיווק.
-
-תמליל הסרטון:
-{transcript_text[:4000]}
+{material}
 
 אורך הסרטון: {int(video_duration)} שניות
 
@@ -147,17 +159,235 @@ def generate_marketing_kit(
 - image_prompt צריך להיות באנגלית ולתאר תמונה מושכת
 """
 
-        response = client.chat.completions.create(
+
+def _complete_marketing_prompt(client, prompt: str, bypass_cache: bool) -> Optional[str]:
+    """Run the final marketing kit prompt on Groq (through the LLM cache)."""
+    return cached_completion(
+        "groq/llama-3.3-70b-versatile", prompt,
+        lambda: client.chat.completions.create(
             model="llama-3.3-70b-versatile",
             messages=[{"role": "user", "content": prompt}],
             temperature=0.7,
             max_tokens=2000
+        ).choices[0].message.content,
+        temperature=0.7,
+        bypass=bypass_cache,
+        max_output_tokens=2000
+    )
+
+
+MARKETING_MAP_PROMPT = """אתה מומחה שיווק דיגיטלי. לפניך קטע {part} מתוך {parts} של תמליל סרטון ארוך.
+כל שורה מתחילה בזמן ההתחלה שלה בשניות.
+
+{lines}
+
+החזר JSON בפורמט הבא בלבד:
+{{
+    "key_points": ["נקודה מרכזית 1", "נקודה מרכזית 2"],
+    "moments": [
+        {{"start": 130, "end": 160, "reason": "ציטוט חזק", "quote": "המשפט עצמו"}}
+    ],
+    "mood": "calm"
+}}
+
+הנחיות:
+- key_points: עד 5 רעיונות מרכזיים מהקטע
+- moments: עד 3 רגעים של 20-40 שניות שמתאימים לסרטונים קצרים, לפי זמני השורות בקטע בלבד
+- mood יכול להיות: calm, uplifting, dramatic, spiritual
+"""
+
+
+def _chunk_transcript_entries(entries: List[Dict], chunk_chars: int) -> List[List[Dict]]:
+    """Split SRT entries into consecutive chunks of roughly `chunk_chars` characters."""
+    chunks, current, size = [], [], 0
+    for entry in entries:
+        if current and size + len(entry['text']) > chunk_chars:
+            chunks.append(current)
+            current, size = [], 0
+        current.append(entry)
+        size += len(entry['text']) + 8  # Timestamp prefix
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def _map_prompt(chunk: List[Dict], part: int, parts: int) -> str:
+    lines = '\n'.join(f"{int(entry['start'])}s: {entry['text']}" for entry in chunk)
+    return MARKETING_MAP_PROMPT.format(part=part, parts=parts, lines=lines)
+
+
+def _evenly_spaced_chunks(chunks: List[List[Dict]], count: int) -> List[List[Dict]]:
+    """`count` chunks spread over the whole transcript (all of them if count <= 0)."""
+    if count <= 0 or len(chunks) <= count:
+        return chunks
+    step = len(chunks) / count
+    return [chunks[int(i * step + step / 2)] for i in range(count)]
+
+
+def _extract_chunk_highlights(client, chunk: List[Dict], part: int, parts: int,
+                              bypass_cache: bool) -> Optional[Dict]:
+    """
+    Map step: key points and candidate viral moments of one transcript chunk.
+    Runs on Gemini when configured (its token budget absorbs a whole long
+    transcript), otherwise on Groq.
+    """
+    prompt = _map_prompt(chunk, part, parts)
+
+    if GEMINI_API_KEY:
+        model = get_gemini_model('gemini-2.0-flash')
+        content = cached_completion(
+            'gemini/gemini-2.0-flash', prompt,
+            lambda: model.generate_content(
+                prompt,
+                generation_config={"response_mime_type": "application/json", "temperature": 0.3,
+                                   "max_output_tokens": 800}
+            ).text,
+            temperature=0.3,
+            bypass=bypass_cache,
+            max_output_tokens=800
         )
+    else:
+        content = cached_completion(
+            "groq/llama-3.3-70b-versatile", prompt,
+            lambda: client.chat.completions.create(
+                model="llama-3.3-70b-versatile",
+                messages=[{"role": "user", "content": prompt}],
+                temperature=0.3,
+                max_tokens=800,
+                response_format={"type": "json_object"}
+            ).choices[0].message.content,
+            temperature=0.3,
+            bypass=bypass_cache,
+            max_output_tokens=800
+        )
+    data = safe_parse_marketing_json(content)
+    if not isinstance(data, dict):
+        return None
+
+    # Keep only moments that fall inside this chunk
+    chunk_start, chunk_end = chunk[0]['start'], chunk[-1]['end']
+    moments = []
+    for moment in data.get('moments') or []:
+        if not isinstance(moment, dict):
+            continue
+        try:
+            start = float(moment.get('start', -1))
+        except (TypeError, ValueError):
+            continue
+        if chunk_start - 1 <= start <= chunk_end:
+            moments.append(moment)
+    data['moments'] = moments
+    return data
+
+
+def _marketing_kit_map_reduce(client, entries: List[Dict], video_duration: float,
+                              progress_callback=None, bypass_cache: bool = False) -> Optional[str]:
+    """
+    Marketing kit for long transcripts: extract key points and candidate moments
+    from every chunk concurrently (map), then write the kit from those (reduce).
+    Map calls are paced by the LLM scheduler, so on Groq a long video takes
+    longer rather than being sampled (unless MARKETING_MAP_GROQ_MAX_CHUNKS is set).
+    Returns the raw reduce response, or None if every map call failed.
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+
+    chunks = _chunk_transcript_entries(entries, MARKETING_MAP_CHUNK_CHARS)
+    if not GEMINI_API_KEY and MARKETING_MAP_GROQ_MAX_CHUNKS > 0:
+        total = len(chunks)
+        chunks = _evenly_spaced_chunks(chunks, MARKETING_MAP_GROQ_MAX_CHUNKS)
+        print(f"[INFO] Marketing map on Groq capped to {len(chunks)} of {total} chunks")
+    print(f"[INFO] Marketing kit map-reduce over {len(chunks)} transcript chunks")
+    if progress_callback:
+        progress_callback(24, f"מנתח את הסרטון ב-{len(chunks)} חלקים...")
+
+    def _map(args):
+        part, chunk = args
+        try:
+            return _extract_chunk_highlights(client, chunk, part, len(chunks), bypass_cache)
+        except Exception as e:
+            print(f"[WARNING] Marketing map call for chunk {part} failed: {e}")
+            return None
+
+    highlights: List[Optional[Dict]] = [None] * len(chunks)
+    with ThreadPoolExecutor(max_workers=min(MARKETING_MAP_MAX_PARALLEL, len(chunks))) as executor:
+        futures = {executor.submit(_map, (part, chunk)): part for part, chunk in enumerate(chunks, 1)}
+        for done, future in enumerate(as_completed(futures), 1):
+            highlights[futures[future] - 1] = future.result()
+            if progress_callback:
+                progress_callback(24 + (3 * done) // len(chunks), f"ניתחו {done} מתוך {len(chunks)} חלקים...")
+
+    if not any(highlights):
+        print("[WARNING] All marketing map calls failed, using the truncated transcript")
+        return None
+
+    sections = []
+    for part, (chunk, data) in enumerate(zip(chunks, highlights), 1):
+        if not data:
+            continue
+        lines = [f"חלק {part} ({int(chunk[0]['start'])}s-{int(chunk[-1]['end'])}s), אווירה: {data.get('mood', '')}"]
+        lines += [f"- {point}" for point in data.get('key_points') or [] if isinstance(point, str)]
+        for moment in data['moments']:
+            lines.append(f"* רגע מועמד {moment.get('start')}-{moment.get('end')}: "
+                         f"{moment.get('reason', '')} \"{moment.get('quote', '')}\"")
+        sections.append('\n'.join(lines))
+
+    material = ("סיכום הסרטון לפי חלקים (נקודות מפתח ורגעים מועמדים עם זמנים בשניות).\n"
+                "בחר את viral_moments מתוך הרגעים המועמדים, מכל אורך הסרטון:\n\n" + '\n\n'.join(sections))
+
+    if progress_callback:
+        progress_callback(27, "מרכיב ערכת שיווק...")
+    return _complete_marketing_prompt(client, _marketing_kit_prompt(material, video_duration), bypass_cache)
+
+
+def generate_marketing_kit(
+    transcript_text: str,
+    video_duration: float,
+    progress_callback=None,
+    bypass_cache: bool = False,
+    srt_path: Optional[str] = None
+) -> Optional[Dict]:
+    """
+    Use Groq LLM to generate marketing content.
+    Returns: titles, post, keywords, hashtags, viral_moments, image_prompt, music_style
+    Identical transcripts are served from the LLM cache unless bypass_cache is set.
+
+    Transcripts longer than MARKETING_MAP_CHUNK_CHARS with a timestamped SRT
+    (srt_path) use map-reduce over the whole video instead of truncating.
+    """
+    if not transcript_text:
+        print("[WARNING] No transcript for marketing kit")
+        return None
+
+    if not GROQ_API_KEY:
+        print("[ERROR] Groq API key not configured")
+        return None
+
+    try:
+        if progress_callback:
+            progress_callback(22, "יוצר ערכת שיווק...")
+
+        client = get_groq_client()
+
+        content = None
+        if srt_path and len(transcript_text) > MARKETING_MAP_CHUNK_CHARS:
+            from services.text_service import parse_srt_file
+            entries = parse_srt_file(srt_path) if os.path.exists(srt_path) else []
+            if entries:
+                content = _marketing_kit_map_reduce(
+                    client, entries, video_duration, progress_callback, bypass_cache
+                )
+
+        if content is None:
+            prompt = _marketing_kit_prompt(
+                f"תמליל הסרטון:\n{transcript_text[:MARKETING_MAP_CHUNK_CHARS]}", video_duration
+            )
+            content = _complete_marketing_prompt(client, prompt, bypass_cache)
+
+        content = (content or "").strip()
 
         if progress_callback:
             progress_callback(30, "מעבד תוצאות...")
 
-        content = response.choices[0].message.content.strip()
         print(f"[DEBUG] Raw AI response length: {len(content)} chars")
 
         # Use robust JSON parsing
@@ -170,25 +400,9 @@ def generate_marketing_kit(
 
         # Validate and fix viral moments
         if 'viral_moments' in marketing_data:
-            valid_moments = []
-            for moment in marketing_data['viral_moments']:
-                start = moment.get('start', 0)
-                end = moment.get('end', start + 30)
-
-                # Ensure moments are within video duration
-                if start < video_duration:
-                    # Clamp end to video duration
-                    end = min(end, video_duration)
-                    # Ensure minimum duration of 10 seconds
-                    if end - start >= 10:
-                        valid_moments.append({
-                            'start': start,
-                            'end': end,
-                            'reason': moment.get('reason', 'רגע מעניין')
-                        })
-
-            marketing_data['viral_moments'] = valid_moments[:3]  # Max 3 shorts
-            print(f"[INFO] Valid viral moments: {len(valid_moments)}")
+            marketing_data['viral_moments'] = _validate_viral_moments(
+                marketing_data['viral_moments'], video_duration
+            )
 
         print(f"[SUCCESS] Marketing kit generated successfully")
         return marketing_data
@@ -198,3 +412,168 @@ def generate_marketing_kit(
         import traceback
         traceback.print_exc()
         return None
+
+
+# =============================================================================
+# Combined Post-Transcript Analysis
+# =============================================================================
+
+COMBINED_ANALYSIS_PROMPT = """You are an expert Hebrew editor and digital marketing specialist. Below are the numbered subtitle lines of a video of a Rabbi speaking, each with its start time in seconds.
+
+Video length: {duration} seconds.
+
+Return ONE JSON object with these keys:
+
+"corrections": {{"<line number>": "corrected text"}}
+  - Correct spelling mistakes (especially religious terms like תורה, מצוות, הקב"ה, etc.)
+  - Fix grammatical errors while keeping the natural flow of speech
+  - Remove accidentally repeated words or phrases
+  - Include only lines you changed; {{}} if nothing needs fixing
+{voiceover_section}{marketing_section}
+Return only the JSON object.
+
+Lines:
+"""
+
+COMBINED_VOICEOVER_SECTION = """
+"voiceover": {{"<line number>": "narration text"}}
+  - The corrected line rewritten for text-to-speech narration: repeated words and duplicated phrases removed, fluent and natural, same meaning
+  - Include only lines whose narration text differs from the corrected text
+"""
+
+COMBINED_MARKETING_SECTION = """
+"marketing": {{
+    "titles": ["3 catchy Hebrew titles"],
+    "punchline": "the strongest, most intriguing sentence of the video in Hebrew - max 10 words",
+    "facebook_post": "an engaging Hebrew Facebook post with emojis that invites viewing",
+    "keywords": ["3 Hebrew SEO keywords"],
+    "hashtags": ["5 Hebrew hashtags starting with #"],
+    "viral_moments": [{{"start": 10, "end": 40, "reason": "short Hebrew reason"}}],
+    "image_prompt": "English prompt for AI image generation of an attractive image",
+    "music_style": "one of: calm, uplifting, dramatic, spiritual"
+}}
+  - viral_moments: 3 moments of 20-40 seconds suited to Shorts/Reels, using the line start times - never beyond {duration} seconds
+"""
+
+
+def _parse_line_patch(raw, count: int) -> Dict[int, str]:
+    """{"12": "text"} -> {12: "text"} for line numbers within the transcript."""
+    patch = {}
+    if not isinstance(raw, dict):
+        return patch
+    for key, value in raw.items():
+        key = str(key).strip()
+        if key.isdigit() and 1 <= int(key) <= count and isinstance(value, str) and value.strip():
+            patch[int(key)] = value.strip()
+    return patch
+
+
+def analyze_transcript_combined(
+    srt_path: str,
+    video_duration: float,
+    want_marketing: bool = True,
+    want_voiceover: bool = False,
+    progress_callback=None
+) -> Optional[Dict]:
+    """
+    Single Gemini request replacing the separate post-transcript passes:
+    subtitle correction, marketing kit and voiceover text cleaning.
+
+    Corrected lines are written back to the SRT (timings untouched). Returns:
+        marketing: validated marketing kit, or None if it was not requested or invalid
+        voiceover_texts: {corrected line text: narration text}, or None if not requested
+        changed_lines: number of corrected subtitle lines
+
+    Returns None when the stage cannot run (no key, transcript too long for one
+    response, call or parse failure) - callers then use the separate passes.
+    """
+    from services.text_service import precorrect_subtitles, write_srt_from_entries
+
+    if not GEMINI_API_KEY:
+        print("[WARNING] No Gemini API key, skipping combined analysis")
+        return None
+
+    if not os.path.exists(srt_path):
+        print(f"[ERROR] SRT file not found: {srt_path}")
+        return None
+
+    try:
+        # Deterministic glossary fixes first, so the model sees known terms spelled right
+        precorrected = precorrect_subtitles(srt_path)
+        if not precorrected:
+            return None
+        entries = precorrected["entries"]
+        if len(entries) > COMBINED_ANALYSIS_MAX_LINES:
+            print(f"[INFO] {len(entries)} lines exceed the combined analysis limit, using separate passes")
+            return None
+
+        if progress_callback:
+            progress_callback(18, "מנתח תמליל (תיקון, שיווק וקריינות)...")
+
+        duration = int(video_duration)
+        prompt = COMBINED_ANALYSIS_PROMPT.format(
+            duration=duration,
+            voiceover_section=COMBINED_VOICEOVER_SECTION.format() if want_voiceover else "",
+            marketing_section=COMBINED_MARKETING_SECTION.format(duration=duration) if want_marketing else ""
+        )
+        prompt += '\n'.join(
+            f"{i + 1} ({entry['start']:.1f}s): {entry['text']}" for i, entry in enumerate(entries)
+        )
+
+        model = get_gemini_model('models/gemini-2.5-flash')
+        response_text = cached_completion(
+            'gemini/gemini-2.5-flash', prompt,
+            lambda: model.generate_content(
+                prompt,
+                generation_config={"response_mime_type": "application/json", "temperature": 0.4}
+            ).text,
+            temperature=0.4,
+            max_output_tokens=8000
+        )
+
+        result = safe_parse_marketing_json(response_text)
+        if not result:
+            print("[ERROR] Failed to parse combined analysis JSON")
+            return None
+
+        # Fan out 1: corrected subtitle lines
+        corrections = _parse_line_patch(result.get('corrections'), len(entries))
+        changed = 0
+        for line_id, text in corrections.items():
+            entry = entries[line_id - 1]
+            if entry['text'] != text:
+                entry['text'] = text
+                changed += 1
+        if changed:
+            backup_path = str(srt_path) + '.backup'
+            if not os.path.exists(backup_path):
+                shutil.copyfile(srt_path, backup_path)
+            write_srt_from_entries(entries, srt_path)
+
+        # Fan out 2: narration text, keyed by the corrected line so it still
+        # applies after the subtitle review (edited lines simply fall through)
+        voiceover_texts = None
+        if want_voiceover:
+            narration = _parse_line_patch(result.get('voiceover'), len(entries))
+            voiceover_texts = {entries[line_id - 1]['text']: text for line_id, text in narration.items()}
+
+        # Fan out 3: marketing kit
+        marketing_data = None
+        if want_marketing and isinstance(result.get('marketing'), dict) and result['marketing'].get('titles'):
+            marketing_data = result['marketing']
+            marketing_data['viral_moments'] = _validate_viral_moments(
+                marketing_data.get('viral_moments'), video_duration
+            )
+
+        print(f"[SUCCESS] Combined analysis: {changed} lines corrected, "
+              f"marketing={'yes' if marketing_data else 'no'}, "
+              f"voiceover={len(voiceover_texts) if voiceover_texts is not None else 'n/a'}")
+        return {
+            "marketing": marketing_data,
+            "voiceover_texts": voiceover_texts,
+            "changed_lines": changed,
+        }
+
+    except Exception as e:
+        print(f"[ERROR] Combined transcript analysis failed: {e}")
+        return None
@@ -0,0 +1,308 @@
+"""
+OCR Service - Reads burned-in subtitles from silent videos with Tesseract.
+
+Only sampled frames are decoded (grab() skips the rest without conversion, wide
+gaps seek), only the subtitle band (detected once per video) is kept, and a band that has not changed
+since the previous sample is never OCR'd again - it just extends the previous
+subtitle. Changed bands are read by a pool of Tesseract worker processes.
+"""
+import importlib.util
+import os
+import re
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import (
+    TESSERACT_CMD,
+    OCR_SAMPLE_INTERVAL_SECONDS,
+    OCR_BAND_TOP_RATIO,
+    OCR_BAND_DIFF_THRESHOLD,
+    OCR_SEEK_MIN_GAP_FRAMES,
+    OCR_MAX_WORKERS,
+    SUBTITLE_BAND_DETECT_SAMPLES
+)
+
+MIN_TEXT_LENGTH = 3
+SIGNATURE_SIZE = (160, 24)  # Band thumbnail compared between samples (width, height)
+SIGNATURE_PIXEL_DELTA = 40  # Text coverage change (of 255) that counts a thumbnail cell as different
+TEXT_MASK_CONTRAST = 60  # Grey levels a stroke must stand out from its surroundings to count as text
+
+
+def tesseract_available() -> bool:
+    """pytesseract plus a tesseract binary (TESSERACT_CMD or on PATH)."""
+    if importlib.util.find_spec("pytesseract") is None:
+        return False
+    return bool((TESSERACT_CMD and os.path.exists(TESSERACT_CMD)) or shutil.which("tesseract"))
+
+
+# =============================================================================
+# Worker Process
+# =============================================================================
+
+def _init_ocr_worker(tesseract_cmd: str):
+    import pytesseract
+    if tesseract_cmd and os.path.exists(tesseract_cmd):
+        pytesseract.pytesseract.tesseract_cmd = tesseract_cmd
+
+
+def _ocr_band(gray_band) -> str:
+    """OCR one grayscale subtitle band (runs in a worker process)."""
+    import cv2
+    import pytesseract
+
+    # Try both normal and inverted for different subtitle colors
+    _, thresh = cv2.threshold(gray_band, 150, 255, cv2.THRESH_BINARY)
+    _, thresh_inv = cv2.threshold(gray_band, 150, 255, cv2.THRESH_BINARY_INV)
+
+    text1 = pytesseract.image_to_string(thresh, lang='heb+eng', config='--psm 6')
+    text2 = pytesseract.image_to_string(thresh_inv, lang='heb+eng', config='--psm 6')
+
+    # Use the one with more content
+    text = text1 if len(text1.strip()) > len(text2.strip()) else text2
+
+    text = re.sub(r'\s+', ' ', text.strip())  # Normalize whitespace
+    return re.sub(r'[^\w\s\u0590-\u05FF.,!?\'\"()-]', '', text)  # Keep Hebrew, English, punctuation
+
+
+# =============================================================================
+# Frame Sampling
+# =============================================================================
+
+def _band_signature(gray_band):
+    """
+    Area-averaged thumbnail of the band's text mask - cheap to compare.
+
+    Only thin strokes that stand out from their surroundings (bright or dark,
+    like _ocr_band's two thresholds) are kept, so a moving background behind
+    the subtitles barely changes the signature while a new line of text does.
+    """
+    import cv2
+    import numpy as np
+    size = max(3, gray_band.shape[0] // 3) | 1  # Wider than a stroke, narrower than background shapes
+    kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (size, size))
+    strokes = np.maximum(cv2.morphologyEx(gray_band, cv2.MORPH_TOPHAT, kernel),
+                         cv2.morphologyEx(gray_band, cv2.MORPH_BLACKHAT, kernel))
+    mask = np.where(strokes > TEXT_MASK_CONTRAST, 255, 0).astype(np.uint8)
+    return cv2.resize(mask, SIGNATURE_SIZE, interpolation=cv2.INTER_AREA).astype(np.int16)
+
+
+def _band_changed(previous, current) -> bool:
+    """True when enough thumbnail cells changed for the subtitle text to differ."""
+    import numpy as np
+    if previous is None:
+        return True
+    changed = np.count_nonzero(np.abs(current - previous) > SIGNATURE_PIXEL_DELTA)
+    return changed / current.size > OCR_BAND_DIFF_THRESHOLD
+
+
+def _iter_sampled_frames(cap, fps: float, total_frames: int, sample_interval: float):
+    """Yield (frame_index, frame) for every sample, decoding only those frames."""
+    import cv2
+
+    frame_interval = max(1, int(round(fps * sample_interval)))
+    position = 0  # Index of the next frame the capture will return
+
+    for target in range(0, total_frames, frame_interval):
+        gap = target - position
+        if gap > OCR_SEEK_MIN_GAP_FRAMES:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, target)
+        else:
+            for _ in range(gap):
+                if not cap.grab():
+                    return
+        ok, frame = cap.read()
+        if not ok:
+            return
+        position = target + 1
+        yield target, frame
+
+
+# =============================================================================
+# Subtitle Band Detection
+# =============================================================================
+
+def detect_subtitle_band(video_path: str, samples: int = SUBTITLE_BAND_DETECT_SAMPLES) -> Optional[Tuple[int, int]]:
+    """
+    Locate the burned-in subtitle strip once per video.
+
+    Text produces dense edges, so the Canny edge density per row is averaged over
+    a few frames spread across the video and the densest run of rows in the lower
+    half is taken. Falls back to the bottom of the frame (OCR_BAND_TOP_RATIO).
+
+    Returns (top, bottom) pixel rows, both even (codec friendly), or None if the
+    video cannot be read.
+    """
+    try:
+        import cv2
+        import numpy as np
+    except ImportError:
+        print("[WARNING] opencv-python not installed, cannot detect subtitle band")
+        return None
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        return None
+
+    try:
+        total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        profile = None
+        height = 0
+        for k in range(samples):
+            cap.set(cv2.CAP_PROP_POS_FRAMES, int(total_frames * (k + 0.5) / samples))
+            ok, frame = cap.read()
+            if not ok:
+                continue
+            gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            rows = cv2.Canny(gray, 100, 200).mean(axis=1)
+            if profile is None:
+                profile, height = rows, gray.shape[0]
+            elif rows.shape == profile.shape:
+                profile = profile + rows
+    finally:
+        cap.release()
+
+    if profile is None:
+        return None
+
+    def _even(value: int) -> int:
+        return int(max(0, min(height, value))) // 2 * 2
+
+    fallback = (_even(int(height * OCR_BAND_TOP_RATIO)), _even(height))
+    search_top = height // 2
+    lower = profile[search_top:]
+    if not lower.any():
+        return fallback
+
+    # Longest run of text-dense rows, bridging the small gaps between text lines
+    dense = lower > lower.mean() + lower.std() * 0.5
+    max_gap = max(1, int(height * 0.02))
+    best, run_start, last = None, None, None
+    for i in np.flatnonzero(dense):
+        if run_start is None or i - last > max_gap:
+            run_start = i
+        last = i
+        if best is None or (last - run_start) > (best[1] - best[0]):
+            best = (run_start, last)
+
+    if best is None:
+        return fallback
+
+    padding = int(height * 0.03)
+    top = _even(search_top + best[0] - padding)
+    bottom = _even(search_top + best[1] + padding + 2)
+    if bottom - top < height * 0.08:
+        return fallback
+    return top, bottom
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def extract_text_from_video_ocr(
+    video_path: str,
+    progress_callback=None,
+    sample_interval: float = OCR_SAMPLE_INTERVAL_SECONDS,
+    max_workers: Optional[int] = None
+) -> Tuple[str, List[Dict]]:
+    """
+    Extract burned-in subtitles from a video with Tesseract (videos without audio).
+
+    Returns:
+        (extracted_text, entries) - entries are {'start', 'end', 'text'} dicts; a
+        subtitle lasts until the band changes again.
+    """
+    try:
+        import cv2
+    except ImportError:
+        print("[ERROR] opencv-python not installed, cannot run OCR")
+        return "", []
+
+    if progress_callback:
+        progress_callback(0, "סורק כתוביות מהמסך (OCR)...")
+
+    cap = cv2.VideoCapture(str(video_path))
+    if not cap.isOpened():
+        print(f"[ERROR] Could not open video: {video_path}")
+        return "", []
+
+    fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    duration = total_frames / fps if fps > 0 else 0
+    total_samples = int(duration / sample_interval) + 1
+    print(f"[INFO] OCR: {duration:.1f}s, {fps:.1f} FPS, {total_frames} frames, ~{total_samples} samples")
+
+    band_rows = detect_subtitle_band(video_path)
+    # [start_time, future -> text] per changed band; each runs until the next change
+    changes = []
+    unresolved = 0  # Index of the oldest change whose OCR result is not collected yet
+    max_in_flight = (max_workers or OCR_MAX_WORKERS) * 4  # Bounds memory held by queued bands
+    previous_signature = None
+    samples = 0
+
+    def _resolve(change):
+        start, future = change
+        try:
+            change[1] = future.result()
+        except Exception as e:
+            print(f"[WARNING] OCR failed at {start:.1f}s: {e}")
+            change[1] = ""
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=max_workers or OCR_MAX_WORKERS,
+            initializer=_init_ocr_worker, initargs=(TESSERACT_CMD,)
+        ) as pool:
+            for frame_index, frame in _iter_sampled_frames(cap, fps, total_frames, sample_interval):
+                samples += 1
+                top, bottom = band_rows or (int(frame.shape[0] * OCR_BAND_TOP_RATIO), frame.shape[0])
+                band = cv2.cvtColor(frame[top:bottom, :], cv2.COLOR_BGR2GRAY)
+
+                signature = _band_signature(band)
+                if _band_changed(previous_signature, signature):
+                    changes.append([frame_index / fps, pool.submit(_ocr_band, band)])
+                    if len(changes) - unresolved > max_in_flight:
+                        _resolve(changes[unresolved])
+                        unresolved += 1
+                previous_signature = signature
+
+                if progress_callback and samples % 10 == 0:
+                    pct = int(min(samples / max(total_samples, 1), 1.0) * 60)
+                    progress_callback(pct, f"סורק פריים {samples}/{total_samples}...")
+
+            print(f"[INFO] OCR: {len(changes)}/{samples} sampled bands changed")
+
+            for i in range(unresolved, len(changes)):
+                _resolve(changes[i])
+                if progress_callback and i % 10 == 0:
+                    progress_callback(60 + int(i / max(len(changes), 1) * 25), "מזהה טקסט...")
+
+        entries: List[Dict] = []
+        for i, (start, text) in enumerate(changes):
+            end = changes[i + 1][0] if i + 1 < len(changes) else duration
+            if len(text) < MIN_TEXT_LENGTH:
+                continue
+
+            # Same text re-read after a small visual change - extend the subtitle
+            if entries and entries[-1]['text'].lower() == text.lower() and entries[-1]['end'] >= start:
+                entries[-1]['end'] = end
+                continue
+
+            entries.append({'start': start, 'end': end, 'text': text})
+            print(f"[OCR] {start:.1f}s: {text[:50]}...")
+
+    except Exception as e:
+        print(f"[ERROR] OCR extraction failed: {e}")
+        import traceback
+        traceback.print_exc()
+        return "", []
+    finally:
+        cap.release()
+
+    if progress_callback:
+        progress_callback(85, "מעבד טקסט שחולץ...")
+
+    all_text = ' '.join(entry['text'] for entry in entries)
+    print(f"[SUCCESS] OCR extracted {len(entries)} subtitle segments ({len(all_text)} chars)")
+    return all_text, entries
@@ -0,0 +1,317 @@
+"""
+Proxy Service - Input normalization, the low-resolution analysis copy of each
+video and the per-job artifact manifest.
+
+Normalization (optional, NORMALIZE_INPUTS) probes each upload once. VFR
+footage, heavy codecs (HEVC, VP9, ...) and oversized frames are transcoded
+once to a CFR H.264 mezzanine capped at NORMALIZE_MAX_SHORT_SIDE, which every
+later stage (merge, shorts, Remotion, proxy) reads instead of the upload. The
+decision is recorded in the manifest either way.
+
+The proxy (PROXY_HEIGHT lines, constant frame rate, short GOP) is encoded once
+after upload. OCR, Gemini previews, thumbnails, style previews and the review
+player decode it instead of the source; only exports read the original. It
+keeps the source timeline, so timestamps found on the proxy apply unchanged.
+
+The manifest ({file_id}.artifacts.json in outputs/) records every artifact a
+job produced together with the identity of the source it was made from, so a
+replaced source invalidates them.
+"""
+import json
+import os
+import subprocess
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional
+
+from utils.config import (
+    OUTPUTS_DIR,
+    NORMALIZE_INPUTS,
+    NORMALIZE_DIR,
+    NORMALIZE_MAX_SHORT_SIDE,
+    NORMALIZE_MAX_FPS,
+    NORMALIZE_HEAVY_CODECS,
+    NORMALIZE_VFR_TOLERANCE,
+    NORMALIZE_CRF,
+    PROXY_DIR,
+    PROXY_HEIGHT,
+    PROXY_GOP_FRAMES,
+    PROXY_CRF
+)
+
+_locks: Dict[str, threading.Lock] = {}
+_locks_guard = threading.Lock()
+
+
+def _lock_for(key: str) -> threading.Lock:
+    with _locks_guard:
+        return _locks.setdefault(key, threading.Lock())
+
+
+def _file_id(video_path: str) -> str:
+    return Path(video_path).stem
+
+
+def _source_identity(path: str) -> Dict:
+    stat = os.stat(path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+# =============================================================================
+# Artifact Manifest
+# =============================================================================
+
+def _manifest_path(file_id: str) -> Path:
+    return OUTPUTS_DIR / f"{file_id}.artifacts.json"
+
+
+def load_manifest(file_id: str) -> Dict:
+    """Artifacts registered for a job ({"artifacts": {name: {"path", "created", ...}}})."""
+    path = _manifest_path(file_id)
+    if path.exists():
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                manifest = json.load(f)
+            manifest.setdefault("artifacts", {})
+            return manifest
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Could not read artifact manifest {path}: {e}")
+    return {"file_id": file_id, "artifacts": {}}
+
+
+def register_artifact(file_id: str, name: str, path: str, source_path: Optional[str] = None, **meta):
+    """Record an artifact (and the source it was derived from, if any)."""
+    with _lock_for(f"manifest:{file_id}"):
+        manifest = load_manifest(file_id)
+        entry = {"path": str(path), "created": time.time(), **meta}
+        if source_path and os.path.exists(source_path):
+            entry["source"] = {"path": str(source_path), **_source_identity(source_path)}
+        manifest["artifacts"][name] = entry
+        _write_manifest(file_id, manifest)
+
+
+def _write_manifest(file_id: str, manifest: Dict):
+    manifest_path = _manifest_path(file_id)
+    tmp_path = str(manifest_path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+
+def record_job_metadata(file_id: str, key: str, value):
+    """Store job-level metadata (e.g. the normalization decision) in the manifest."""
+    with _lock_for(f"manifest:{file_id}"):
+        manifest = load_manifest(file_id)
+        manifest[key] = value
+        _write_manifest(file_id, manifest)
+
+
+def get_artifact(file_id: str, name: str) -> Optional[str]:
+    """Path of a registered artifact if it still exists and its source is unchanged."""
+    entry = load_manifest(file_id)["artifacts"].get(name)
+    if not entry or not os.path.exists(entry["path"]):
+        return None
+    source = entry.get("source")
+    if source:
+        if not os.path.exists(source["path"]):
+            return None
+        if _source_identity(source["path"]) != {"size": source["size"], "mtime_ns": source["mtime_ns"]}:
+            return None
+    return entry["path"]
+
+
+# =============================================================================
+# Input Normalization
+# =============================================================================
+
+def _fraction(value: Optional[str]) -> float:
+    try:
+        num, _, den = str(value).partition('/')
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def probe_video(video_path: str) -> Optional[Dict]:
+    """Codec, size, frame rates and pixel format of the first video stream."""
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'stream=codec_name,width,height,r_frame_rate,avg_frame_rate,pix_fmt',
+        '-of', 'json', str(video_path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=60)
+        stream = json.loads(result.stdout or '{}').get('streams', [{}])[0]
+    except (OSError, ValueError, IndexError, subprocess.TimeoutExpired) as e:
+        print(f"[WARNING] Could not probe {video_path}: {e}")
+        return None
+    return {
+        "codec": stream.get("codec_name", ""),
+        "width": int(stream.get("width") or 0),
+        "height": int(stream.get("height") or 0),
+        "r_fps": _fraction(stream.get("r_frame_rate")),
+        "avg_fps": _fraction(stream.get("avg_frame_rate")),
+        "pix_fmt": stream.get("pix_fmt", ""),
+    }
+
+
+def normalization_reasons(probe: Dict) -> list:
+    """Why a video should be transcoded to the mezzanine (empty list = use as is)."""
+    reasons = []
+    r_fps, avg_fps = probe["r_fps"], probe["avg_fps"]
+    if r_fps and avg_fps and abs(r_fps - avg_fps) / r_fps > NORMALIZE_VFR_TOLERANCE:
+        reasons.append("vfr")
+    if probe["codec"] in NORMALIZE_HEAVY_CODECS:
+        reasons.append(f"codec:{probe['codec']}")
+    if min(probe["width"], probe["height"]) > NORMALIZE_MAX_SHORT_SIDE:
+        reasons.append(f"size:{probe['width']}x{probe['height']}")
+    if avg_fps > NORMALIZE_MAX_FPS:
+        reasons.append(f"fps:{avg_fps:.2f}")
+    if probe["pix_fmt"] and probe["pix_fmt"] not in ("yuv420p", "yuvj420p"):
+        reasons.append(f"pix_fmt:{probe['pix_fmt']}")
+    return reasons
+
+
+def _target_fps(probe: Dict) -> float:
+    """Constant output rate: the nominal rate unless it is a timebase artifact, capped."""
+    fps = probe["r_fps"] if 0 < probe["r_fps"] <= 120 else probe["avg_fps"]
+    return round(min(fps or 30.0, NORMALIZE_MAX_FPS), 3)
+
+
+def ensure_normalized(video_path: str) -> str:
+    """
+    Decide once per upload whether to transcode it, and return the file every
+    downstream stage should read - the mezzanine or the upload itself.
+    """
+    video_path = str(video_path)
+    if not NORMALIZE_INPUTS or not os.path.exists(video_path):
+        return video_path
+    file_id = _file_id(video_path)
+
+    with _lock_for(f"normalize:{os.path.abspath(video_path)}"):
+        existing = get_artifact(file_id, "normalized")
+        if existing:
+            return existing
+        decision = load_manifest(file_id).get("normalization")
+        if decision and not decision.get("normalized") and decision.get("source") == _source_identity(video_path):
+            return video_path
+
+        probe = probe_video(video_path)
+        if not probe:
+            return video_path
+        reasons = normalization_reasons(probe)
+        decision = {"normalized": False, "reasons": reasons, "probe": probe, "source": _source_identity(video_path)}
+
+        if reasons:
+            NORMALIZE_DIR.mkdir(parents=True, exist_ok=True)
+            out_path = NORMALIZE_DIR / f"{file_id}.mp4"
+            tmp_path = NORMALIZE_DIR / f"{file_id}.tmp.mp4"
+            fps = _target_fps(probe)
+            cap = NORMALIZE_MAX_SHORT_SIDE
+            # Cap the shorter side (portrait and landscape alike), never upscale
+            scale = f"scale='if(gt(iw,ih),-2,min({cap},iw))':'if(gt(iw,ih),min({cap},ih),-2)'"
+            cmd = [
+                'ffmpeg', '-y', '-i', video_path,
+                '-vf', scale, '-r', f"{fps}", '-fps_mode', 'cfr',
+                '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(NORMALIZE_CRF), '-pix_fmt', 'yuv420p',
+                '-c:a', 'aac', '-b:a', '192k',
+                '-movflags', '+faststart',
+                str(tmp_path)
+            ]
+            print(f"[NORMALIZE] {video_path}: {', '.join(reasons)} -> H.264 CFR {fps} fps")
+            started = time.time()
+            try:
+                result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+                ok = result.returncode == 0 and tmp_path.exists()
+                if not ok:
+                    print(f"[ERROR] Normalization failed, using the upload as is: {result.stderr[-300:]}")
+            except OSError as e:
+                print(f"[ERROR] Normalization failed, using the upload as is: {e}")
+                ok = False
+
+            if ok:
+                os.replace(tmp_path, out_path)
+                decision.update(normalized=True, fps=fps, seconds=round(time.time() - started, 1))
+                register_artifact(file_id, "normalized", str(out_path), source_path=video_path, fps=fps)
+                record_job_metadata(file_id, "normalization", decision)
+                print(f"[SUCCESS] Normalized in {decision['seconds']}s: {out_path}")
+                return str(out_path)
+            decision["error"] = True
+
+        record_job_metadata(file_id, "normalization", decision)
+        return video_path
+
+
+def source_for(video_path: str) -> str:
+    """The normalized mezzanine of an upload if there is one, else the upload."""
+    return get_artifact(_file_id(str(video_path)), "normalized") or str(video_path)
+
+
+def prepare_media(video_path: str) -> Optional[str]:
+    """Background job after an upload: normalize, then build the proxy from the result."""
+    return ensure_proxy(ensure_normalized(video_path))
+
+
+# =============================================================================
+# Proxy
+# =============================================================================
+
+def ensure_proxy(video_path: str) -> Optional[str]:
+    """
+    Create the analysis proxy for a video (once) and register it as "proxy".
+
+    Sources that are already at most PROXY_HEIGHT tall are their own proxy.
+    Returns the proxy path, or None if encoding failed.
+    """
+    from services.video_service import get_video_resolution
+
+    video_path = str(video_path)
+    if not os.path.exists(video_path):
+        return None
+    file_id = _file_id(video_path)
+
+    with _lock_for(f"proxy:{os.path.abspath(video_path)}"):
+        existing = get_artifact(file_id, "proxy")
+        if existing:
+            return existing
+
+        width, height = get_video_resolution(video_path)
+        if height and height <= PROXY_HEIGHT:
+            register_artifact(file_id, "proxy", video_path, source_path=video_path, width=width, height=height)
+            return video_path
+
+        PROXY_DIR.mkdir(parents=True, exist_ok=True)
+        proxy_path = PROXY_DIR / f"{file_id}_proxy.mp4"
+        tmp_path = PROXY_DIR / f"{file_id}_proxy.tmp.mp4"
+        cmd = [
+            'ffmpeg', '-y', '-i', video_path,
+            '-vf', f"scale=-2:{PROXY_HEIGHT}", '-fps_mode', 'cfr',
+            '-c:v', 'libx264', '-preset', 'veryfast', '-crf', str(PROXY_CRF),
+            '-g', str(PROXY_GOP_FRAMES), '-keyint_min', str(PROXY_GOP_FRAMES), '-sc_threshold', '0',
+            '-c:a', 'aac', '-b:a', '96k',
+            '-movflags', '+faststart',
+            str(tmp_path)
+        ]
+        started = time.time()
+        try:
+            result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+        except OSError as e:
+            print(f"[ERROR] Proxy encoding failed: {e}")
+            return None
+        if result.returncode != 0 or not tmp_path.exists():
+            print(f"[ERROR] Proxy encoding failed: {result.stderr[-300:]}")
+            return None
+        os.replace(tmp_path, proxy_path)
+
+        register_artifact(
+            file_id, "proxy", str(proxy_path), source_path=video_path,
+            height=PROXY_HEIGHT, gop_frames=PROXY_GOP_FRAMES
+        )
+        print(f"[SUCCESS] Proxy created in {time.time() - started:.1f}s: {proxy_path}")
+        return str(proxy_path)
+
+
+def proxy_for(video_path: str) -> str:
+    """The registered proxy for analysis and previews, or the source itself if there is none yet."""
+    return get_artifact(_file_id(str(video_path)), "proxy") or str(video_path)
@@ -12,6 +12,7 @@ import multiprocessing
 from pathlib import Path
 
 from utils.config import BASE_DIR, OUTPUTS_DIR, SERVER_BASE_URL
+from utils.subtitles import SubtitleTrack, load_track
 
 # Path to the Remotion project
 REMOTION_DIR = BASE_DIR / "remotion-renderer"
@@ -26,72 +27,16 @@ STYLE_TO_REMOTION_STYLE = {
 }
 
 
-def _parse_srt_to_lyrics_data(srt_path: str) -> dict:
+def _parse_srt_to_lyrics_data(srt_path: str, trim_start: float = 0.0, trim_end: float = None) -> dict:
     """Parse an SRT file into LyricsData JSON for Remotion props."""
-    lines = []
-    content = Path(srt_path).read_text(encoding="utf-8")
-    # Normalize line endings
-    content = content.replace("\r\n", "\n")
-    entries = re.split(r"\n\n+", content.strip())
-
-    for entry in entries:
-        entry_lines = entry.strip().split("\n")
-        if len(entry_lines) < 3:
-            continue
-
-        time_line = entry_lines[1]
-        text = " ".join(entry_lines[2:])
-
-        time_match = re.match(
-            r"(\d{2}:\d{2}:\d{2}[,\.]\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2}[,\.]\d{3})",
-            time_line,
-        )
-        if not time_match:
-            continue
-
-        start_time = _parse_srt_time(time_match.group(1))
-        end_time = _parse_srt_time(time_match.group(2))
-
-        word_texts = [w for w in text.split() if w]
-        if not word_texts:
-            continue
-
-        total_duration = end_time - start_time
-        word_duration = total_duration / len(word_texts)
-
-        words = []
-        for idx, word in enumerate(word_texts):
-            emphasis = "normal"
-            if word.endswith("!") or (len(word) > 2 and word == word.upper()):
-                emphasis = "hero"
-            elif "?" in word or '"' in word:
-                emphasis = "strong"
-
-            words.append({
-                "word": word,
-                "start": round(start_time + idx * word_duration, 3),
-                "end": round(start_time + (idx + 1) * word_duration, 3),
-                "emphasis": emphasis,
-            })
-
-        lines.append({
-            "lineStart": round(start_time, 3),
-            "lineEnd": round(end_time, 3),
-            "words": words,
-        })
-
-    duration = lines[-1]["lineEnd"] if lines else 0
-    return {"lines": lines, "duration": duration}
-
-
-def _parse_srt_time(time_str: str) -> float:
-    """Convert SRT timestamp to seconds."""
-    time_str = time_str.replace(",", ".")
-    parts = time_str.split(":")
-    hours = int(parts[0])
-    minutes = int(parts[1])
-    seconds = float(parts[2])
-    return hours * 3600 + minutes * 60 + seconds
+    return _trimmed_lyrics_data(load_track(srt_path), trim_start, trim_end)
+
+
+def _trimmed_lyrics_data(track: SubtitleTrack, trim_start: float = 0.0, trim_end: float = None) -> dict:
+    """LyricsData for the rendered range only, with times relative to its start."""
+    if trim_start > 0 or trim_end is not None:
+        track = track.window(trim_start, trim_end if trim_end is not None else float('inf'), offset=trim_start)
+    return track.to_lyrics_data()
 
 
 def _ensure_remotion_installed() -> bool:
@@ -122,44 +67,9 @@ def _ensure_remotion_installed() -> bool:
         return False
 
 
-def _corrected_entries_to_lyrics_data(entries: list) -> dict:
+def _corrected_entries_to_lyrics_data(entries: list, trim_start: float = 0.0, trim_end: float = None) -> dict:
     """Convert corrected subtitle entries from the frontend into LyricsData JSON."""
-    lines = []
-    for entry in entries:
-        text = entry.get("text", "")
-        start_time = float(entry.get("start", 0))
-        end_time = float(entry.get("end", 0))
-
-        word_texts = [w for w in text.split() if w]
-        if not word_texts:
-            continue
-
-        total_duration = end_time - start_time
-        word_duration = total_duration / len(word_texts) if len(word_texts) > 0 else 0
-
-        words = []
-        for idx, word in enumerate(word_texts):
-            emphasis = "normal"
-            if word.endswith("!") or (len(word) > 2 and word == word.upper()):
-                emphasis = "hero"
-            elif "?" in word or '"' in word:
-                emphasis = "strong"
-
-            words.append({
-                "word": word,
-                "start": round(start_time + idx * word_duration, 3),
-                "end": round(start_time + (idx + 1) * word_duration, 3),
-                "emphasis": emphasis,
-            })
-
-        lines.append({
-            "lineStart": round(start_time, 3),
-            "lineEnd": round(end_time, 3),
-            "words": words,
-        })
-
-    duration = lines[-1]["lineEnd"] if lines else 0
-    return {"lines": lines, "duration": duration}
+    return _trimmed_lyrics_data(SubtitleTrack.from_entries(entries), trim_start, trim_end)
 
 
 def render_effects_video(
@@ -231,23 +141,42 @@ def render_effects_video(
         if not _ensure_remotion_installed():
             return {"error": "Failed to install Remotion dependencies"}
 
-        # Parse subtitles: use corrected entries from frontend if available
+        # Calculate duration in frames, applying trim if set
+        from services.video_service import get_video_duration
+        video_duration = get_video_duration(video_path)
+
+        # Apply trim range
+        effective_start = trim_start if trim_start > 0 else 0
+        effective_end = trim_end if trim_end > 0 else video_duration
+        effective_end = min(effective_end, video_duration)
+        trimmed_duration = effective_end - effective_start
+        is_trimmed = effective_start > 0 or 0 < effective_end < video_duration
+
+        start_frame = int(effective_start * fps)
+        duration_frames = int(trimmed_duration * fps)
+
+        print(f"[Remotion] Trim: {effective_start:.1f}s - {effective_end:.1f}s (duration: {trimmed_duration:.1f}s, frames: {start_frame}-{start_frame + duration_frames})")
+
+        # Parse subtitles: use corrected entries from frontend if available.
+        # Only the rendered range goes into the props, re-timed to start at 0.
         if progress_callback:
             progress_callback(15, "מעבד כתוביות...")
 
+        lyrics_range = (effective_start, effective_end) if is_trimmed else (0.0, None)
         if corrected_entries and len(corrected_entries) > 0:
             print(f"[Remotion] Using {len(corrected_entries)} corrected subtitle entries from frontend")
             # Log first and last entry to verify full range
             first = corrected_entries[0]
             last = corrected_entries[-1]
             print(f"[Remotion] Entries range: first={first.get('start',0):.1f}s-{first.get('end',0):.1f}s, last={last.get('start',0):.1f}s-{last.get('end',0):.1f}s")
-            lyrics_data = _corrected_entries_to_lyrics_data(corrected_entries)
+            lyrics_data = _corrected_entries_to_lyrics_data(corrected_entries, *lyrics_range)
         else:
             print(f"[Remotion] No corrected entries, parsing SRT file: {srt_path}")
-            lyrics_data = _parse_srt_to_lyrics_data(srt_path)
+            lyrics_data = _parse_srt_to_lyrics_data(srt_path, *lyrics_range)
 
         if not lyrics_data["lines"]:
-            return {"error": "No subtitle entries found in SRT file"}
+            return {"error": "No subtitle entries found in SRT file" if not is_trimmed
+                    else f"No subtitle entries between {effective_start:.1f}s and {effective_end:.1f}s"}
 
         # Log lyrics data summary
         print(f"[Remotion] Lyrics data: {len(lyrics_data['lines'])} lines, duration={lyrics_data['duration']:.1f}s")
@@ -257,30 +186,16 @@ def render_effects_video(
             print(f"[Remotion] First line: {first_line['lineStart']:.1f}s-{first_line['lineEnd']:.1f}s ({len(first_line['words'])} words)")
             print(f"[Remotion] Last line: {last_line['lineStart']:.1f}s-{last_line['lineEnd']:.1f}s ({len(last_line['words'])} words)")
 
-        # Calculate duration in frames, applying trim if set
-        from services.video_service import get_video_duration
-        video_duration = get_video_duration(video_path)
-
-        # Apply trim range
-        effective_start = trim_start if trim_start > 0 else 0
-        effective_end = trim_end if trim_end > 0 else video_duration
-        effective_end = min(effective_end, video_duration)
-        trimmed_duration = effective_end - effective_start
-
-        start_frame = int(effective_start * fps)
-        duration_frames = int(trimmed_duration * fps)
-
-        print(f"[Remotion] Trim: {effective_start:.1f}s - {effective_end:.1f}s (duration: {trimmed_duration:.1f}s, frames: {start_frame}-{start_frame + duration_frames})")
-
         # Always use the new EffectsComposition
         composition_id = "EffectsComposition"
         remotion_style = STYLE_TO_REMOTION_STYLE.get(animation_style, "karaoke")
 
         # Build props - serve video via HTTP (Remotion's OffthreadVideo requires http/https)
         video_filename = Path(video_path).name
-        # Determine if the video is in inputs or outputs directory
-        if str(OUTPUTS_DIR) in str(Path(video_path).resolve()):
-            video_src = f"{SERVER_BASE_URL}/outputs/{video_filename}"
+        # Determine if the video is in inputs or outputs directory (normalized uploads live in a subfolder)
+        resolved_video = Path(video_path).resolve()
+        if OUTPUTS_DIR.resolve() in resolved_video.parents:
+            video_src = f"{SERVER_BASE_URL}/outputs/{resolved_video.relative_to(OUTPUTS_DIR.resolve()).as_posix()}"
         else:
             video_src = f"{SERVER_BASE_URL}/inputs/{video_filename}"
 
@@ -288,6 +203,7 @@ def render_effects_video(
             # Video
             "videoSrc": video_src,
             "useOffthreadVideo": True,
+            "videoStartFrom": start_frame,  # Trim start - lyrics are already relative to it
             # Dynamic duration - tells calculateMetadata the real frame count
             "durationInFrames": duration_frames,
             # Lyrics / Subtitles
@@ -419,6 +335,7 @@ def render_effects_video(
         ffmpeg_merge_cmd = [
             "ffmpeg", "-y",
             "-i", str(output_path),       # Remotion output (video with effects)
+            "-ss", f"{effective_start:.3f}",  # Audio from the trim start
             "-i", str(audio_src),          # Audio source (_final.mp4 with background music)
             "-c:v", "copy",                # Copy video stream as-is (no re-encode)
             "-c:a", "aac", "-b:a", "192k", # Encode audio as AAC
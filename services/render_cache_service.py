@@ -0,0 +1,317 @@
+"""
+Render Cache Service - Segmented final render.
+
+The burned-in video is encoded as keyframe-aligned segments, each cached under
+a hash of what it depends on: the source range, the subtitle events that
+overlap it, the subtitle style and the encoder settings. The audio mix is
+cached per set of audio inputs and filters. A re-render re-encodes only the
+segments whose key changed and stream-copies everything into the output, so
+editing a few lines of a long video touches a few seconds of it.
+"""
+import hashlib
+import json
+import os
+import re
+import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import (
+    RENDER_CACHE_DIR,
+    RENDER_CACHE_MAX_BYTES,
+    RENDER_SEGMENT_SECONDS,
+    RENDER_SEGMENT_WORKERS,
+    RENDER_VIDEO_CODEC_ARGS
+)
+
+_ASS_TIME_RE = re.compile(r'(\d+):(\d{2}):(\d{2})[.:](\d{2})')
+_cache_lock = threading.Lock()
+
+
+# =============================================================================
+# Cache Keys
+# =============================================================================
+
+def _hash(*parts) -> str:
+    return hashlib.sha1('\x00'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+
+def _source_key(path: str) -> str:
+    """Identity of a source video - path, size and modification time."""
+    stat = os.stat(path)
+    return _hash(os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+
+
+def _content_key(path: str) -> str:
+    """Hash of a file's bytes (audio inputs are often fresh temp copies of the same data)."""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _ass_time(value: str) -> float:
+    match = _ASS_TIME_RE.match(value.strip())
+    if not match:
+        return 0.0
+    h, m, s, cs = (int(g) for g in match.groups())
+    return h * 3600 + m * 60 + s + cs / 100
+
+
+def _load_ass_events(ass_path: str) -> Tuple[str, List[Tuple[float, float, str]]]:
+    """Split an ASS file into a hash of everything but the events, and (start, end, line) events."""
+    header = []
+    events = []
+    with open(ass_path, 'r', encoding='utf-8-sig') as f:
+        for line in f:
+            if line.startswith('Dialogue:'):
+                fields = line.split(',', 3)
+                if len(fields) == 4:
+                    events.append((_ass_time(fields[1]), _ass_time(fields[2]), line.rstrip('\n')))
+                    continue
+            header.append(line)
+    return _hash(''.join(header)), events
+
+
+def _subtitle_keys(subtitle_path: Optional[str], bounds: List[Tuple[float, float]]) -> List[str]:
+    """Per-segment hash of the subtitle style and the events that overlap the segment."""
+    if not subtitle_path:
+        return ['none'] * len(bounds)
+
+    if str(subtitle_path).lower().endswith('.ass'):
+        header_key, events = _load_ass_events(subtitle_path)
+        return [
+            _hash('ass', header_key, *(line for s, e, line in events if s < end and e > start))
+            for start, end in bounds
+        ]
+
+    from utils.subtitles import load_track
+    track = load_track(subtitle_path)
+    return [_hash('srt', track.window(start, end).to_srt()) for start, end in bounds]
+
+
+# =============================================================================
+# Segment Layout
+# =============================================================================
+
+def _keyframe_times(video_path: str, source_key: str) -> List[float]:
+    """Keyframe timestamps of the source (demux only, cached per source)."""
+    cache_path = os.path.join(str(RENDER_CACHE_DIR), f"{source_key}.keyframes.json")
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        pass
+
+    cmd = [
+        'ffprobe', '-v', 'error', '-select_streams', 'v:0',
+        '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', str(video_path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=300)
+    except (OSError, subprocess.TimeoutExpired) as e:
+        print(f"[WARNING] Could not read keyframes: {e}")
+        return []
+
+    times = []
+    for line in result.stdout.splitlines():
+        pts, _, flags = line.partition(',')
+        if 'K' in flags:
+            try:
+                times.append(float(pts))
+            except ValueError:
+                continue
+    times.sort()
+
+    if times:
+        with open(cache_path, 'w', encoding='utf-8') as f:
+            json.dump(times, f)
+    return times
+
+
+def _segment_bounds(keyframes: List[float], duration: float) -> List[Tuple[float, float]]:
+    """
+    Split [0, duration) at the first keyframe after every RENDER_SEGMENT_SECONDS.
+
+    Boundaries only depend on the source, so they are the same on every render.
+    Without keyframe data the grid itself is used.
+    """
+    cuts = [0.0]
+    target = RENDER_SEGMENT_SECONDS
+    if keyframes:
+        for t in keyframes:
+            if t >= target and t < duration - 0.5:
+                cuts.append(round(t, 6))
+                target = t + RENDER_SEGMENT_SECONDS
+    else:
+        while target < duration - 0.5:
+            cuts.append(float(target))
+            target += RENDER_SEGMENT_SECONDS
+    cuts.append(duration)
+    return list(zip(cuts[:-1], cuts[1:]))
+
+
+# =============================================================================
+# Encoding
+# =============================================================================
+
+def _run_ffmpeg(cmd: List[str], what: str) -> bool:
+    result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+    if result.returncode != 0:
+        print(f"[ERROR] FFmpeg {what} failed: {result.stderr[-500:]}")
+        return False
+    return True
+
+
+def _encode_segment(video_path: str, start: float, end: float, subtitle_filter: Optional[str], out_path: str) -> bool:
+    """Encode one video-only segment with subtitles burned in at their absolute times."""
+    # Input seeking resets timestamps to 0 - shift them back so subtitles line up
+    chain = f"setpts=PTS+{start}/TB,{subtitle_filter},setpts=PTS-STARTPTS" if subtitle_filter else "null"
+    tmp_path = out_path + '.tmp.mp4'
+    cmd = [
+        'ffmpeg', '-y', '-ss', f"{start:.6f}", '-i', str(video_path), '-t', f"{end - start:.6f}",
+        '-filter_complex', f"[0:v]{chain}[vout]", '-map', '[vout]', '-an',
+        *RENDER_VIDEO_CODEC_ARGS,
+        tmp_path
+    ]
+    if not _run_ffmpeg(cmd, f"segment {start:.1f}-{end:.1f}s") or not os.path.exists(tmp_path):
+        return False
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def _render_audio(video_path: str, audio_mix: Dict, out_path: str) -> bool:
+    """Mix the audio track once (same inputs and filters as the single-pass render)."""
+    from services.video_service import _amix_filter
+
+    cmd = ['ffmpeg', '-y', '-i', str(video_path)]
+    for audio_input in audio_mix["inputs"]:
+        cmd.extend(['-i', str(audio_input)])
+    filters = ';'.join(audio_mix["filters"] + [_amix_filter(audio_mix["nodes"])])
+    tmp_path = out_path + '.tmp.m4a'
+    cmd.extend([
+        '-filter_complex', filters, '-map', '[aout]', '-vn',
+        '-c:a', 'aac', '-b:a', '192k',
+        tmp_path
+    ])
+    if not _run_ffmpeg(cmd, "audio mix") or not os.path.exists(tmp_path):
+        return False
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def _touch(path: str):
+    try:
+        os.utime(path, None)
+    except OSError:
+        pass
+
+
+def _prune_cache():
+    """Drop least recently used segments until the cache is under RENDER_CACHE_MAX_BYTES."""
+    with _cache_lock:
+        with os.scandir(RENDER_CACHE_DIR) as it:
+            files = [(e.stat().st_mtime, e.stat().st_size, e.path) for e in it if e.is_file()]
+        total = sum(size for _, size, _ in files)
+        if total <= RENDER_CACHE_MAX_BYTES:
+            return
+        files.sort()
+        target = int(RENDER_CACHE_MAX_BYTES * 0.9)
+        for _, size, path in files:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+
+
+# =============================================================================
+# Public API
+# =============================================================================
+
+def render_segmented(
+    video_path: str,
+    output_path: str,
+    duration: float,
+    subtitle_path: Optional[str],
+    subtitle_filter: Optional[str],
+    audio_mix: Dict
+) -> bool:
+    """
+    Render the final video from cached segments, encoding only the changed ones.
+
+    subtitle_filter is the burn-in filter without stream labels, subtitle_path
+    the file it reads (events are hashed per segment). audio_mix holds the
+    extra audio "inputs", their "filters" and the amix "nodes".
+
+    Returns False on any failure - the caller falls back to a single-pass render.
+    """
+    try:
+        os.makedirs(RENDER_CACHE_DIR, exist_ok=True)
+        source_key = _source_key(video_path)
+        bounds = _segment_bounds(_keyframe_times(video_path, source_key), duration)
+        subtitle_keys = _subtitle_keys(subtitle_path, bounds)
+
+        encoder_key = _hash(*RENDER_VIDEO_CODEC_ARGS)
+        segments = []
+        for (start, end), subtitle_key in zip(bounds, subtitle_keys):
+            key = _hash(source_key, f"{start:.6f}", f"{end:.6f}", encoder_key, subtitle_key)
+            segments.append((start, end, os.path.join(str(RENDER_CACHE_DIR), f"seg_{key}.mp4")))
+
+        missing = [seg for seg in segments if not os.path.exists(seg[2])]
+        for _, _, path in segments:
+            if os.path.exists(path):
+                _touch(path)
+        print(f"[RENDER CACHE] {len(segments)} segments, {len(missing)} to encode")
+
+        if missing:
+            with ThreadPoolExecutor(max_workers=RENDER_SEGMENT_WORKERS) as pool:
+                results = list(pool.map(
+                    lambda seg: _encode_segment(video_path, seg[0], seg[1], subtitle_filter, seg[2]),
+                    missing
+                ))
+            if not all(results):
+                return False
+
+        audio_path = None
+        if audio_mix["nodes"]:
+            audio_key = _hash(
+                source_key, *(_content_key(p) for p in audio_mix["inputs"]), *audio_mix["filters"]
+            )
+            audio_path = os.path.join(str(RENDER_CACHE_DIR), f"audio_{audio_key}.m4a")
+            if os.path.exists(audio_path):
+                _touch(audio_path)
+            elif not _render_audio(video_path, audio_mix, audio_path):
+                return False
+
+        list_path = output_path + '.segments.txt'
+        with open(list_path, 'w', encoding='utf-8') as f:
+            for _, _, path in segments:
+                escaped = os.path.abspath(path).replace('\\', '/').replace("'", "'\\''")
+                f.write(f"file '{escaped}'\n")
+
+        cmd = ['ffmpeg', '-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_path:
+            cmd.extend(['-i', audio_path, '-map', '0:v', '-map', '1:a'])
+        else:
+            cmd.extend(['-map', '0:v'])
+        cmd.extend(['-c', 'copy', '-movflags', '+faststart', str(output_path)])
+        ok = _run_ffmpeg(cmd, "segment concat")
+        try:
+            os.remove(list_path)
+        except OSError:
+            pass
+        if not ok or not os.path.exists(output_path):
+            return False
+
+        _prune_cache()
+        print(f"[SUCCESS] Segmented render: {output_path} ({len(missing)}/{len(segments)} segments encoded)")
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Segmented render failed: {e}")
+        return False
@@ -0,0 +1,242 @@
+"""
+Subtitle Edit Service - Versioned line-level subtitle edits.
+
+Every SRT gets a sidecar edit state ({srt}.edits.json) holding a version
+number, a log of applied changes and, per downstream artifact, the time ranges
+that no longer match the subtitles:
+
+    ass     - styled subtitle events
+    tts     - voiceover segments
+    render  - the burned-in final video
+
+A stage that regenerates an artifact clears its ranges (clear_stale), so the
+next edit only marks what that edit touched.
+"""
+import difflib
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import SUBTITLE_EDIT_LOG_MAX
+from services.text_service import parse_srt_file, write_srt_from_entries
+
+ARTIFACTS = ("ass", "tts", "render")
+
+
+class SubtitleVersionConflict(Exception):
+    """Raised when an edit is based on an older version than the file on disk."""
+
+    def __init__(self, expected: int, current: int):
+        super().__init__(f"Edit is based on version {expected}, subtitles are at version {current}")
+        self.expected = expected
+        self.current = current
+
+
+_path_locks: Dict[str, threading.Lock] = {}
+_path_locks_guard = threading.Lock()
+
+
+def _lock_for(srt_path: str) -> threading.Lock:
+    key = os.path.abspath(srt_path)
+    with _path_locks_guard:
+        return _path_locks.setdefault(key, threading.Lock())
+
+
+def _edit_state_path(srt_path: str) -> str:
+    return str(srt_path) + '.edits.json'
+
+
+def load_edit_state(srt_path: str) -> Dict:
+    """Version, change log and stale ranges for an SRT (version 0 if never edited)."""
+    state = {"version": 0, "log": [], "stale": {name: [] for name in ARTIFACTS}}
+    path = _edit_state_path(srt_path)
+    if os.path.exists(path):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            state["version"] = int(saved.get("version", 0))
+            state["log"] = saved.get("log") or []
+            for name in ARTIFACTS:
+                state["stale"][name] = (saved.get("stale") or {}).get(name) or []
+        except (OSError, ValueError, TypeError) as e:
+            print(f"[WARNING] Could not read subtitle edit state {path}: {e}")
+    return state
+
+
+def _save_edit_state(srt_path: str, state: Dict):
+    path = _edit_state_path(srt_path)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def _merge_ranges(ranges: List[List[float]]) -> List[List[float]]:
+    merged: List[List[float]] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _entry_ranges(*entries: Optional[Dict]) -> List[List[float]]:
+    return [[float(e['start']), float(e['end'])] for e in entries if e]
+
+
+def _apply_edit(entries: List[Dict], edit: Dict) -> Tuple[Dict, List[str]]:
+    """
+    Apply one edit in place. Returns (log record, affected artifacts).
+
+    Edits address lines by their 0-based position in the current version:
+        {"op": "update", "index": 3, "text": "...", "start": 1.5, "end": 3.0}
+        {"op": "insert", "index": 4, "start": 9.0, "end": 11.0, "text": "..."}
+        {"op": "delete", "index": 7}
+    """
+    op = edit.get("op", "update")
+    index = edit.get("index")
+    if not isinstance(index, int):
+        raise ValueError(f"Edit has no line index: {edit}")
+
+    if op == "insert":
+        if not 0 <= index <= len(entries):
+            raise ValueError(f"Insert position {index} is out of range")
+        after = {'start': float(edit.get('start', 0)), 'end': float(edit.get('end', 0)),
+                 'text': str(edit.get('text', '')).strip()}
+        if not after['text'] or after['end'] <= after['start']:
+            raise ValueError(f"Inserted line {index} needs text and end > start")
+        entries.insert(index, after)
+        return {"op": op, "index": index, "after": after}, list(ARTIFACTS)
+
+    if not 0 <= index < len(entries):
+        raise ValueError(f"Line {index} is out of range")
+    before = dict(entries[index])
+
+    if op == "delete":
+        del entries[index]
+        return {"op": op, "index": index, "before": before}, list(ARTIFACTS)
+
+    if op != "update":
+        raise ValueError(f"Unknown edit op: {op}")
+
+    after = dict(before)
+    if 'text' in edit:
+        after['text'] = str(edit['text']).strip()
+    if 'start' in edit:
+        after['start'] = float(edit['start'])
+    if 'end' in edit:
+        after['end'] = float(edit['end'])
+    if not after['text'] or after['end'] <= after['start']:
+        raise ValueError(f"Line {index} needs text and end > start")
+
+    artifacts = []
+    if after['text'] != before['text'] or (after['start'], after['end']) != (before['start'], before['end']):
+        artifacts = list(ARTIFACTS)
+    entries[index] = after
+    return {"op": op, "index": index, "before": before, "after": after}, artifacts
+
+
+def apply_subtitle_edits(srt_path: str, base_version: int, edits: List[Dict]) -> Dict:
+    """
+    Apply line-level edits to an SRT if base_version is still current.
+
+    Returns {"version", "changed", "stale"}. Raises SubtitleVersionConflict when
+    the subtitles were edited since base_version, ValueError for a bad edit
+    (nothing is written in either case).
+    """
+    with _lock_for(srt_path):
+        state = load_edit_state(srt_path)
+        if base_version != state["version"]:
+            raise SubtitleVersionConflict(base_version, state["version"])
+
+        entries = [{'start': e['start'], 'end': e['end'], 'text': e['text']}
+                   for e in parse_srt_file(srt_path)]
+        records = []
+        for edit in edits:
+            record, artifacts = _apply_edit(entries, edit)
+            if not artifacts:
+                continue
+            records.append(record)
+            ranges = _entry_ranges(record.get("before"), record.get("after"))
+            for name in artifacts:
+                state["stale"][name] = _merge_ranges(state["stale"][name] + ranges)
+
+        if not records:
+            return {"version": state["version"], "changed": 0, "stale": state["stale"]}
+
+        write_srt_from_entries(entries, srt_path)
+        state["version"] += 1
+        state["log"].append({"version": state["version"], "time": time.time(), "changes": records})
+        state["log"] = state["log"][-SUBTITLE_EDIT_LOG_MAX:]
+        _save_edit_state(srt_path, state)
+
+    print(f"[SUBTITLE EDIT] {srt_path}: {len(records)} line(s) changed, now version {state['version']}")
+    return {"version": state["version"], "changed": len(records), "stale": state["stale"]}
+
+
+def _line_key(entry: Dict) -> Tuple[float, float, str]:
+    return (round(float(entry.get('start', 0)), 3), round(float(entry.get('end', 0)), 3),
+            str(entry.get('text', '')).strip())
+
+
+def _diff_edits(old_entries: List[Dict], new_entries: List[Dict]) -> List[Dict]:
+    """
+    Edits that turn old_entries into new_entries, aligned with SequenceMatcher
+    so an inserted or deleted line doesn't shift every later line into an update.
+
+    Opcodes are emitted from the last one backwards - every edit then addresses
+    positions that the edits before it have not moved.
+    """
+    old_keys = [_line_key(e) for e in old_entries]
+    new_keys = [_line_key(e) for e in new_entries]
+    matcher = difflib.SequenceMatcher(None, old_keys, new_keys, autojunk=False)
+
+    edits = []
+    for tag, i1, i2, j1, j2 in reversed(matcher.get_opcodes()):
+        if tag == "equal":
+            continue
+        paired = min(i2 - i1, j2 - j1)
+        for k in range(paired):
+            start, end, text = new_keys[j1 + k]
+            edits.append({"op": "update", "index": i1 + k, "text": text, "start": start, "end": end})
+        for i in range(i2 - 1, i1 + paired - 1, -1):
+            edits.append({"op": "delete", "index": i})
+        for k in range(paired, j2 - j1):
+            start, end, text = new_keys[j1 + k]
+            edits.append({"op": "insert", "index": i1 + k, "text": text, "start": start, "end": end})
+    return edits
+
+
+def replace_subtitles(srt_path: str, new_entries: List[Dict], base_version: Optional[int] = None) -> Dict:
+    """
+    Save a full subtitle list as the line edits it implies.
+
+    Unchanged lines stay fresh downstream, even when lines before them were
+    inserted or deleted. base_version=None skips the version check (the
+    original full-list save endpoint).
+    """
+    old_entries = parse_srt_file(srt_path) if os.path.exists(srt_path) else []
+    edits = _diff_edits(old_entries, new_entries)
+
+    if base_version is None:
+        base_version = load_edit_state(srt_path)["version"]
+    return apply_subtitle_edits(srt_path, base_version, edits)
+
+
+def stale_ranges(srt_path: str, artifact: str) -> List[List[float]]:
+    """Time ranges of an artifact that no longer match the subtitles."""
+    return load_edit_state(srt_path)["stale"].get(artifact, [])
+
+
+def clear_stale(srt_path: str, artifact: str):
+    """Mark an artifact as regenerated from the current subtitles."""
+    if not os.path.exists(_edit_state_path(srt_path)):
+        return
+    with _lock_for(srt_path):
+        state = load_edit_state(srt_path)
+        if state["stale"].get(artifact):
+            state["stale"][artifact] = []
+            _save_edit_state(srt_path, state)
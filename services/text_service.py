@@ -5,6 +5,8 @@ import os
 import sys
 import ssl
 import re
+import shutil
+from collections import Counter, deque
 from pathlib import Path
 from typing import List, Dict, Optional, Tuple
 
@@ -24,9 +26,20 @@ ssl._create_default_https_context = ssl._create_unverified_context
 from utils.config import (
     GEMINI_API_KEY,
     SRT_MIN_GAP_SECONDS,
-    SRT_SIMILARITY_THRESHOLD
+    SRT_SIMILARITY_THRESHOLD,
+    SUBTITLE_FIX_WINDOW_LINES,
+    SUBTITLE_FIX_WINDOW_OVERLAP,
+    SUBTITLE_FIX_MAX_PARALLEL,
+    ASR_MIN_AVG_LOGPROB,
+    ASR_MAX_COMPRESSION_RATIO,
+    ASR_MAX_NO_SPEECH_PROB,
+    SUBTITLE_AI_SKIP_MAX_UNCERTAIN_RATIO
 )
-from utils.helpers import format_srt_time, format_ass_time, text_similarity
+from utils.glossary import apply_glossary
+from utils.helpers import text_similarity
+from utils.llm_cache import cached_completion
+from utils.llm_clients import get_gemini_model
+from utils.subtitles import SubtitleTrack
 
 
 # =============================================================================
@@ -121,86 +134,10 @@ def parse_srt_file(srt_path: str) -> List[Dict]:
     Parse SRT file and return list of subtitle entries.
     Each entry: {'index': int, 'start': float, 'end': float, 'text': str}
     Handles both standard SRT (with blank lines) and malformed SRT (without blank lines).
+    Callers that keep large tracks around should use SubtitleTrack.from_file directly.
     """
-    entries = []
     try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            content = f.read()
-
-        # Normalize line endings (AI corrections may introduce \r\n or \r)
-        content = content.replace('\r\n', '\n').replace('\r', '\n')
-
-        # First, try standard SRT parsing (split by blank lines)
-        blocks = re.split(r'\n\n+', content.strip())
-
-        timing_re = re.compile(
-            r'(\d{2}):(\d{2}):(\d{2}),(\d{3})\s*-->\s*(\d{2}):(\d{2}):(\d{2}),(\d{3})'
-        )
-
-        for block in blocks:
-            lines = block.strip().split('\n')
-            if len(lines) >= 3:
-                try:
-                    index = int(lines[0])
-                    timing_match = timing_re.match(lines[1])
-                    if timing_match:
-                        g = timing_match.groups()
-                        start = int(g[0])*3600 + int(g[1])*60 + int(g[2]) + int(g[3])/1000
-                        end = int(g[4])*3600 + int(g[5])*60 + int(g[6]) + int(g[7])/1000
-                        text = ' '.join(lines[2:]).strip()
-                        entries.append({
-                            'index': index,
-                            'start': start,
-                            'end': end,
-                            'text': text
-                        })
-                except (ValueError, IndexError):
-                    continue
-
-        # Fallback: if standard parsing found <= 1 entry but file has multiple timestamps,
-        # parse line-by-line (handles SRT without blank lines, e.g. from AI corrections)
-        if len(entries) <= 1 and content.count('-->') > 1:
-            print(f"[WARNING] Standard SRT parsing found only {len(entries)} entries but file has {content.count('-->')} timestamps. Using line-by-line parser.")
-            entries = []
-            all_lines = content.strip().split('\n')
-            i = 0
-            while i < len(all_lines):
-                line = all_lines[i].strip()
-                # Look for index line (just a number)
-                if line.isdigit():
-                    idx = int(line)
-                    # Next line should be timing
-                    if i + 1 < len(all_lines):
-                        timing_match = timing_re.match(all_lines[i + 1].strip())
-                        if timing_match:
-                            g = timing_match.groups()
-                            start = int(g[0])*3600 + int(g[1])*60 + int(g[2]) + int(g[3])/1000
-                            end = int(g[4])*3600 + int(g[5])*60 + int(g[6]) + int(g[7])/1000
-                            # Collect text lines until next index or end
-                            text_lines = []
-                            j = i + 2
-                            while j < len(all_lines):
-                                tl = all_lines[j].strip()
-                                if tl == '':
-                                    j += 1
-                                    break
-                                # Check if this line is the next index
-                                if tl.isdigit() and j + 1 < len(all_lines) and '-->' in all_lines[j + 1]:
-                                    break
-                                text_lines.append(tl)
-                                j += 1
-                            text = ' '.join(text_lines).strip()
-                            if text:
-                                entries.append({
-                                    'index': idx,
-                                    'start': start,
-                                    'end': end,
-                                    'text': text
-                                })
-                            i = j
-                            continue
-                i += 1
-
+        entries = SubtitleTrack.from_file(srt_path).to_entries()
         print(f"[INFO] Parsed {len(entries)} subtitle entries from SRT")
         return entries
 
@@ -211,11 +148,7 @@ def parse_srt_file(srt_path: str) -> List[Dict]:
 
 def write_srt_from_entries(entries: List[Dict], output_path: str):
     """Write SRT file from entries."""
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for i, entry in enumerate(entries, 1):
-            start_str = format_srt_time(entry['start'])
-            end_str = format_srt_time(entry['end'])
-            f.write(f"{i}\n{start_str} --> {end_str}\n{entry['text']}\n\n")
+    SubtitleTrack.from_entries(entries).write_srt(output_path)
     print(f"[INFO] Written {len(entries)} entries to {output_path}")
 
 
@@ -235,23 +168,23 @@ def create_srt_from_ocr(ocr_entries: List[Dict], output_path: str, segment_durat
 
     print(f"[INFO] Creating SRT with {len(ocr_entries)} entries...")
 
-    with open(output_path, 'w', encoding='utf-8') as f:
-        for i, entry in enumerate(ocr_entries, 1):
-            # Use start/end if available, otherwise fall back to timestamp
-            start = entry.get('start', entry.get('timestamp', i * segment_duration))
-            end = entry.get('end', start + segment_duration)
-            text = entry.get('text', '').strip()
+    entries = []
+    for i, entry in enumerate(ocr_entries, 1):
+        # Use start/end if available, otherwise fall back to timestamp
+        start = entry.get('start', entry.get('timestamp', i * segment_duration))
+        end = entry.get('end', start + segment_duration)
+        text = entry.get('text', '').strip()
 
-            if not text:
-                continue
+        if not text:
+            continue
 
-            # Ensure minimum duration
-            if end <= start:
-                end = start + 1.0
+        # Ensure minimum duration
+        if end <= start:
+            end = start + 1.0
 
-            start_str = format_srt_time(start)
-            end_str = format_srt_time(end)
-            f.write(f"{i}\n{start_str} --> {end_str}\n{text}\n\n")
+        entries.append({'start': start, 'end': end, 'text': text})
+
+    SubtitleTrack.from_entries(entries).write_srt(output_path)
 
     # Verify file was created and has content
     if os.path.exists(output_path):
@@ -261,6 +194,39 @@ def create_srt_from_ocr(ocr_entries: List[Dict], output_path: str, segment_durat
         print(f"[ERROR] Failed to create SRT file at {output_path}")
 
 
+class _TextProfile:
+    """Normalized text plus its character counts, computed once per subtitle."""
+
+    __slots__ = ('text', 'norm', 'chars')
+
+    def __init__(self, text: str):
+        self.text = text
+        self.norm = text.strip().lower()
+        self.chars = Counter(self.norm)
+
+
+def _is_near_duplicate(a: _TextProfile, b: _TextProfile, threshold: float) -> bool:
+    """
+    text_similarity(a, b) > threshold, without running SequenceMatcher on pairs
+    that cannot pass. ratio() is 2*M / (len_a + len_b) where the matched
+    characters M never exceed the shorter length nor the shared character
+    counts (the same bounds as real_quick_ratio/quick_ratio), so a pair failing
+    either bound is rejected exactly.
+    """
+    total = len(a.norm) + len(b.norm)
+    if not total or 2 * min(len(a.norm), len(b.norm)) / total <= threshold:
+        return False
+    if a.norm == b.norm:
+        return True
+    # Iterate the smaller Counter; ratio() itself is not symmetric, so the
+    # final call keeps the caller's argument order
+    small, large = (a.chars, b.chars) if len(a.chars) <= len(b.chars) else (b.chars, a.chars)
+    shared = sum(min(count, large[char]) for char, count in small.items())
+    if 2 * shared / total <= threshold:
+        return False
+    return text_similarity(a.text, b.text) > threshold
+
+
 def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> List[Dict]:
     """
     Clean and merge SRT entries to fix synchronization issues.
@@ -270,6 +236,10 @@ def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> L
     2. Overlap correction: Ensure start time is never before previous end time
     3. Filter short repeated sentences
     4. Ensure minimum gap between entries
+
+    Recent texts live in a deque that is trimmed from the left as the start time
+    advances, and similarity is only computed for pairs that pass the exact
+    upper bounds in _is_near_duplicate, so dense transcripts stay linear.
     """
     if min_gap_seconds is None:
         min_gap_seconds = SRT_MIN_GAP_SECONDS
@@ -281,7 +251,8 @@ def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> L
 
     sorted_entries = sorted(entries, key=lambda x: x['start'])
     cleaned = []
-    recent_texts = []
+    prev_profile = None
+    recent = deque()  # (start, profile) of kept texts from the last 10 seconds
 
     for entry in sorted_entries:
         text = entry['text'].strip()
@@ -291,21 +262,18 @@ def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> L
         if not text:
             continue
 
+        profile = _TextProfile(text)
+        while recent and recent[0][0] < start - 10.0:
+            recent.popleft()
+
         # Filter short sentences that appeared recently
         word_count = len(text.split())
         if word_count < 3:
-            cutoff_time = start - 10.0
-            recent_in_window = [t for t, ts in recent_texts if ts >= cutoff_time]
-            is_duplicate = False
-            for recent_text in recent_in_window:
-                if text_similarity(text, recent_text) > SRT_SIMILARITY_THRESHOLD:
-                    is_duplicate = True
-                    break
-            if is_duplicate:
+            if any(_is_near_duplicate(profile, recent_profile, SRT_SIMILARITY_THRESHOLD)
+                   for _, recent_profile in recent):
                 continue
 
-        recent_texts.append((text, start))
-        recent_texts = [(t, ts) for t, ts in recent_texts if ts >= start - 15.0]
+        recent.append((start, profile))
 
         if not cleaned:
             cleaned.append({
@@ -314,15 +282,16 @@ def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> L
                 'end': end,
                 'text': text
             })
+            prev_profile = profile
             continue
 
         prev = cleaned[-1]
-        similarity = text_similarity(prev['text'], text)
 
-        if similarity > SRT_SIMILARITY_THRESHOLD:
+        if _is_near_duplicate(prev_profile, profile, SRT_SIMILARITY_THRESHOLD):
             prev['end'] = max(prev['end'], end)
             if len(text) > len(prev['text']):
                 prev['text'] = text
+                prev_profile = profile
             continue
 
         if start < prev['end'] + min_gap_seconds:
@@ -337,6 +306,7 @@ def clean_and_merge_srt(entries: List[Dict], min_gap_seconds: float = None) -> L
             'end': end,
             'text': text
         })
+        prev_profile = profile
 
     print(f"[INFO] Cleaning SRT: {len(cleaned)} entries after processing")
     return cleaned
@@ -364,23 +334,44 @@ def convert_srt_to_ass(
         font_size: Font size in pixels
     """
     try:
-        entries = parse_srt_file(srt_path)
-        if not entries:
+        track = SubtitleTrack.from_file(srt_path)
+        if not len(track):
             return False
 
-        # Convert hex color to ASS BGR format
-        # ASS uses BGR order: &HBBGGRR&
-        hex_color = font_color.lstrip('#')
-        if len(hex_color) == 6:
-            r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
-            ass_primary_color = f"&H00{b}{g}{r}"
-        else:
-            ass_primary_color = "&H00FFFFFF"
+        print(f"[ASS] Using font: {font_name}, size: {font_size}, color: {font_color}")
+        ass_content = build_ass_document(track, video_width, video_height, font_name, font_color, font_size)
+
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(ass_content)
+
+        print(f"[SUCCESS] Converted SRT to ASS: {ass_path}")
+        return True
+
+    except Exception as e:
+        print(f"[ERROR] Failed to convert SRT to ASS: {e}")
+        return False
+
 
-        print(f"[ASS] Using font: {font_name}, size: {font_size}, color: {font_color} -> {ass_primary_color}")
+def build_ass_document(
+    track: SubtitleTrack,
+    video_width: int = 1920,
+    video_height: int = 1080,
+    font_name: str = "Arial",
+    font_color: str = "#FFFFFF",
+    font_size: int = 24
+) -> str:
+    """Styled ASS text for a subtitle track (what convert_srt_to_ass writes)."""
+    # Convert hex color to ASS BGR format
+    # ASS uses BGR order: &HBBGGRR&
+    hex_color = font_color.lstrip('#')
+    if len(hex_color) == 6:
+        r, g, b = hex_color[0:2], hex_color[2:4], hex_color[4:6]
+        ass_primary_color = f"&H00{b}{g}{r}"
+    else:
+        ass_primary_color = "&H00FFFFFF"
 
-        # ASS header with custom styling
-        ass_content = f"""[Script Info]
+    # ASS header with custom styling
+    ass_content = f"""[Script Info]
 Title: Styled Subtitles
 ScriptType: v4.00+
 PlayResX: {video_width}
@@ -394,119 +385,292 @@ Style: Default,{font_name},{font_size},{ass_primary_color},&H000000FF,&H00000000
 [Events]
 Format: Layer, Start, End, Style, Name, MarginL, MarginR, MarginV, Effect, Text
 """
+    return ass_content + track.to_ass_events()
 
-        for entry in entries:
-            start = format_ass_time(entry['start'])
-            end = format_ass_time(entry['end'])
-            text = entry['text'].replace('\n', '\\N')
-            ass_content += f"Dialogue: 0,{start},{end},Default,,0,0,0,,{text}\n"
 
-        with open(ass_path, 'w', encoding='utf-8') as f:
-            f.write(ass_content)
+def build_styled_webvtt(
+    track: SubtitleTrack,
+    video_height: int = 1080,
+    font_name: str = "Arial",
+    font_color: str = "#FFFFFF",
+    font_size: int = 24
+) -> str:
+    """
+    WebVTT with a STYLE block approximating the ASS style, for previewing
+    captions over the unburned video in the browser.
 
-        print(f"[SUCCESS] Converted SRT to ASS: {ass_path}")
-        return True
+    Browsers size cues at 5% of the video height by default; the ASS size is in
+    video pixels, so it is expressed relative to that.
+    """
+    hex_color = font_color.lstrip('#')
+    color = f"#{hex_color}" if len(hex_color) == 6 else "#FFFFFF"
+    scale = font_size / max(video_height, 1) / 0.05
+    style = (
+        "STYLE\n::cue {\n"
+        f"  font-family: '{font_name}', sans-serif;\n"
+        f"  color: {color};\n"
+        f"  font-size: {scale:.2f}em;\n"
+        "  font-weight: bold;\n"
+        "  background-color: transparent;\n"
+        "  text-shadow: -2px -2px 0 #000, 2px -2px 0 #000, -2px 2px 0 #000, 2px 2px 0 #000, 2px 3px 2px rgba(0,0,0,0.5);\n"
+        "}\n\n"
+    )
+    vtt = track.to_webvtt()
+    return vtt.replace("WEBVTT\n\n", "WEBVTT\n\n" + style, 1)
 
-    except Exception as e:
-        print(f"[ERROR] Failed to convert SRT to ASS: {e}")
-        return False
+
+# =============================================================================
+# Deterministic Pre-Correction
+# =============================================================================
+
+def _asr_confidence_path(srt_path: str) -> str:
+    return str(srt_path) + '.asr.json'
+
+
+def save_asr_confidence(srt_path: str, segments: List[Dict]):
+    """Store Whisper per-segment stats next to the SRT they produced."""
+    import json
+
+    try:
+        with open(_asr_confidence_path(srt_path), 'w', encoding='utf-8') as f:
+            json.dump(segments, f)
+    except OSError as e:
+        print(f"[WARNING] Could not save ASR confidence: {e}")
+
+
+def load_asr_confidence(srt_path: str) -> Optional[List[Dict]]:
+    """Whisper segment stats for an SRT, or None (e.g. OCR subtitles)."""
+    import json
+
+    path = _asr_confidence_path(srt_path)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _is_low_confidence_segment(segment: Dict) -> bool:
+    avg_logprob = segment.get('avg_logprob')
+    compression_ratio = segment.get('compression_ratio')
+    no_speech_prob = segment.get('no_speech_prob')
+    return (
+        (avg_logprob is not None and avg_logprob < ASR_MIN_AVG_LOGPROB)
+        or (compression_ratio is not None and compression_ratio > ASR_MAX_COMPRESSION_RATIO)
+        or (no_speech_prob is not None and no_speech_prob > ASR_MAX_NO_SPEECH_PROB)
+    )
+
+
+def find_uncertain_lines(entries: List[Dict], segments: List[Dict]) -> List[int]:
+    """0-based indices of subtitle lines that fall inside low-confidence Whisper segments."""
+    import bisect
+
+    flagged = sorted((s['start'], s['end']) for s in segments if _is_low_confidence_segment(s))
+    if not flagged:
+        return []
+
+    starts = [start for start, _ in flagged]
+    uncertain = []
+    for i, entry in enumerate(entries):
+        middle = (entry['start'] + entry['end']) / 2
+        pos = bisect.bisect_right(starts, middle) - 1
+        if pos >= 0 and middle <= flagged[pos][1]:
+            uncertain.append(i)
+    return uncertain
+
+
+def precorrect_subtitles(srt_path: str) -> Optional[Dict]:
+    """
+    Apply the glossary and repeated-word removal to an SRT in place (no AI).
+
+    Returns the corrected entries, the number of changed lines, and the indices of
+    lines Whisper was unsure about ('uncertain' is None when there is no ASR data,
+    so the caller cannot tell a clean transcript from an unscored one).
+    """
+    entries = parse_srt_file(srt_path)
+    if not entries:
+        return None
+
+    changed = 0
+    for entry in entries:
+        text, fixes = apply_glossary(entry['text'])
+        if fixes and text.strip() and text != entry['text']:
+            entry['text'] = text
+            changed += 1
+
+    if changed:
+        backup_path = str(srt_path) + '.backup'
+        if not os.path.exists(backup_path):
+            shutil.copyfile(srt_path, backup_path)
+        write_srt_from_entries(entries, srt_path)
+
+    segments = load_asr_confidence(srt_path)
+    uncertain = find_uncertain_lines(entries, segments) if segments else None
+
+    print(f"[INFO] Glossary pre-correction changed {changed} lines"
+          + (f", {len(uncertain)}/{len(entries)} lines uncertain" if uncertain is not None else ""))
+    return {"entries": entries, "changed": changed, "uncertain": uncertain}
 
 
 # =============================================================================
 # AI-Powered Text Correction
 # =============================================================================
 
+SUBTITLE_FIX_PROMPT = """You are an expert Hebrew editor. Below are numbered subtitle lines transcribed from a video of a Rabbi speaking.
+
+Your task:
+1. Correct spelling mistakes (especially religious terms like תורה, מצוות, הקב"ה, etc.)
+2. Fix grammatical errors while keeping the natural flow of speech
+3. IMPORTANT: Remove accidentally repeated words or phrases
+4. Keep Hebrew religious terms accurate
+5. Lines marked [context] are shown only for continuity - do not return them
+
+Return ONLY a JSON object mapping line numbers to corrected text, e.g. {"12": "corrected text"}.
+Include only lines you changed. Return {} if nothing needs fixing.
+
+Lines:
+"""
+
+
+def _build_correction_windows(count: int, window_lines: int, overlap: int) -> List[Tuple[int, int, int, int]]:
+    """
+    Split `count` lines into windows. Each window owns [own_start, own_end) and
+    also sends `overlap` neighbouring lines on each side as read-only context.
+    Returns (send_start, send_end, own_start, own_end) tuples.
+    """
+    windows = []
+    for own_start in range(0, count, window_lines):
+        own_end = min(own_start + window_lines, count)
+        windows.append((max(0, own_start - overlap), min(count, own_end + overlap), own_start, own_end))
+    return windows
+
+
+def _parse_correction_patch(text: str) -> Dict[int, str]:
+    """Parse a model's {id: text} JSON reply, tolerating markdown fences."""
+    import json
+
+    match = re.search(r'\{.*\}', text, re.DOTALL)
+    if not match:
+        return {}
+    try:
+        raw = json.loads(match.group(0))
+    except ValueError:
+        return {}
+
+    patch = {}
+    for key, value in raw.items():
+        if str(key).strip().isdigit() and isinstance(value, str) and value.strip():
+            patch[int(key)] = value.strip()
+    return patch
+
+
+def _correct_subtitle_window(model, entries: List[Dict], window: Tuple[int, int, int, int]) -> Dict[int, str]:
+    """Send one window of numbered lines and return the patches for lines it owns."""
+    send_start, send_end, own_start, own_end = window
+
+    lines = []
+    for i in range(send_start, send_end):
+        marker = "" if own_start <= i < own_end else " [context]"
+        lines.append(f"{i + 1}{marker}: {entries[i]['text']}")
+
+    prompt = SUBTITLE_FIX_PROMPT + '\n'.join(lines)
+    response_text = cached_completion(
+        'gemini/gemini-2.5-flash', prompt,
+        lambda: model.generate_content(
+            prompt,
+            generation_config={"response_mime_type": "application/json", "temperature": 0}
+        ).text,
+        temperature=0
+    )
+    if not response_text:
+        return {}
+
+    patch = _parse_correction_patch(response_text)
+    # Overlapping context lines are owned by the neighbouring window
+    return {line_id: text for line_id, text in patch.items() if own_start < line_id <= own_end}
+
+
 def fix_subtitles_with_ai(srt_path: str, progress_callback=None) -> bool:
     """
     Fix and improve SRT subtitles using Gemini AI.
     Corrects spelling mistakes, grammar, and religious terms in Hebrew.
+
+    Only the numbered text lines are sent - never timestamps - in overlapping
+    windows that run concurrently. Each window returns {line_id: text} patches
+    which are merged back into the parsed entries, so timings cannot be lost and
+    long videos never hit the output-token limit.
+
+    The glossary pre-correction runs first. When Whisper confidence data shows the
+    transcript is clean, Gemini is skipped entirely; otherwise only the windows
+    that own uncertain lines are sent.
     """
-    import google.generativeai as genai
+    from concurrent.futures import ThreadPoolExecutor, as_completed
 
     if not os.path.exists(srt_path):
         print(f"[ERROR] SRT file not found: {srt_path}")
         return False
 
-    if not GEMINI_API_KEY:
-        print("[WARNING] No Gemini API key, skipping AI correction")
-        return False
-
     try:
-        with open(srt_path, 'r', encoding='utf-8') as f:
-            raw_srt_content = f.read()
-
-        if not raw_srt_content.strip():
+        precorrected = precorrect_subtitles(srt_path)
+        if not precorrected:
             return False
+        entries = precorrected["entries"]
+        uncertain = precorrected["uncertain"]
 
-        genai.configure(api_key=GEMINI_API_KEY, transport='rest')
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
-
-        prompt = """You are an expert Hebrew editor. Below is a raw SRT file transcribed from a video of a Rabbi speaking.
+        if uncertain is not None and len(uncertain) <= SUBTITLE_AI_SKIP_MAX_UNCERTAIN_RATIO * len(entries):
+            print("[INFO] Transcript is clean after glossary pre-correction, skipping AI correction")
+            if progress_callback:
+                progress_callback(100, "הכתוביות תוקנו ללא AI")
+            return True
 
-Your task:
-1. Correct spelling mistakes (especially religious terms like תורה, מצוות, הקב"ה, etc.)
-2. Fix grammatical errors while keeping the natural flow of speech
-3. IMPORTANT: Remove accidentally repeated words or phrases
-4. DO NOT change the timestamps
-5. Keep the output in the EXACT same SRT format
-6. Keep Hebrew religious terms accurate
+        if not GEMINI_API_KEY:
+            print("[WARNING] No Gemini API key, skipping AI correction")
+            return precorrected["changed"] > 0
 
-IMPORTANT: Return ONLY the corrected SRT content. No explanations.
+        model = get_gemini_model('models/gemini-2.5-flash')
 
-Here is the SRT file to correct:
+        windows = _build_correction_windows(
+            len(entries), SUBTITLE_FIX_WINDOW_LINES, SUBTITLE_FIX_WINDOW_OVERLAP
+        )
+        if uncertain is not None:
+            uncertain_set = set(uncertain)
+            windows = [w for w in windows if any(i in uncertain_set for i in range(w[2], w[3]))]
+        print(f"[INFO] Correcting {len(entries)} subtitle lines in {len(windows)} windows")
+
+        patches: Dict[int, str] = {}
+        failed_windows = 0
+        with ThreadPoolExecutor(max_workers=min(SUBTITLE_FIX_MAX_PARALLEL, len(windows))) as executor:
+            futures = [executor.submit(_correct_subtitle_window, model, entries, w) for w in windows]
+            for done, future in enumerate(as_completed(futures), 1):
+                try:
+                    patches.update(future.result())
+                except Exception as e:
+                    failed_windows += 1
+                    print(f"[WARNING] Subtitle correction window failed: {e}")
+                if progress_callback:
+                    progress_callback(int(done / len(windows) * 100), f"מתקן כתוביות ({done}/{len(windows)})...")
+
+        if failed_windows == len(windows):
+            print("[ERROR] AI subtitle correction failed for all windows")
+            return False
 
-"""
+        # Backup original (the pre-correction may already have saved it)
+        backup_path = str(srt_path) + '.backup'
+        if not os.path.exists(backup_path):
+            shutil.copyfile(srt_path, backup_path)
 
-        response = model.generate_content(prompt + raw_srt_content)
-
-        if response and response.text:
-            corrected_srt = response.text.strip()
-
-            # Normalize line endings from AI response
-            corrected_srt = corrected_srt.replace('\r\n', '\n').replace('\r', '\n')
-
-            # Clean markdown if present
-            if '```' in corrected_srt:
-                parts = corrected_srt.split('```')
-                for part in parts:
-                    if '-->' in part:
-                        corrected_srt = part.strip()
-                        if corrected_srt.startswith('srt'):
-                            corrected_srt = corrected_srt[3:].strip()
-                        break
-
-            # Gemini often strips blank lines between SRT entries.
-            # Re-insert them: a line with just a number followed by a timestamp line
-            # needs a blank line before the number.
-            import re as _re
-            lines = corrected_srt.split('\n')
-            fixed_lines = []
-            for i, line in enumerate(lines):
-                # If this line is a subtitle index (just a number) and the previous
-                # line is NOT blank, insert a blank line before it
-                if (i > 0
-                    and line.strip().isdigit()
-                    and i + 1 < len(lines)
-                    and '-->' in lines[i + 1]
-                    and fixed_lines
-                    and fixed_lines[-1].strip() != ''):
-                    fixed_lines.append('')
-                fixed_lines.append(line)
-            corrected_srt = '\n'.join(fixed_lines)
-
-            if '-->' in corrected_srt:
-                # Backup original
-                backup_path = str(srt_path) + '.backup'
-                with open(backup_path, 'w', encoding='utf-8') as f:
-                    f.write(raw_srt_content)
-
-                with open(srt_path, 'w', encoding='utf-8') as f:
-                    f.write(corrected_srt)
-
-                print(f"[SUCCESS] Subtitles corrected with AI")
-                return True
+        changed = 0
+        for line_id, text in patches.items():
+            entry = entries[line_id - 1]
+            if entry['text'] != text:
+                entry['text'] = text
+                changed += 1
 
-        return False
+        write_srt_from_entries(entries, srt_path)
+        print(f"[SUCCESS] Subtitles corrected with AI ({changed} lines changed)")
+        return True
 
     except Exception as e:
         print(f"[ERROR] AI subtitle correction failed: {e}")
@@ -517,18 +681,14 @@ def clean_srt_text_with_ai(entries: List[Dict], progress_callback=None) -> List[
     """
     Use Gemini AI to clean and improve SRT entries text before voiceover.
     """
-    import google.generativeai as genai
-
     if not entries or not GEMINI_API_KEY:
         return entries
 
     try:
-        genai.configure(api_key=GEMINI_API_KEY, transport='rest')
-
         all_texts = [e['text'] for e in entries]
         combined_text = '\n'.join([f"{i+1}. {t}" for i, t in enumerate(all_texts)])
 
-        model = genai.GenerativeModel('models/gemini-2.5-flash')
+        model = get_gemini_model('models/gemini-2.5-flash')
 
         prompt = """אתה עורך טקסט מקצועי. קיבלת רשימה של כתוביות מסרטון.
 
@@ -542,10 +702,14 @@ def clean_srt_text_with_ai(entries: List[Dict], progress_callback=None) -> List[
 
 """
 
-        response = model.generate_content(prompt + combined_text)
+        response_text = cached_completion(
+            'gemini/gemini-2.5-flash', prompt + combined_text,
+            lambda: model.generate_content(prompt + combined_text).text,
+            deterministic=True
+        )
 
-        if response and response.text:
-            lines = response.text.strip().split('\n')
+        if response_text:
+            lines = response_text.strip().split('\n')
             cleaned_texts = {}
 
             for line in lines:
@@ -0,0 +1,331 @@
+"""
+Upload Service - Resumable chunked uploads (tus-style).
+
+An upload is created with its total length and then appended to by PATCH
+requests that state the byte offset they start at. The current offset can be
+queried at any time, so after a dropped connection the client resumes from
+there instead of starting over.
+
+SHA-256 is computed while the bytes arrive. Once the first UPLOAD_PROBE_BYTES
+are in, ffprobe reads the partial file, so a job can be validated and queued
+before the upload finishes (files with the index at the end are probed again
+on completion). Completed uploads move to inputs/ as {upload_id}{suffix} and
+go through normalization and the analysis proxy in the background.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import re
+import subprocess
+import time
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Dict, Optional
+
+from utils.config import (
+    INPUTS_DIR,
+    UPLOADS_PARTIAL_DIR,
+    UPLOAD_MAX_BYTES,
+    UPLOAD_PROBE_BYTES,
+    UPLOAD_WRITE_BUFFER_BYTES,
+    UPLOAD_EXPIRE_SECONDS,
+    UPLOAD_WAIT_TIMEOUT_SECONDS,
+    UPLOAD_STALL_SECONDS
+)
+
+VIDEO_SUFFIXES = {".mp4", ".mov", ".m4v", ".mkv", ".webm", ".avi"}
+_UPLOAD_ID_RE = re.compile(r"[0-9a-f]{8}")
+
+_uploads: Dict[str, Dict] = {}
+_hashers: Dict[str, "hashlib._Hash"] = {}
+_locks: Dict[str, asyncio.Lock] = {}
+
+
+class UploadOffsetMismatch(Exception):
+    """Raised when a chunk does not start where the upload currently ends."""
+
+    def __init__(self, expected: int, received: int):
+        super().__init__(f"Upload is at offset {expected}, chunk starts at {received}")
+        self.expected = expected
+        self.received = received
+
+
+# =============================================================================
+# State
+# =============================================================================
+
+def _state_path(upload_id: str) -> Path:
+    return UPLOADS_PARTIAL_DIR / f"{upload_id}.json"
+
+
+def _data_path(upload_id: str) -> Path:
+    return UPLOADS_PARTIAL_DIR / f"{upload_id}.part"
+
+
+def _save_state(state: Dict):
+    path = _state_path(state["upload_id"])
+    tmp_path = str(path) + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def get_upload(upload_id: str) -> Optional[Dict]:
+    """Upload state (offset, length, sha256 once complete, probe, video_path)."""
+    if not _UPLOAD_ID_RE.fullmatch(upload_id or ""):
+        return None  # Ids come from clients and name files under inputs/partial
+    state = _uploads.get(upload_id)
+    if state is None and _state_path(upload_id).exists():
+        try:
+            with open(_state_path(upload_id), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"[WARNING] Could not read upload state {upload_id}: {e}")
+            return None
+        # Trust the bytes on disk over the last saved offset (a write may have landed after it)
+        data_path = _data_path(upload_id)
+        if not state.get("complete"):
+            state["offset"] = data_path.stat().st_size if data_path.exists() else 0
+        _uploads[upload_id] = state
+    return state
+
+
+def _hasher_for(state: Dict):
+    """Running SHA-256 of the bytes received so far (rebuilt from disk after a restart)."""
+    upload_id = state["upload_id"]
+    hasher = _hashers.get(upload_id)
+    if hasher is None:
+        hasher = hashlib.sha256()
+        data_path = _data_path(upload_id)
+        if state["offset"] and data_path.exists():
+            with open(data_path, 'rb') as f:
+                remaining = state["offset"]
+                while remaining > 0:
+                    block = f.read(min(UPLOAD_WRITE_BUFFER_BYTES, remaining))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    remaining -= len(block)
+        _hashers[upload_id] = hasher
+    return hasher
+
+
+def _expire_uploads():
+    """Drop unfinished uploads nobody has touched for UPLOAD_EXPIRE_SECONDS."""
+    if not UPLOADS_PARTIAL_DIR.exists():
+        return
+    cutoff = time.time() - UPLOAD_EXPIRE_SECONDS
+    for state_path in UPLOADS_PARTIAL_DIR.glob('*.json'):
+        upload_id = state_path.stem
+        data_path = _data_path(upload_id)
+        last_touch = max(state_path.stat().st_mtime, data_path.stat().st_mtime if data_path.exists() else 0)
+        if last_touch < cutoff:
+            delete_upload(upload_id)
+
+
+def create_upload(length: int, filename: str = "") -> Dict:
+    """Register a new upload of `length` bytes. Raises ValueError for bad input."""
+    if length <= 0 or length > UPLOAD_MAX_BYTES:
+        raise ValueError(f"Upload length must be between 1 and {UPLOAD_MAX_BYTES} bytes")
+    suffix = Path(filename).suffix.lower() if filename else ".mp4"
+    if suffix not in VIDEO_SUFFIXES:
+        raise ValueError(f"Unsupported video type: {suffix or filename}")
+
+    _expire_uploads()
+    UPLOADS_PARTIAL_DIR.mkdir(parents=True, exist_ok=True)
+
+    upload_id = uuid.uuid4().hex[:8]
+    state = {
+        "upload_id": upload_id,
+        "filename": filename,
+        "suffix": suffix,
+        "length": length,
+        "offset": 0,
+        "created": time.time(),
+        "complete": False,
+        "sha256": None,
+        "probe": None,
+        "early_probe_tried": False,
+        "video_path": None,
+    }
+    _data_path(upload_id).touch()
+    _uploads[upload_id] = state
+    _hashers[upload_id] = hashlib.sha256()
+    _save_state(state)
+    print(f"[UPLOAD] Created resumable upload {upload_id} ({length / (1024 * 1024):.1f} MB, {filename})")
+    return state
+
+
+def delete_upload(upload_id: str):
+    """Cancel an unfinished upload and delete its bytes."""
+    if not _UPLOAD_ID_RE.fullmatch(upload_id or ""):
+        return
+    _uploads.pop(upload_id, None)
+    _hashers.pop(upload_id, None)
+    _locks.pop(upload_id, None)
+    for path in (_data_path(upload_id), _state_path(upload_id)):
+        try:
+            path.unlink()
+        except OSError:
+            pass
+
+
+# =============================================================================
+# Probing
+# =============================================================================
+
+def probe_media(path: str) -> Optional[Dict]:
+    """
+    Video/audio streams and duration of a (possibly partial) file.
+    None when ffprobe cannot read it yet.
+    """
+    cmd = [
+        'ffprobe', '-v', 'error',
+        '-show_entries', 'format=duration:stream=codec_type,codec_name,width,height',
+        '-of', 'json', str(path)
+    ]
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
+        info = json.loads(result.stdout or '{}')
+    except (OSError, ValueError, subprocess.TimeoutExpired) as e:
+        print(f"[WARNING] Could not probe upload {path}: {e}")
+        return None
+
+    streams = info.get("streams") or []
+    if result.returncode != 0 or not streams:
+        return None
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    try:
+        duration = float((info.get("format") or {}).get("duration") or 0)
+    except ValueError:
+        duration = 0.0
+    return {
+        "ok": video is not None,
+        "codec": video.get("codec_name") if video else None,
+        "width": int(video.get("width") or 0) if video else 0,
+        "height": int(video.get("height") or 0) if video else 0,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+        "duration": duration,
+    }
+
+
+async def _probe(state: Dict, final: bool):
+    loop = asyncio.get_event_loop()
+    path = state["video_path"] if final else str(_data_path(state["upload_id"]))
+    probe = await loop.run_in_executor(None, probe_media, path)
+    if probe is None and final:
+        probe = {"ok": False, "error": "Not a readable video file"}
+    if probe is not None:
+        state["probe"] = probe
+        _save_state(state)
+        print(f"[UPLOAD] {state['upload_id']} probed at {state['offset']} bytes: {probe}")
+
+
+# =============================================================================
+# Receiving Chunks
+# =============================================================================
+
+def _write_block(data_path: Path, block: bytes, hasher):
+    with open(data_path, 'ab') as f:
+        f.write(block)
+    hasher.update(block)
+
+
+async def append_chunk(upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+    """
+    Append a request body starting at `offset`. Bytes are written (and hashed)
+    in UPLOAD_WRITE_BUFFER_BYTES blocks off the event loop; if the connection
+    drops, everything written so far counts and the client resumes from it.
+
+    Raises KeyError (unknown upload), UploadOffsetMismatch, ValueError (too long).
+    """
+    state = get_upload(upload_id)
+    if state is None:
+        raise KeyError(upload_id)
+
+    lock = _locks.setdefault(upload_id, asyncio.Lock())
+    async with lock:
+        if state["complete"]:
+            return state
+        if offset != state["offset"]:
+            raise UploadOffsetMismatch(state["offset"], offset)
+
+        loop = asyncio.get_event_loop()
+        data_path = _data_path(upload_id)
+        hasher = await loop.run_in_executor(None, _hasher_for, state)
+        buffer = bytearray()
+
+        async def _flush():
+            block = bytes(buffer)
+            buffer.clear()
+            await loop.run_in_executor(None, _write_block, data_path, block, hasher)
+            state["offset"] += len(block)
+
+        try:
+            async for chunk in chunks:
+                if state["offset"] + len(buffer) + len(chunk) > state["length"]:
+                    raise ValueError("Chunk runs past the declared upload length")
+                buffer.extend(chunk)
+                if len(buffer) >= UPLOAD_WRITE_BUFFER_BYTES:
+                    await _flush()
+            if buffer:
+                await _flush()
+        finally:
+            if buffer and state["offset"] + len(buffer) <= state["length"]:
+                await _flush()  # Keep what arrived before a disconnect
+            _save_state(state)
+
+        # Early probe: validate the job before the rest of the file arrives
+        if not state.get("early_probe_tried") and state["offset"] >= min(UPLOAD_PROBE_BYTES, state["length"]):
+            state["early_probe_tried"] = True
+            await _probe(state, final=False)
+
+        if state["offset"] == state["length"]:
+            await _complete(state, hasher)
+    return state
+
+
+async def _complete(state: Dict, hasher):
+    from services.proxy_service import prepare_media
+
+    upload_id = state["upload_id"]
+    video_path = INPUTS_DIR / f"{upload_id}{state['suffix']}"
+    os.replace(_data_path(upload_id), video_path)
+    state.update(complete=True, sha256=hasher.hexdigest(), video_path=str(video_path))
+    _hashers.pop(upload_id, None)
+    _save_state(state)
+    print(f"[UPLOAD] {upload_id} complete: {video_path} (sha256 {state['sha256'][:12]}...)")
+
+    # Partial files with the index at the end only probe once complete
+    if not (state["probe"] or {}).get("ok"):
+        await _probe(state, final=True)
+    if state["probe"].get("ok"):
+        asyncio.get_event_loop().run_in_executor(None, prepare_media, str(video_path))
+
+
+def _last_activity(state: Dict) -> float:
+    data_path = _data_path(state["upload_id"])
+    return data_path.stat().st_mtime if data_path.exists() else state["created"]
+
+
+async def wait_for_upload(upload_id: str, timeout: float = UPLOAD_WAIT_TIMEOUT_SECONDS) -> Optional[str]:
+    """
+    Video path once the upload completes and probes as a video. None if it
+    fails, is cancelled (the client deletes uploads it gives up on), stalls for
+    UPLOAD_STALL_SECONDS or times out.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        state = get_upload(upload_id)
+        if state is None:
+            return None
+        if state.get("probe") and state["probe"].get("ok") is False:
+            return None
+        if state["complete"] and (state.get("probe") or {}).get("ok"):
+            return state["video_path"]
+        if not state["complete"] and time.time() - _last_activity(state) > UPLOAD_STALL_SECONDS:
+            print(f"[UPLOAD] {upload_id}: no data for {UPLOAD_STALL_SECONDS}s, giving up")
+            return None
+        await asyncio.sleep(1.0)
+    return None
@@ -10,6 +10,7 @@ import shutil
 from pathlib import Path
 from typing import Optional, List, Dict, Tuple
 import base64
+import hashlib
 
 # =============================================================================
 # SSL Certificate Bypass for Windows + NetFree compatibility
@@ -31,10 +32,26 @@ from utils.config import (
     DEFAULT_VIDEO_WIDTH,
     DEFAULT_VIDEO_HEIGHT,
     TESSERACT_CMD,
-    FONTS_DIR
+    FONTS_DIR,
+    DUCKING_DEPTH,
+    GEMINI_OCR_PREVIEW_MODE,
+    GEMINI_OCR_PREVIEW_WIDTH,
+    GEMINI_OCR_PREVIEW_FPS,
+    RENDER_CACHE_ENABLED,
+    RENDER_SEGMENT_MIN_VIDEO_SECONDS,
+    RENDER_VIDEO_CODEC_ARGS,
+    STYLE_PREVIEW_DIR,
+    STYLE_PREVIEW_MAX_HEIGHT,
+    STYLE_PREVIEW_MAX_FILES,
+    STYLE_PREVIEW_SAMPLE_TEXT
 )
 from utils.helpers import escape_ffmpeg_path, escape_ffmpeg_path_for_subtitles, prepare_hebrew_text
+from utils.llm_cache import cached_completion
+from utils.llm_clients import get_groq_client, get_gemini, get_gemini_model, get_genai_client
+from utils.llm_scheduler import PRIORITY_INTERACTIVE, run_llm_call
+from utils.subtitles import SubtitleTrack, load_track
 from services.font_service import get_fonts_dir_path
+from services.proxy_service import proxy_for
 
 
 # =============================================================================
@@ -213,7 +230,10 @@ def merge_final_video(
     srt_input: Optional[str],
     v_output: str,
     music_path: Optional[str],
-    voice_path: Optional[str]
+    voice_path: Optional[str],
+    music_volume: Optional[float] = None,
+    ducking: bool = True,
+    speech_intervals: Optional[List[Tuple[float, float]]] = None
 ) -> bool:
     """
     Merge video with voiceover, music, and subtitles.
@@ -222,6 +242,11 @@ def merge_final_video(
     On Windows, paths must be escaped correctly for FFmpeg filters.
 
     Supports both SRT and ASS subtitle formats.
+
+    Ducking: when speech is present, music follows a precomputed gain envelope
+    (a piecewise `volume` expression) built from speech_intervals - usually the
+    transcript segment times. Without them, a cheap RMS pass over the speech
+    track supplies the intervals. This replaces per-sample sidechain compression.
     """
     print(f"[INFO] Starting video merge...")
     print(f"[DEBUG] Input video: {v_input}")
@@ -256,6 +281,13 @@ def merge_final_video(
     # Track temporary files to cleanup
     temp_files_to_cleanup = []
 
+    # Precomputed loudness gain (cached per track) - one pass, no loudnorm per job
+    music_gain = 1.0
+    if music_path and os.path.exists(music_path):
+        from services.audio_service import get_music_gain
+        music_gain = get_music_gain(music_path)
+        print(f"[DEBUG] Music normalization gain: {music_gain:.3f}")
+
     # Trim music to video length if needed
     actual_music_path = music_path
     if music_path and os.path.exists(music_path) and video_duration > 0:
@@ -265,81 +297,47 @@ def merge_final_video(
             temp_files_to_cleanup.append(trimmed_music)
             print(f"[DEBUG] Using trimmed music: {actual_music_path}")
 
-    # Build FFmpeg command
-    cmd = ['ffmpeg', '-y', '-i', str(v_input)]
-    inputs = 1
-    audio_filter_parts = []
-    audio_nodes = []
-
-    # Track if we have speech for ducking
-    has_speech = has_orig_audio or (voice_path and os.path.exists(voice_path))
-    music_input_index = None
-
-    # Handle original audio (speech from video)
-    if has_orig_audio:
-        audio_filter_parts.append("[0:a]volume=1.0[main_a]")
-        audio_nodes.append("[main_a]")
-
-    # Add voiceover input
-    if voice_path and os.path.exists(voice_path):
-        cmd.extend(['-i', str(voice_path)])
-        audio_filter_parts.append(f"[{inputs}:a]volume=2.0[voice_a]")
-        audio_nodes.append("[voice_a]")
-        inputs += 1
-        print(f"[DEBUG] Added voiceover input #{inputs}")
-
-    # Add music input with DUCKING (sidechain compression when speech is present)
-    if actual_music_path and os.path.exists(actual_music_path):
-        cmd.extend(['-i', str(actual_music_path)])
-        music_input_index = inputs
+    # Audio inputs and filters (shared by the single-pass and segmented renders)
+    audio_inputs, audio_filter_parts, audio_nodes = _build_audio_mix(
+        v_input, has_orig_audio, voice_path, actual_music_path, music_gain,
+        music_volume, ducking, speech_intervals
+    )
 
-        if has_speech:
-            # DUCKING: Use sidechaincompress to lower music when speech is detected
-            # The speech signal triggers compression on the music
-            # ratio=4 means 4:1 compression, threshold=0.02 is sensitive to speech
-            # attack=0.3 quick response, release=1.0 gradual return
-            print(f"[DEBUG] Enabling DUCKING for music (sidechain compression)")
-
-            # First, prepare the speech signal for sidechaining
-            if has_orig_audio:
-                speech_node = "[main_a]"
-            else:
-                speech_node = "[voice_a]"
+    # Cleanup temporary files
+    def cleanup_temp_files():
+        for temp_file in temp_files_to_cleanup:
+            try:
+                if temp_file and os.path.exists(temp_file):
+                    os.remove(temp_file)
+                    print(f"[DEBUG] Cleaned up temp file: {temp_file}")
+            except Exception as e:
+                print(f"[WARNING] Could not cleanup temp file {temp_file}: {e}")
 
-            # Apply sidechain compression: music is compressed when speech is present
-            # Lower music volume base to 0.15, ducking will reduce it further during speech
-            audio_filter_parts.append(
-                f"[{inputs}:a]volume=0.15[music_pre]"
-            )
-            # For simplicity, we'll use a lower music volume overall since true sidechain
-            # is complex with multiple audio sources. The amix will blend them.
-            audio_nodes.append("[music_pre]")
-        else:
-            # No speech, just play music at normal volume
-            audio_filter_parts.append(f"[{inputs}:a]volume=0.25[music_a]")
-            audio_nodes.append("[music_a]")
+    # Long videos: re-encode only the segments whose inputs changed since the last render
+    if RENDER_CACHE_ENABLED and video_duration >= RENDER_SEGMENT_MIN_VIDEO_SECONDS:
+        from services.render_cache_service import render_segmented
+        subtitle_filter = None
+        if has_subtitles and escaped_subtitle_path:
+            subtitle_filter = _subtitle_filter(escaped_subtitle_path, is_ass)
+        audio_mix = {"inputs": audio_inputs, "filters": audio_filter_parts, "nodes": audio_nodes}
+        if render_segmented(v_input, v_output, video_duration, srt_input if has_subtitles else None,
+                            subtitle_filter, audio_mix):
+            cleanup_temp_files()
+            return True
+        print("[WARNING] Segmented render failed, falling back to a single-pass render")
 
-        inputs += 1
-        print(f"[DEBUG] Added music input #{inputs} (ducking: {has_speech})")
+    # Build FFmpeg command
+    cmd = ['ffmpeg', '-y', '-i', str(v_input)]
+    for audio_input in audio_inputs:
+        cmd.extend(['-i', str(audio_input)])
 
     # Build filter_complex
     filter_complex_parts = []
-    video_output_node = "[0:v]"  # Default to original video
 
     # ALWAYS add subtitle filter if subtitles exist
     if has_subtitles and escaped_subtitle_path:
-        if is_ass:
-            # ASS format - use ass filter with fontsdir for custom fonts
-            fonts_dir = get_fonts_dir_path()
-            escaped_fonts_dir = escape_ffmpeg_path_for_subtitles(fonts_dir)
-            subtitle_filter = f"[0:v]ass='{escaped_subtitle_path}':fontsdir='{escaped_fonts_dir}'[vout]"
-            print(f"[DEBUG] Using fontsdir: {fonts_dir}")
-        else:
-            # SRT format - use subtitles filter
-            subtitle_filter = f"[0:v]subtitles='{escaped_subtitle_path}'[vout]"
-
+        subtitle_filter = f"[0:v]{_subtitle_filter(escaped_subtitle_path, is_ass)}[vout]"
         filter_complex_parts.append(subtitle_filter)
-        video_output_node = "[vout]"
         print(f"[DEBUG] Added subtitle filter: {subtitle_filter}")
 
     # Add audio filters
@@ -347,8 +345,7 @@ def merge_final_video(
         filter_complex_parts.extend(audio_filter_parts)
 
         # Mix all audio streams
-        amix_inputs = ''.join(audio_nodes)
-        amix_filter = f"{amix_inputs}amix=inputs={len(audio_nodes)}:duration=first:dropout_transition=2[aout]"
+        amix_filter = _amix_filter(audio_nodes)
         filter_complex_parts.append(amix_filter)
         print(f"[DEBUG] Added audio mix filter: {amix_filter}")
 
@@ -378,8 +375,7 @@ def merge_final_video(
 
     # Output settings
     cmd.extend([
-        '-c:v', 'libx264',
-        '-preset', 'ultrafast',
+        *RENDER_VIDEO_CODEC_ARGS,
         '-c:a', 'aac',
         '-b:a', '192k',
         str(v_output)
@@ -399,16 +395,6 @@ def merge_final_video(
         errors='replace'
     )
 
-    # Cleanup temporary files
-    def cleanup_temp_files():
-        for temp_file in temp_files_to_cleanup:
-            try:
-                if temp_file and os.path.exists(temp_file):
-                    os.remove(temp_file)
-                    print(f"[DEBUG] Cleaned up temp file: {temp_file}")
-            except Exception as e:
-                print(f"[WARNING] Could not cleanup temp file {temp_file}: {e}")
-
     if result.returncode != 0:
         print(f"[ERROR] FFmpeg merge failed!")
         print(f"[ERROR] Return code: {result.returncode}")
@@ -436,83 +422,215 @@ def merge_final_video(
         return False
 
 
-# =============================================================================
-# Shorts Generation - With Sync Fix and Separate Subtitle Formatting
-# =============================================================================
+def _subtitle_filter(escaped_subtitle_path: str, is_ass: bool) -> str:
+    """Burn-in filter for an SRT or ASS file (no stream labels)."""
+    if is_ass:
+        # ASS format - use ass filter with fontsdir for custom fonts
+        escaped_fonts_dir = escape_ffmpeg_path_for_subtitles(get_fonts_dir_path())
+        return f"ass='{escaped_subtitle_path}':fontsdir='{escaped_fonts_dir}'"
+    # SRT format - use subtitles filter
+    return f"subtitles='{escaped_subtitle_path}'"
 
-def adjust_srt_times(srt_content: str, offset_seconds: float) -> str:
+
+def _amix_filter(audio_nodes: List[str]) -> str:
+    return f"{''.join(audio_nodes)}amix=inputs={len(audio_nodes)}:duration=first:dropout_transition=2[aout]"
+
+
+def _build_audio_mix(
+    v_input: str,
+    has_orig_audio: bool,
+    voice_path: Optional[str],
+    music_path: Optional[str],
+    music_gain: float,
+    music_volume: Optional[float],
+    ducking: bool,
+    speech_intervals: Optional[List[Tuple[float, float]]]
+) -> Tuple[List[str], List[str], List[str]]:
     """
-    Adjust all SRT timestamps by subtracting offset_seconds.
-    This is CRITICAL for shorts - when a short starts at X seconds,
-    we subtract X from all subtitle times so the first subtitle starts at 0.
+    Audio part of the merge: extra inputs (after the video, which is input 0),
+    their filter chains, and the labels to feed amix.
     """
-    import re
-    from datetime import timedelta
+    inputs = 1
+    extra_inputs = []
+    audio_filter_parts = []
+    audio_nodes = []
 
-    def shift_time(match):
-        h, m, s, ms = map(int, match.groups())
-        t = timedelta(hours=h, minutes=m, seconds=s, milliseconds=ms)
-        new_t = max(timedelta(0), t - timedelta(seconds=offset_seconds))
-        total_seconds = int(new_t.total_seconds())
-        new_h, remainder = divmod(total_seconds, 3600)
-        new_m, new_s = divmod(remainder, 60)
-        new_ms = int(new_t.microseconds / 1000)
-        return f"{new_h:02}:{new_m:02}:{new_s:02},{new_ms:03}"
+    # Track if we have speech for ducking
+    has_speech = has_orig_audio or (voice_path and os.path.exists(voice_path))
 
-    time_pattern = r"(\d{2}):(\d{2}):(\d{2}),(\d{3})"
-    return re.sub(time_pattern, shift_time, srt_content)
+    # Handle original audio (speech from video)
+    if has_orig_audio:
+        audio_filter_parts.append("[0:a]volume=1.0[main_a]")
+        audio_nodes.append("[main_a]")
 
+    # Add voiceover input
+    if voice_path and os.path.exists(voice_path):
+        extra_inputs.append(str(voice_path))
+        audio_filter_parts.append(f"[{inputs}:a]volume=2.0[voice_a]")
+        audio_nodes.append("[voice_a]")
+        inputs += 1
+        print(f"[DEBUG] Added voiceover input #{inputs}")
 
-def filter_srt_for_range(srt_content: str, start_time: float, end_time: float) -> str:
+    # Add music input with DUCKING (precomputed speech envelope)
+    if music_path and os.path.exists(music_path):
+        extra_inputs.append(str(music_path))
+
+        if has_speech:
+            base_volume = (music_volume if music_volume is not None else 0.15) * music_gain
+            volume_expr = None
+
+            if ducking:
+                if speech_intervals is None:
+                    from services.audio_service import detect_speech_intervals
+                    speech_source = v_input if has_orig_audio else voice_path
+                    speech_intervals = detect_speech_intervals(str(speech_source))
+
+                from services.audio_service import build_ducking_volume_expr
+                volume_expr = build_ducking_volume_expr(
+                    speech_intervals, base_volume, base_volume * DUCKING_DEPTH
+                )
+
+            if volume_expr:
+                # Gain is evaluated once per audio frame - near-zero cost vs sidechaincompress
+                print(f"[DEBUG] Enabling DUCKING for music ({len(speech_intervals)} speech intervals)")
+                audio_filter_parts.append(
+                    f"[{inputs}:a]volume='{volume_expr}':eval=frame[music_pre]"
+                )
+            else:
+                audio_filter_parts.append(
+                    f"[{inputs}:a]volume={base_volume}[music_pre]"
+                )
+            audio_nodes.append("[music_pre]")
+        else:
+            # No speech, just play music at normal volume
+            no_speech_volume = (music_volume if music_volume is not None else 0.25) * music_gain
+            audio_filter_parts.append(f"[{inputs}:a]volume={no_speech_volume}[music_a]")
+            audio_nodes.append("[music_a]")
+
+        inputs += 1
+        print(f"[DEBUG] Added music input #{inputs} (ducking: {has_speech and ducking})")
+
+    return extra_inputs, audio_filter_parts, audio_nodes
+
+
+# =============================================================================
+# Subtitle Style Preview
+# =============================================================================
+
+def _preview_text_at(srt_path: Optional[str], timestamp: float) -> Optional[str]:
+    """Subtitle shown at timestamp, else the nearest one."""
+    if not srt_path or not os.path.exists(srt_path):
+        return None
+    track = load_track(srt_path)
+    if not len(track):
+        return None
+    active = track.window(timestamp, timestamp + 0.001)
+    if len(active):
+        return '\n'.join(active.texts())
+    nearest = min(range(len(track)), key=lambda i: min(abs(track.starts[i] - timestamp), abs(track.ends[i] - timestamp)))
+    return track.text(nearest)
+
+
+def _prune_style_previews():
+    previews = sorted(STYLE_PREVIEW_DIR.glob('*.jpg'), key=lambda p: p.stat().st_mtime)
+    for old in previews[:-STYLE_PREVIEW_MAX_FILES]:
+        try:
+            old.unlink()
+        except OSError:
+            pass
+
+
+def render_subtitle_style_preview(
+    video_path: str,
+    timestamp: float,
+    font_name: str = "Arial",
+    font_color: str = "#FFFFFF",
+    font_size: int = 24,
+    srt_path: Optional[str] = None,
+    text: Optional[str] = None
+) -> Optional[str]:
     """
-    Filter SRT entries to only include subtitles within the given time range.
-    Returns a new SRT string with only relevant entries, renumbered.
+    One frame at timestamp with a subtitle burned in using the export's ASS style
+    (convert_srt_to_ass template, fontsdir fonts). Returns the JPEG path or None.
+
+    The text is the given text, else the subtitle at (or nearest) timestamp.
+    Input seeking decodes from the previous keyframe only, and results are
+    cached by video, timestamp, text and style.
     """
-    import re
+    from services.text_service import build_ass_document
 
-    def parse_srt_time(time_str: str) -> float:
-        """Parse SRT time format to seconds."""
-        match = re.match(r"(\d{2}):(\d{2}):(\d{2}),(\d{3})", time_str)
-        if match:
-            h, m, s, ms = map(int, match.groups())
-            return h * 3600 + m * 60 + s + ms / 1000
-        return 0
+    if not os.path.exists(video_path):
+        print(f"[ERROR] Video not found for style preview: {video_path}")
+        return None
 
-    # Split by double newline to get entries
-    entries = re.split(r'\n\n+', srt_content.strip())
-    filtered_entries = []
+    timestamp = round(max(0.0, float(timestamp)), 2)
+    text = (text or _preview_text_at(srt_path, timestamp) or STYLE_PREVIEW_SAMPLE_TEXT).strip()
+
+    frame_source = proxy_for(video_path)
+    stat = os.stat(video_path)
+    key = hashlib.sha1('\x00'.join(str(p) for p in (
+        os.path.abspath(video_path), stat.st_size, stat.st_mtime_ns, frame_source, timestamp,
+        text, font_name, font_color.upper(), int(font_size)
+    )).encode('utf-8')).hexdigest()[:20]
+
+    STYLE_PREVIEW_DIR.mkdir(parents=True, exist_ok=True)
+    output_path = STYLE_PREVIEW_DIR / f"{Path(video_path).stem}_{key}.jpg"
+    if output_path.exists():
+        os.utime(output_path, None)
+        return str(output_path)
+
+    width, height = get_video_resolution(video_path)
+    track = SubtitleTrack.from_entries([{'start': 0.0, 'end': 5.0, 'text': text}])
+    ass_path = STYLE_PREVIEW_DIR / f"{Path(video_path).stem}_{key}.ass"
+    try:
+        with open(ass_path, 'w', encoding='utf-8') as f:
+            f.write(build_ass_document(track, width, height, font_name, font_color, int(font_size)))
+
+        # -ss before -i: fast keyframe seek, the frame then has timestamp 0.
+        # Frames come from the proxy; PlayRes stays the source size so libass
+        # scales the style exactly as in the export.
+        vf = (f"{_subtitle_filter(escape_ffmpeg_path_for_subtitles(str(ass_path)), True)},"
+              f"scale=-2:'min({STYLE_PREVIEW_MAX_HEIGHT},ih)'")
+        cmd = [
+            'ffmpeg', '-y', '-ss', f"{timestamp:.2f}", '-i', frame_source,
+            '-frames:v', '1', '-vf', vf, '-q:v', '3', str(output_path)
+        ]
+        result = subprocess.run(cmd, capture_output=True, text=True, encoding='utf-8', errors='replace')
+        if result.returncode != 0 or not output_path.exists():
+            print(f"[ERROR] Style preview failed: {result.stderr[-300:]}")
+            return None
+    except Exception as e:
+        print(f"[ERROR] Style preview failed: {e}")
+        return None
+    finally:
+        try:
+            os.remove(ass_path)
+        except OSError:
+            pass
 
-    for entry in entries:
-        lines = entry.strip().split('\n')
-        if len(lines) >= 2:
-            # Find time line (contains -->)
-            time_line_idx = -1
-            for idx, line in enumerate(lines):
-                if '-->' in line:
-                    time_line_idx = idx
-                    break
+    _prune_style_previews()
+    return str(output_path)
 
-            if time_line_idx == -1:
-                continue
 
-            time_match = re.match(r'(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})', lines[time_line_idx])
-            if time_match:
-                entry_start = parse_srt_time(time_match.group(1))
-                entry_end = parse_srt_time(time_match.group(2))
+# =============================================================================
+# Shorts Generation - With Sync Fix and Separate Subtitle Formatting
+# =============================================================================
 
-                # Include if entry overlaps with our range
-                if entry_end > start_time and entry_start < end_time:
-                    filtered_entries.append(entry)
+def adjust_srt_times(srt_content: str, offset_seconds: float) -> str:
+    """
+    Adjust all SRT timestamps by subtracting offset_seconds.
+    This is CRITICAL for shorts - when a short starts at X seconds,
+    we subtract X from all subtitle times so the first subtitle starts at 0.
+    """
+    return SubtitleTrack.from_srt(srt_content).shifted(offset_seconds).to_srt()
 
-    # Renumber entries
-    result_lines = []
-    for i, entry in enumerate(filtered_entries, 1):
-        lines = entry.strip().split('\n')
-        # Replace first line (index) with new number
-        lines[0] = str(i)
-        result_lines.append('\n'.join(lines))
 
-    return '\n\n'.join(result_lines) + '\n\n' if result_lines else ''
+def filter_srt_for_range(srt_content: str, start_time: float, end_time: float) -> str:
+    """
+    Filter SRT entries to only include subtitles within the given time range.
+    Returns a new SRT string with only relevant entries, renumbered.
+    """
+    return SubtitleTrack.from_srt(srt_content).window(start_time, end_time).to_srt()
 
 
 def create_adjusted_srt_for_short(
@@ -525,24 +643,19 @@ def create_adjusted_srt_for_short(
     Create a new SRT file adjusted for a short clip.
     CRITICAL FIX: Subtracts the short's start time from all subtitle timestamps
     so subtitles sync properly with the new video that starts at 0.
+
+    The original SRT is parsed and indexed once (load_track) and shared by all
+    shorts cut from it; each short is a binary-searched slice of that track.
     """
     try:
-        with open(original_srt_path, 'r', encoding='utf-8') as f:
-            original_content = f.read()
-
-        # Filter to only entries within our time range
-        filtered_content = filter_srt_for_range(original_content, short_start, short_end)
+        # Entries overlapping the short, shifted so the short starts at 0
+        short_track = load_track(original_srt_path).window(short_start, short_end, offset=short_start)
 
-        if not filtered_content.strip():
+        if not len(short_track):
             print(f"[WARNING] No subtitles found in range {short_start:.1f}-{short_end:.1f}")
             return False
 
-        # CRITICAL: Adjust times by subtracting the start offset
-        # This ensures subtitles start at 0 in the new short
-        adjusted_content = adjust_srt_times(filtered_content, short_start)
-
-        with open(output_srt_path, 'w', encoding='utf-8', newline='\n') as f:
-            f.write(adjusted_content)
+        short_track.write_srt(output_srt_path)
 
         print(f"[INFO] Created time-adjusted SRT: {output_srt_path} (offset: -{short_start:.2f}s)")
         return True
@@ -710,17 +823,18 @@ def transcribe_short_audio_with_groq(audio_path: str) -> Tuple[List[Dict], str]:
         return [], ""
 
     try:
-        from groq import Groq
-        client = Groq(api_key=GROQ_API_KEY)
+        client = get_groq_client()
 
         with open(audio_path, "rb") as audio_file:
-            transcription = client.audio.transcriptions.create(
-                file=(Path(audio_path).name, audio_file.read()),
-                model="whisper-large-v3",
-                language="he",
-                response_format="verbose_json",
-                temperature=0.0
-            )
+            audio_bytes = audio_file.read()
+
+        transcription = run_llm_call('groq-asr', lambda: client.audio.transcriptions.create(
+            file=(Path(audio_path).name, audio_bytes),
+            model="whisper-large-v3",
+            language="he",
+            response_format="verbose_json",
+            temperature=0.0
+        ))
 
         full_text = transcription.text if hasattr(transcription, 'text') else ""
         raw_segments = transcription.segments if hasattr(transcription, 'segments') else []
@@ -752,23 +866,11 @@ def improve_transcription_with_ai(segments: List[Dict]) -> List[Dict]:
     SAFETY: If AI changes timing structure, falls back to original segments.
     """
     import json
-    import os
-    import ssl
-    import certifi
 
     if not segments:
         return segments
 
     try:
-        # SSL bypass for Gemini
-        if 'HTTPLIB2_CA_CERTS' in os.environ:
-            del os.environ['HTTPLIB2_CA_CERTS']
-        os.environ['HTTPLIB2_CA_CERTS'] = certifi.where()
-        ssl._create_default_https_context = ssl._create_unverified_context
-
-        import google.generativeai as genai
-        genai.configure(transport='rest')
-
         # Prepare JSON for AI
         segments_json = json.dumps(segments, ensure_ascii=False, indent=2)
 
@@ -787,9 +889,12 @@ def improve_transcription_with_ai(segments: List[Dict]) -> List[Dict]:
 
 החזר את ה-JSON המתוקן בלבד:"""
 
-        model = genai.GenerativeModel('gemini-2.0-flash')
-        response = model.generate_content(prompt)
-        response_text = response.text.strip()
+        model = get_gemini_model('gemini-2.0-flash')
+        response_text = cached_completion(
+            'gemini/gemini-2.0-flash', prompt,
+            lambda: model.generate_content(prompt).text,
+            deterministic=True
+        ).strip()
 
         # Clean response from markdown
         if "```json" in response_text:
@@ -1203,8 +1308,8 @@ def generate_thumbnail(
         progress_callback(10, "יוצר תמונה ממוזערת...")
 
     try:
-        # Get middle frame
-        cap = cv2.VideoCapture(str(video_path))
+        # Get middle frame (from the analysis proxy when there is one)
+        cap = cv2.VideoCapture(proxy_for(video_path))
         total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
         cap.set(cv2.CAP_PROP_POS_FRAMES, total_frames // 2)
 
@@ -1453,15 +1558,13 @@ def _generate_image_gemini(
         from google import genai
         from PIL import Image
         import io
-        import httpx
 
         mode_label = "NetFree" if netfree_mode else "Normal"
         if progress_callback:
             progress_callback(10, "יוצר תמונה ב-Nano Banana...")
 
-        # httpx with verify=False to bypass SSL interception
-        http_client = httpx.Client(verify=False)
-        client = genai.Client(api_key=GEMINI_API_KEY, http_options={"httpx_client": http_client})
+        # Shared client - pooled httpx with verify=False to bypass SSL interception
+        client = get_genai_client()
 
         if progress_callback:
             progress_callback(30, "מייצר תמונה עם Gemini...")
@@ -1680,124 +1783,84 @@ def parse_srt_response(srt_text: str) -> List[Dict]:
     Parse SRT format text into a list of subtitle entries.
     Returns list of {'start': float, 'end': float, 'text': str}
     """
-    import re
-
-    entries = []
+    return [
+        {'start': cue.start, 'end': cue.end, 'text': cue.text, 'timestamp': cue.start}
+        for cue in SubtitleTrack.from_srt(srt_text)
+    ]
 
-    # Clean up the response - remove markdown code blocks if present
-    srt_text = srt_text.strip()
-    if srt_text.startswith("```"):
-        # Remove markdown code block
-        lines = srt_text.split('\n')
-        srt_text = '\n'.join(lines[1:-1] if lines[-1].strip() == '```' else lines[1:])
 
-    # Split into blocks (separated by blank lines)
-    blocks = re.split(r'\n\s*\n', srt_text.strip())
-
-    for block in blocks:
-        lines = block.strip().split('\n')
-        if len(lines) < 2:
-            continue
-
-        # Find the timing line (contains -->)
-        timing_line = None
-        text_lines = []
-
-        for i, line in enumerate(lines):
-            if '-->' in line:
-                timing_line = line
-                text_lines = lines[i+1:]
-                break
-
-        if not timing_line:
-            continue
-
-        # Parse timing: 00:00:00,000 --> 00:00:00,000
-        timing_match = re.match(
-            r'(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})[,.](\d{3})',
-            timing_line.strip()
-        )
+def _extract_text_local_ocr(video_path: str, progress_callback=None, srt_output_path: str = None) -> Tuple[str, List[Dict]]:
+    """
+    Tesseract fallback for extract_text_huggingface (no Gemini key or Gemini failed).
+    Without Tesseract installed this returns nothing instead of decoding the video.
+    """
+    from services.ocr_service import extract_text_from_video_ocr, tesseract_available
+    from services.text_service import create_srt_from_ocr
 
-        if not timing_match:
-            # Try simpler format: 00:00:00 --> 00:00:00
-            timing_match = re.match(
-                r'(\d{1,2}):(\d{2}):(\d{2})\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})',
-                timing_line.strip()
-            )
-            if timing_match:
-                h1, m1, s1, h2, m2, s2 = timing_match.groups()
-                start = int(h1) * 3600 + int(m1) * 60 + int(s1)
-                end = int(h2) * 3600 + int(m2) * 60 + int(s2)
-            else:
-                continue
-        else:
-            h1, m1, s1, ms1, h2, m2, s2, ms2 = timing_match.groups()
-            start = int(h1) * 3600 + int(m1) * 60 + int(s1) + int(ms1) / 1000
-            end = int(h2) * 3600 + int(m2) * 60 + int(s2) + int(ms2) / 1000
-
-        text = ' '.join(text_lines).strip()
-
-        if text:
-            entries.append({
-                'start': start,
-                'end': end,
-                'text': text,
-                'timestamp': start
-            })
+    if not tesseract_available():
+        print("[WARNING] Tesseract not installed, skipping local OCR fallback")
+        return "", []
 
-    return entries
+    text, entries = extract_text_from_video_ocr(video_path, progress_callback)
+    if entries and srt_output_path:
+        create_srt_from_ocr(entries, srt_output_path)
+    return text, entries
 
 
-def extract_text_huggingface(video_path: str, progress_callback=None, srt_output_path: str = None) -> Tuple[str, List[Dict]]:
+def extract_text_huggingface(
+    video_path: str,
+    progress_callback=None,
+    srt_output_path: str = None,
+    preview_mode: str = None
+) -> Tuple[str, List[Dict]]:
     """
     Extracts text from video using Gemini File API.
-    SSL Patch: Forces httplib2 to bypass environment variable checks.
 
     Args:
         video_path: Path to the video file
         progress_callback: Optional callback for progress updates
         srt_output_path: Optional path to save SRT file directly (recommended)
+        preview_mode: "band" uploads only the detected subtitle strip at reduced
+                      width, "band_changes" additionally drops frames where the strip
+                      did not change, "full" uploads the whole frame at 1280px.
+                      Defaults to GEMINI_OCR_PREVIEW_MODE.
 
     Returns:
         Tuple of (srt_content, entries)
     """
-    import os
-    import sys
-    import ssl
-    import certifi
-    import time
-    from typing import Tuple, List, Dict
-
-    # --- הזרקה אגרסיבית למניעת RuntimeError: HTTPLIB2_CA_CERTS ---
-    # אנחנו יוצרים אובייקט דמה שמחליף את הספרייה הבעייתית
-    class MockCerts:
-        @staticmethod
-        def where():
-            return certifi.where()
-
-    # הזרקה למערכת המודולים של פייתון
-    sys.modules['httplib2.certs'] = MockCerts
-
-    # ניקוי משתני סביבה וביטול אימות SSL
-    if 'HTTPLIB2_CA_CERTS' in os.environ:
-        del os.environ['HTTPLIB2_CA_CERTS']
-
-    import httplib2
-    httplib2.CA_CERTS = certifi.where()
-    ssl._create_default_https_context = ssl._create_unverified_context
-    # -----------------------------------------------------------
-
-    # עכשיו טוענים את גוגל - הוא כבר יראה את המודול המזוייף שלנו ולא יקרוס
-    import google.generativeai as genai
     from utils.helpers import parse_srt, create_preview_video
 
+    # Band detection, previews and OCR all decode the analysis proxy (same timeline)
+    video_path = proxy_for(video_path)
+
+    if not GEMINI_API_KEY:
+        print("[WARNING] No Gemini API key, extracting subtitles with local OCR")
+        return _extract_text_local_ocr(video_path, progress_callback, srt_output_path)
+
+    preview_mode = preview_mode or GEMINI_OCR_PREVIEW_MODE
+
     if progress_callback:
-        progress_callback(5, "מכין את הסרטון לסריקה (8 FPS)...")
+        progress_callback(5, "מכין את הסרטון לסריקה...")
 
+    preview_path = None
     try:
-        # יצירת פריוויו איכותי לסריקה
-        genai.configure(transport='rest') # זה משנה את הצינור מ-gRPC ל-REST, שהוא הרבה יותר סלחן ל-SSL
-        preview_path = create_preview_video(video_path, width=1280, fps=8, crf=20)
+        genai = get_gemini()
+
+        # Only the subtitle strip matters - encode just that band, at reduced width
+        band = None
+        if preview_mode in ("band", "band_changes"):
+            from services.ocr_service import detect_subtitle_band
+            band = detect_subtitle_band(video_path)
+            print(f"[INFO] Subtitle band: {band}" if band else "[WARNING] Subtitle band not detected, uploading full frames")
+
+        if band:
+            preview_path = create_preview_video(
+                video_path, width=GEMINI_OCR_PREVIEW_WIDTH, fps=GEMINI_OCR_PREVIEW_FPS, crf=20,
+                band=band, changes_only=preview_mode == "band_changes"
+            )
+        else:
+            preview_path = create_preview_video(video_path, width=1280, fps=8, crf=20)
+        print(f"[INFO] Gemini OCR preview ({preview_mode}): {os.path.getsize(preview_path) / (1024 * 1024):.2f} MB")
 
         if progress_callback:
             progress_callback(15, "מעלה קובץ ל-Gemini...")
@@ -1805,24 +1868,28 @@ def extract_text_huggingface(video_path: str, progress_callback=None, srt_output
         # העלאה ל-API
         video_file = genai.upload_file(path=preview_path)
 
-        # המתנה לסיום עיבוד הקובץ בשרתים של גוגל
+        # המתנה לסיום עיבוד הקובץ בשרתים של גוגל (small previews finish fast - poll quickly at first)
+        poll_interval = 0.5
         while video_file.state.name == "PROCESSING":
-            time.sleep(2)
+            time.sleep(poll_interval)
+            poll_interval = min(poll_interval * 2, 2.0)
             video_file = genai.get_file(video_file.name)
 
         if progress_callback:
             progress_callback(30, "מנתח טקסט (סריקה מלאה)...")
 
         # שימוש במודל פלאש עם פרומפט אגרסיבי לתמלול מלא
-        model = genai.GenerativeModel('gemini-2.5-flash')
+        model = get_gemini_model('gemini-2.5-flash')
         prompt = """
         עליך לשמש כמכונת OCR מדויקת.
         חלץ את כל הכתוביות המופיעות בסרטון מההתחלה (00:00:00) ועד הסוף המוחלט.
         אל תסכם, אל תשמיט מילים, ואל תדלג על משפטים.
         הפלט חייב להיות בפורמט SRT בלבד.
         """
+        if band:
+            prompt += "\n        הסרטון מציג רק את פס הכתוביות מתוך המסך המקורי. הזמנים בסרטון זהים לזמנים במקור.\n"
 
-        response = model.generate_content([prompt, video_file])
+        response = run_llm_call('gemini', lambda: model.generate_content([prompt, video_file]))
         srt_content = response.text
 
         # ניקוי הפלט של Gemini (הסרת סימני ``` אם ישנם)
@@ -1845,10 +1912,6 @@ def extract_text_huggingface(video_path: str, progress_callback=None, srt_output
         entries = parse_srt(srt_content)
         print(f"[INFO] Parsed {len(entries)} subtitle entries from Gemini response")
 
-        # ניקוי קובץ הפריוויו מהמחשב
-        if os.path.exists(preview_path):
-            os.remove(preview_path)
-
         if progress_callback:
             progress_callback(100, "התמלול הושלם בהצלחה!")
 
@@ -1856,7 +1919,12 @@ def extract_text_huggingface(video_path: str, progress_callback=None, srt_output
 
     except Exception as e:
         print(f"[ERROR] Gemini Extraction Failed: {str(e)}")
-        return "", []
+        return _extract_text_local_ocr(video_path, progress_callback, srt_output_path)
+
+    finally:
+        # ניקוי קובץ הפריוויו מהמחשב
+        if preview_path and os.path.exists(preview_path):
+            os.remove(preview_path)
 
 
 # =============================================================================
@@ -1868,19 +1936,6 @@ def video_planner_chat(
     current_script: str = "",
     file_context: str = ""
 ) -> dict:
-    import os
-    import sys
-    import ssl
-    import certifi
-    
-    # תיקון קריטי לשגיאת ה-RuntimeError
-    if 'HTTPLIB2_CA_CERTS' in os.environ:
-        del os.environ['HTTPLIB2_CA_CERTS']
-    os.environ['HTTPLIB2_CA_CERTS'] = certifi.where()
-    ssl._create_default_https_context = ssl._create_unverified_context
-
-    import google.generativeai as genai
-
     if not user_message or not user_message.strip():
         return {"success": False, "script": current_script, "ai_message": "", "error": "No message provided"}
 
@@ -1895,26 +1950,23 @@ CHAT: [כאן הדיבור החופשי וההסברים שלך]
 SCRIPT: [כאן אך ורק מערך השיעור המפורט. אם אין מערך מוכן, כתוב את המילה None]"""
 
     try:
-        genai.configure(transport='rest')
-        
-        model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash',
-            system_instruction=system_prompt
-        )
+        model = get_gemini_model('gemini-2.0-flash', system_prompt)
 
         history_for_gemini = []
         for msg in conversation_history:
             role = "user" if msg.get("role") == "user" else "model"
             history_for_gemini.append({"role": role, "parts": [msg.get("content", "")]})
 
-        chat = model.start_chat(history=history_for_gemini)
-        
         full_input = user_message
         if current_script and current_script.strip():
             full_input = f"המערך הנוכחי:\n{current_script}\n\nבקשת המשתמש: {user_message}"
 
-        response = chat.send_message(full_input)
-        response_text = response.text.strip()
+        response_text = cached_completion(
+            'gemini/gemini-2.0-flash',
+            {"system": system_prompt, "history": history_for_gemini, "input": full_input},
+            lambda: model.start_chat(history=history_for_gemini).send_message(full_input).text,
+            priority=PRIORITY_INTERACTIVE
+        ).strip()
 
         script = ""
         ai_message = ""
@@ -1942,61 +1994,3 @@ SCRIPT: [כאן אך ורק מערך השיעור המפורט. אם אין מע
             "ai_message": "אירעה שגיאה טכנית בחיבור. נסה שנית.",
             "error": str(e)
         }
-
-    try:
-        genai.configure(transport='rest')
-        
-        # כאן השינוי המרכזי - הגדרת ההוראות בתוך המודל
-        model = genai.GenerativeModel(
-            model_name='gemini-2.0-flash',
-            system_instruction=system_prompt
-        )
-
-        # בניית היסטוריית השיחה
-        history_for_gemini = []
-        if file_context:
-            history_for_gemini.append({"role": "user", "parts": [f"חומר רקע: {file_context}"]})
-            history_for_gemini.append({"role": "model", "parts": ["קיבלתי את החומר. אשתמש בו לבניית המערך."]})
-
-        for msg in conversation_history:
-            role = "user" if msg.get("role") == "user" else "model"
-            history_for_gemini.append({"role": role, "parts": [msg.get("content", "")]})
-
-        # יצירת הצ'אט ושליחת ההודעה האחרונה
-        chat = model.start_chat(history=history_for_gemini)
-        
-        full_user_input = user_message
-        if current_script and current_script.strip():
-            full_user_input = f"המערך הנוכחי:\n{current_script}\n\nבקשת המשתמש: {user_message}"
-
-        response = chat.send_message(full_user_input)
-        response_text = response.text.strip()
-
-        # פיצול התגובה
-        script = ""
-        ai_message = ""
-
-        if "CHAT:" in response_text and "SCRIPT:" in response_text:
-            parts = response_text.split("SCRIPT:")
-            ai_message = parts[0].replace("CHAT:", "").strip()
-            script_part = parts[1].strip()
-            script = "" if script_part.lower() == "none" else script_part
-        else:
-            # Fallback אם ה-AI בכל זאת פספס
-            ai_message = response_text
-            script = ""
-
-        return {
-            "success": True,
-            "script": script if script else current_script,
-            "ai_message": ai_message
-        }
-
-    except Exception as e:
-        print(f"Error: {e}")
-        return {
-            "success": False,
-            "script": current_script,
-            "ai_message": f"שגיאת תקשורת: {str(e)}. וודא שאין חסימת רשת.",
-            "error": str(e)
-        }
\ No newline at end of file
@@ -9,7 +9,6 @@ import json
 import re
 import time
 import uuid
-import random
 from pathlib import Path
 
 from utils.config import (
@@ -19,19 +18,26 @@ from utils.config import (
     MUSIC_DIR,
     MUSIC_TEMP_DIR,
     SERVER_BASE_URL,
+    WHATSAPP_REVIEW_CHUNK_SECONDS,
 )
-from services.greenapi_service import send_text_message, send_file_by_url, download_media
+from utils.subtitles import load_track
+from utils.helpers import text_similarity
+from utils.llm_clients import get_groq_client
+from utils.llm_scheduler import PRIORITY_INTERACTIVE, run_llm_call, estimate_tokens
+from services.greenapi_service import send_text_message_async, send_file_by_url_async, download_media
 from services.audio_service import (
     transcribe_with_groq,
     get_random_music,
     list_music_library,
     download_audio_from_url,
+    speech_intervals_from_entries,
 )
 from services.video_service import (
     get_video_duration,
     get_video_resolution,
     check_video_has_audio,
     merge_final_video,
+    render_subtitle_style_preview,
 )
 from services.text_service import (
     convert_srt_to_ass,
@@ -41,6 +47,7 @@ from services.text_service import (
     extract_text_from_file,
 )
 from services.font_service import ensure_font_available
+from services.proxy_service import ensure_normalized, prepare_media
 from services.marketing_service import generate_marketing_kit
 
 # ============================================================================
@@ -164,14 +171,16 @@ def _build_system_prompt(convo: dict) -> str:
 
 def _call_groq(messages: list) -> str:
     """Synchronous call to Groq (runs in executor)."""
-    from groq import Groq
-
-    client = Groq(api_key=GROQ_API_KEY)
-    response = client.chat.completions.create(
-        model="llama-3.3-70b-versatile",
-        messages=messages,
-        temperature=0.7,
-        max_tokens=500,
+    response = run_llm_call(
+        "groq", lambda: get_groq_client().chat.completions.create(
+            model="llama-3.3-70b-versatile",
+            messages=messages,
+            temperature=0.7,
+            max_tokens=500,
+        ),
+        priority=PRIORITY_INTERACTIVE,
+        estimated_tokens=estimate_tokens(messages, 500),
+        hedge=True,
     )
     return response.choices[0].message.content.strip()
 
@@ -253,22 +262,25 @@ async def _phase1_transcribe(phone: str, convo: dict):
     """Phase 1: Transcribe video and send subtitles for review."""
     chat_id = phone
     loop = asyncio.get_event_loop()
-    video_path = convo["video_path"]
     file_id = convo["file_id"]
     srt_path = str(OUTPUTS_DIR / f"{file_id}.srt")
     convo["srt_path"] = srt_path
 
-    send_text_message(chat_id, "⏳ מתחיל לעבד את הסרטון... מתמלל...")
+    await send_text_message_async(chat_id, "⏳ מתחיל לעבד את הסרטון... מתמלל...")
 
     try:
-        has_audio = check_video_has_audio(video_path)
+        # Waits for the background normalization if it is still running
+        video_path = await loop.run_in_executor(None, ensure_normalized, convo["video_path"])
+        convo["video_path"] = video_path
+
+        has_audio = await loop.run_in_executor(None, check_video_has_audio, video_path)
 
         if has_audio:
             success, transcript = await loop.run_in_executor(
                 None, lambda: transcribe_with_groq(video_path, srt_path, None)
             )
             if not success:
-                send_text_message(chat_id, "❌ שגיאה בתמלול. נסה שוב.")
+                await send_text_message_async(chat_id, "❌ שגיאה בתמלול. נסה שוב.")
                 convo["state"] = "idle"
                 return
         else:
@@ -286,29 +298,28 @@ async def _phase1_transcribe(phone: str, convo: dict):
             )
 
         # Read subtitles and send to user for review
-        entries = parse_srt_file(srt_path)
-        if not entries:
-            send_text_message(chat_id, "⚠️ לא הצלחתי לחלץ כתוביות מהסרטון. ממשיך בעיבוד בלי כתוביות...")
+        track = load_track(srt_path) if srt_file.exists() else None
+        if not track:
+            await send_text_message_async(chat_id, "⚠️ לא הצלחתי לחלץ כתוביות מהסרטון. ממשיך בעיבוד בלי כתוביות...")
             convo["settings"]["subtitlesEnabled"] = False
             convo["state"] = "processing"
             await _phase2_finalize(phone, convo)
             return
 
-        # Build subtitles text for user review
-        subtitle_lines = []
-        for entry in entries:
-            text = entry.get("text", "")
-            subtitle_lines.append(text)
-
-        subtitles_text = "\n".join(subtitle_lines)
+        # Long videos: one message per time range, in order, so every part stays readable
+        chunks = _subtitle_review_chunks(track)
+        convo["review_chunks"] = chunks
+        await send_text_message_async(chat_id, "📝 הנה הכתוביות שמצאתי:")
+        for chunk in chunks:
+            await send_text_message_async(
+                chat_id, f"{chunk['header']}\n{chunk['text']}" if len(chunks) > 1 else chunk["text"]
+            )
 
         review_msg = (
-            f"📝 הנה הכתוביות שמצאתי:\n\n"
-            f"{subtitles_text}\n\n"
-            f"שלח *אישור* להמשיך עם הכתוביות האלה,\n"
-            f"או שלח את הטקסט המתוקן."
+            "שלח *אישור* להמשיך עם הכתוביות האלה,\n"
+            "או שלח את הטקסט המתוקן."
         )
-        send_text_message(chat_id, review_msg)
+        await send_text_message_async(chat_id, review_msg)
         convo["state"] = "waiting_subtitle_review"
         print(f"[WA-Chat] {phone}: Sent subtitles for review, state=waiting_subtitle_review")
 
@@ -316,10 +327,33 @@ async def _phase1_transcribe(phone: str, convo: dict):
         print(f"[WA-Chat] Phase 1 error: {e}")
         import traceback
         traceback.print_exc()
-        send_text_message(chat_id, f"❌ שגיאה בעיבוד: {str(e)[:200]}")
+        await send_text_message_async(chat_id, f"❌ שגיאה בעיבוד: {str(e)[:200]}")
         convo["state"] = "idle"
 
 
+def _subtitle_review_chunks(track) -> list:
+    """
+    [{"header", "indexes", "text"}] per WHATSAPP_REVIEW_CHUNK_SECONDS of video.
+    One line per cue, so a corrected reply maps back line by line onto `indexes`.
+    """
+    def _mmss(seconds: float) -> str:
+        return f"{int(seconds) // 60:02d}:{int(seconds) % 60:02d}"
+
+    chunks = []
+    chunk_start = 0.0
+    while chunk_start < track.duration:
+        chunk_end = chunk_start + WHATSAPP_REVIEW_CHUNK_SECONDS
+        part = track.starting_in(chunk_start, chunk_end)
+        if len(part):
+            chunks.append({
+                "header": f"⏱ {_mmss(chunk_start)}-{_mmss(min(chunk_end, track.duration))}",
+                "indexes": list(part.indexes),
+                "text": "\n".join(" ".join(text.split()) for text in part.texts()),
+            })
+        chunk_start = chunk_end
+    return chunks
+
+
 async def _phase2_finalize(phone: str, convo: dict):
     """Phase 2: Select music, mix, burn subtitles, render final video."""
     chat_id = phone
@@ -330,18 +364,20 @@ async def _phase2_finalize(phone: str, convo: dict):
     srt_path = convo["srt_path"]
     out_path = str(OUTPUTS_DIR / f"{file_id}_final.mp4")
 
-    send_text_message(chat_id, "⏳ ממשיך עיבוד... מוסיף מוזיקה וכתוביות...")
+    await send_text_message_async(chat_id, "⏳ ממשיך עיבוד... מוסיף מוזיקה וכתוביות...")
 
     try:
-        video_duration = get_video_duration(video_path)
-        video_width, video_height = get_video_resolution(video_path)
+        video_duration = await loop.run_in_executor(None, get_video_duration, video_path)
+        video_width, video_height = await loop.run_in_executor(None, get_video_resolution, video_path)
 
         # --- Music selection ---
         chosen_music = None
 
         if s.get("youtubeUrl"):
             # Download from YouTube
-            downloaded = download_audio_from_url(s["youtubeUrl"], str(MUSIC_TEMP_DIR))
+            downloaded = await loop.run_in_executor(
+                None, download_audio_from_url, s["youtubeUrl"], str(MUSIC_TEMP_DIR)
+            )
             if downloaded:
                 chosen_music = downloaded
         elif s.get("musicFile"):
@@ -351,10 +387,6 @@ async def _phase2_finalize(phone: str, convo: dict):
 
         if not chosen_music:
             chosen_music = get_random_music("calm", str(MUSIC_DIR))
-            if not chosen_music:
-                all_music = list(MUSIC_DIR.glob("*.mp3"))
-                if all_music:
-                    chosen_music = str(random.choice(all_music))
 
         # --- ASS subtitles ---
         final_subtitle_path = None
@@ -379,6 +411,11 @@ async def _phase2_finalize(phone: str, convo: dict):
                 final_subtitle_path = srt_path
 
         # --- Final merge ---
+        music_volume = s["musicVolume"] / 100.0 if s["musicVolume"] > 1 else s["musicVolume"]
+        speech_intervals = None
+        if s["ducking"] and chosen_music and srt_file and srt_file.exists():
+            speech_intervals = speech_intervals_from_entries(parse_srt_file(srt_path)) or None
+
         merge_success = await loop.run_in_executor(
             None,
             lambda: merge_final_video(
@@ -387,12 +424,15 @@ async def _phase2_finalize(phone: str, convo: dict):
                 v_output=out_path,
                 music_path=str(chosen_music) if chosen_music else None,
                 voice_path=None,
+                music_volume=music_volume,
+                ducking=s["ducking"],
+                speech_intervals=speech_intervals,
             ),
         )
 
         out_file = Path(out_path)
         if not merge_success or not out_file.exists():
-            send_text_message(chat_id, "❌ שגיאה ביצירת הסרטון הסופי.")
+            await send_text_message_async(chat_id, "❌ שגיאה ביצירת הסרטון הסופי.")
             convo["state"] = "idle"
             return
 
@@ -400,7 +440,7 @@ async def _phase2_finalize(phone: str, convo: dict):
         video_url = f"{SERVER_BASE_URL}/outputs/{out_file.name}"
         print(f"[WA-Chat] Sending final video: {video_url}")
 
-        send_file_by_url(
+        await send_file_by_url_async(
             chat_id=chat_id,
             file_url=video_url,
             filename=out_file.name,
@@ -414,7 +454,7 @@ async def _phase2_finalize(phone: str, convo: dict):
         print(f"[WA-Chat] Phase 2 error: {e}")
         import traceback
         traceback.print_exc()
-        send_text_message(chat_id, f"❌ שגיאה בעיבוד: {str(e)[:200]}")
+        await send_text_message_async(chat_id, f"❌ שגיאה בעיבוד: {str(e)[:200]}")
         convo["state"] = "idle"
 
 
@@ -422,6 +462,51 @@ async def _phase2_finalize(phone: str, convo: dict):
 # Subtitle Review Handler
 # ============================================================================
 
+def _review_corrections(text: str, entries: list, chunks: list) -> dict:
+    """
+    {entry position: corrected text} for a review reply. Lines after a "⏱"
+    header belong to that chunk; headerless lines go to the chunk (or the
+    whole track) whose current text they resemble most.
+    """
+    by_index = {entry["index"]: position for position, entry in enumerate(entries)}
+    if not chunks:
+        chunks = [{"header": None, "indexes": [entry["index"] for entry in entries]}]
+    headers = {chunk["header"]: chunk for chunk in chunks if chunk["header"]}
+
+    segments = []  # [chunk or None, lines]
+    for line in text.split("\n"):
+        line = " ".join(line.split())
+        if not line:
+            continue
+        if line.startswith("⏱"):
+            segments.append([headers.get(line), []])
+            continue
+        if not segments:
+            segments.append([None, []])
+        segments[-1][1].append(line)
+
+    candidates = chunks if len(chunks) == 1 else chunks + [
+        {"header": None, "indexes": [index for chunk in chunks for index in chunk["indexes"]]}
+    ]
+
+    def _score(chunk, lines):
+        pairs = [(line, by_index.get(index)) for line, index in zip(lines, chunk["indexes"])]
+        return sum(text_similarity(line, entries[pos]["text"]) for line, pos in pairs if pos is not None) / len(lines)
+
+    corrections = {}
+    for chunk, lines in segments:
+        if not lines:
+            continue
+        if chunk is None:
+            chunk = max(candidates, key=lambda candidate: _score(candidate, lines))
+        for line, index in zip(lines, chunk["indexes"]):
+            position = by_index.get(index)
+            # Unchanged lines keep their original line breaks
+            if position is not None and line != " ".join(entries[position]["text"].split()):
+                corrections[position] = line
+    return corrections
+
+
 async def _handle_subtitle_review(phone: str, convo: dict, text: str):
     """Handle user response during subtitle review state."""
     chat_id = phone
@@ -437,23 +522,21 @@ async def _handle_subtitle_review(phone: str, convo: dict, text: str):
         if srt_path:
             try:
                 entries = parse_srt_file(srt_path)
-                corrected_lines = text.strip().split("\n")
-                corrected_lines = [l.strip() for l in corrected_lines if l.strip()]
+                corrections = _review_corrections(text, entries, convo.get("review_chunks") or [])
 
-                if entries and corrected_lines:
+                if entries and corrections:
                     # Map corrected lines to existing timing entries
-                    for i, entry in enumerate(entries):
-                        if i < len(corrected_lines):
-                            entry["text"] = corrected_lines[i]
+                    for position, corrected in corrections.items():
+                        entries[position]["text"] = corrected
                     write_srt_from_entries(entries, srt_path)
-                    send_text_message(chat_id, "✏️ עדכנתי את הכתוביות!")
+                    await send_text_message_async(chat_id, "✏️ עדכנתי את הכתוביות!")
                 else:
-                    send_text_message(chat_id, "⚠️ לא הצלחתי לעדכן. ממשיך עם הכתוביות המקוריות.")
+                    await send_text_message_async(chat_id, "⚠️ לא הצלחתי לעדכן. ממשיך עם הכתוביות המקוריות.")
             except Exception as e:
                 print(f"[WA-Chat] Subtitle update error: {e}")
-                send_text_message(chat_id, "⚠️ שגיאה בעדכון הכתוביות, ממשיך עם המקוריות.")
+                await send_text_message_async(chat_id, "⚠️ שגיאה בעדכון הכתוביות, ממשיך עם המקוריות.")
     else:
-        send_text_message(chat_id, "👍 מעולה!")
+        await send_text_message_async(chat_id, "👍 מעולה!")
 
     # Continue to Phase 2
     convo["state"] = "processing"
@@ -480,7 +563,7 @@ async def handle_whatsapp_message(phone: str, text: str, media_url: str | None =
 
     # --- Block concurrent processing ---
     if convo["state"] == "processing":
-        send_text_message(chat_id, "⏳ הסרטון שלך עדיין בעיבוד... אנא המתן.")
+        await send_text_message_async(chat_id, "⏳ הסרטון שלך עדיין בעיבוד... אנא המתן.")
         return
 
     # --- State: Waiting for subtitle review ---
@@ -488,31 +571,34 @@ async def handle_whatsapp_message(phone: str, text: str, media_url: str | None =
         if text:
             await _handle_subtitle_review(phone, convo, text)
         else:
-            send_text_message(chat_id, "שלח *אישור* להמשיך, או שלח טקסט מתוקן.")
+            await send_text_message_async(chat_id, "שלח *אישור* להמשיך, או שלח טקסט מתוקן.")
         return
 
     # --- Handle incoming video media ---
     if media_url:
-        local_path = download_media(media_url)
+        loop = asyncio.get_event_loop()
+        local_path = await loop.run_in_executor(None, download_media, media_url)
         if local_path:
             file_id = Path(local_path).stem
             convo["video_path"] = local_path
             convo["file_id"] = file_id
             convo["srt_path"] = None
+            # Normalization and the analysis proxy run in the background while the user chats
+            loop.run_in_executor(None, prepare_media, local_path)
 
             # Check if user also sent a text command with the video
             if text and _is_process_command(text):
-                send_text_message(chat_id, "📹 קיבלתי את הסרטון! מתחיל לעבד...")
+                await send_text_message_async(chat_id, "📹 קיבלתי את הסרטון! מתחיל לעבד...")
                 _add_history(convo, "user", text)
                 convo["state"] = "processing"
                 await _phase1_transcribe(phone, convo)
                 return
             else:
-                send_text_message(chat_id, "📹 קיבלתי את הסרטון שלך! שלח *תערוך* כשתהיה מוכן, או שנה הגדרות קודם (פונט, צבע, מוזיקה וכו').")
+                await send_text_message_async(chat_id, "📹 קיבלתי את הסרטון שלך! שלח *תערוך* כשתהיה מוכן, או שנה הגדרות קודם (פונט, צבע, מוזיקה וכו').")
                 _add_history(convo, "assistant", "קיבלתי את הסרטון")
                 return
         else:
-            send_text_message(chat_id, "❌ לא הצלחתי להוריד את הקובץ. נסה שוב.")
+            await send_text_message_async(chat_id, "❌ לא הצלחתי להוריד את הקובץ. נסה שוב.")
             return
 
     # --- Handle text message ---
@@ -523,13 +609,13 @@ async def handle_whatsapp_message(phone: str, text: str, media_url: str | None =
 
     # Quick check: is this a process command without video?
     if _is_process_command(text) and not convo.get("video_path"):
-        send_text_message(chat_id, "📹 שלח לי סרטון קודם ואז אוכל לעבד אותו.")
+        await send_text_message_async(chat_id, "📹 שלח לי סרטון קודם ואז אוכל לעבד אותו.")
         _add_history(convo, "assistant", "צריך סרטון קודם")
         return
 
     # --- Call AI ---
     if not GROQ_API_KEY:
-        send_text_message(chat_id, "❌ שגיאת מערכת: Groq API key לא מוגדר.")
+        await send_text_message_async(chat_id, "❌ שגיאת מערכת: Groq API key לא מוגדר.")
         return
 
     try:
@@ -564,6 +650,7 @@ async def handle_whatsapp_message(phone: str, text: str, media_url: str | None =
 
         # --- Execute commands ---
         has_process_action = False
+        style_changed = False
 
         for cmd in commands:
             # Style changes → save to state
@@ -577,33 +664,66 @@ async def handle_whatsapp_message(phone: str, text: str, media_url: str | None =
                             val = val.lower() in ("true", "1", "yes")
                     convo["settings"][key] = val
                     print(f"[WA-Chat] Setting {key} = {val}")
+                    if key in ("font", "fontColor", "fontSize"):
+                        style_changed = True
 
             if cmd.get("action") == "process_video":
                 has_process_action = True
 
         # Send AI answer
-        send_text_message(chat_id, answer)
+        await send_text_message_async(chat_id, answer)
         _add_history(convo, "assistant", answer)
 
+        # Show the new style on a frame of the video instead of waiting for a render
+        if style_changed and not has_process_action and convo.get("video_path"):
+            await _send_style_preview(chat_id, convo)
+
         # Start processing if requested
         if has_process_action:
             if convo.get("video_path"):
                 convo["state"] = "processing"
                 await _phase1_transcribe(phone, convo)
             else:
-                send_text_message(chat_id, "📹 שלח לי סרטון קודם ואז אוכל לעבד אותו.")
+                await send_text_message_async(chat_id, "📹 שלח לי סרטון קודם ואז אוכל לעבד אותו.")
 
     except Exception as e:
         print(f"[WA-Chat] Error: {e}")
         import traceback
         traceback.print_exc()
-        send_text_message(chat_id, f"❌ שגיאה: {str(e)[:200]}")
+        await send_text_message_async(chat_id, f"❌ שגיאה: {str(e)[:200]}")
 
 
 # ============================================================================
 # Helpers
 # ============================================================================
 
+async def _send_style_preview(chat_id: str, convo: dict):
+    """Send one frame with the current subtitle style burned in."""
+    s = convo["settings"]
+    video_path = convo["video_path"]
+    loop = asyncio.get_event_loop()
+    try:
+        duration = await loop.run_in_executor(None, get_video_duration, video_path)
+        font_name = await loop.run_in_executor(None, ensure_font_available, s["font"])
+        preview_path = await loop.run_in_executor(
+            None, lambda: render_subtitle_style_preview(
+                video_path, duration / 3 if duration > 0 else 0.0, font_name,
+                s["fontColor"], int(s["fontSize"]), convo.get("srt_path")
+            )
+        )
+    except Exception as e:
+        print(f"[WA-Chat] Style preview failed: {e}")
+        return
+
+    if preview_path:
+        await send_file_by_url_async(
+            chat_id=chat_id,
+            file_url=f"{SERVER_BASE_URL}/outputs/previews/{Path(preview_path).name}",
+            filename=Path(preview_path).name,
+            caption="👀 כך ייראו הכתוביות",
+        )
+
+
 def _is_process_command(text: str) -> bool:
     """Check if text is a video processing command."""
     normalized = text.strip().lower()
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules import each other from the repo root (services.*, utils.*), as main.py does
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
@@ -0,0 +1,129 @@
+"""
+/chat and the WhatsApp flow must keep blocking work off the event loop.
+
+Groq, Green API and the media steps are replaced by stubs that block for
+longer than EVENT_LOOP_BLOCK_WARN_MS; the loop watchdog from core runs during
+the whole conversation and must never see a stall that long.
+"""
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+
+import httpx
+from fastapi import FastAPI
+
+import core
+import routes.chat as chat_route
+import services.whatsapp_chat_service as wa
+from utils.config import EVENT_LOOP_BLOCK_WARN_MS
+
+BLOCK_SECONDS = EVENT_LOOP_BLOCK_WARN_MS * 1.5 / 1000
+
+
+def _blocking(result=None, side_effect=None):
+    def _call(*args, **kwargs):
+        time.sleep(BLOCK_SECONDS)
+        if side_effect:
+            side_effect(*args, **kwargs)
+        return result
+    return _call
+
+
+class _FakeGroq:
+    """Groq client whose chat completion blocks like a network call."""
+
+    def __init__(self, reply: dict):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+        self._reply = reply
+
+    def _create(self, messages, **kwargs):
+        time.sleep(BLOCK_SECONDS)
+        reply = dict(self._reply)
+        if "תערוך" in messages[-1]["content"]:
+            reply["commands"] = [{"action": "process_video"}]
+        content = json.dumps(reply, ensure_ascii=False)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def _with_watchdog(scenario):
+    core.loop_lag_stats.update(max_lag_ms=0.0, stalls=0, last_stall_ms=0.0)
+    watchdog = asyncio.create_task(core.monitor_event_loop(interval=0.01, threshold_ms=EVENT_LOOP_BLOCK_WARN_MS))
+    try:
+        await scenario()
+    finally:
+        watchdog.cancel()
+    return core.loop_lag_stats["max_lag_ms"]
+
+
+def test_chat_endpoint_does_not_block_loop(monkeypatch):
+    monkeypatch.setattr(chat_route, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(chat_route, "get_groq_client", lambda: _FakeGroq({"answer": "ok", "commands": [{"fontSize": 30}]}))
+
+    app = FastAPI()
+    app.include_router(chat_route.router)
+
+    async def scenario():
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+            responses = await asyncio.gather(*(
+                client.post("/chat", data={"message": f"גודל {30 + i}"}) for i in range(3)
+            ))
+        assert all(r.status_code == 200 for r in responses)
+
+    assert asyncio.run(_with_watchdog(scenario)) < EVENT_LOOP_BLOCK_WARN_MS
+
+
+def test_whatsapp_flow_does_not_block_loop(monkeypatch, tmp_path):
+    video_path = tmp_path / "abc12345.mp4"
+    video_path.write_bytes(b"video")
+    sent = []
+
+    async def _send_text(chat_id, text):
+        sent.append(text)
+        return {}
+
+    async def _send_file(chat_id, file_url, filename, caption=""):
+        sent.append(caption)
+        return {}
+
+    def _write_srt(video, srt_path, *args):
+        with open(srt_path, "w", encoding="utf-8") as f:
+            f.write("1\n00:00:01,000 --> 00:00:03,000\nשלום עולם\n\n")
+
+    def _write_output(v_input, srt_input, v_output, **kwargs):
+        with open(v_output, "wb") as f:
+            f.write(b"final")
+
+    monkeypatch.setattr(wa, "conversations", {})
+    monkeypatch.setattr(wa, "GROQ_API_KEY", "test")
+    monkeypatch.setattr(wa, "OUTPUTS_DIR", tmp_path)
+    monkeypatch.setattr(wa, "get_groq_client", lambda: _FakeGroq({"answer": "שיניתי", "commands": [{"fontSize": 32}]}))
+    monkeypatch.setattr(wa, "send_text_message_async", _send_text)
+    monkeypatch.setattr(wa, "send_file_by_url_async", _send_file)
+    monkeypatch.setattr(wa, "download_media", _blocking(str(video_path)))
+    monkeypatch.setattr(wa, "prepare_media", _blocking())
+    monkeypatch.setattr(wa, "ensure_normalized", _blocking(str(video_path)))
+    monkeypatch.setattr(wa, "check_video_has_audio", _blocking(True))
+    monkeypatch.setattr(wa, "get_video_duration", _blocking(10.0))
+    monkeypatch.setattr(wa, "get_video_resolution", _blocking((1280, 720)))
+    monkeypatch.setattr(wa, "ensure_font_available", _blocking("Arial"))
+    monkeypatch.setattr(wa, "render_subtitle_style_preview", _blocking(str(tmp_path / "preview.jpg")))
+    monkeypatch.setattr(wa, "transcribe_with_groq", _blocking((True, "שלום עולם"), _write_srt))
+    monkeypatch.setattr(wa, "fix_subtitles_with_ai", _blocking(True))
+    monkeypatch.setattr(wa, "download_audio_from_url", _blocking(str(tmp_path / "music.mp3")))
+    monkeypatch.setattr(wa, "convert_srt_to_ass", _blocking(False))
+    monkeypatch.setattr(wa, "merge_final_video", _blocking(True, _write_output))
+
+    phone = "972500000000@c.us"
+
+    async def scenario():
+        await wa.handle_whatsapp_message(phone, "", "https://media.example/video.mp4")
+        await wa.handle_whatsapp_message(phone, "גודל 32", None)
+        wa.conversations[phone]["settings"]["youtubeUrl"] = "https://youtu.be/abc"
+        await wa.handle_whatsapp_message(phone, "תערוך", None)
+        assert wa.conversations[phone]["state"] == "waiting_subtitle_review"
+        await wa.handle_whatsapp_message(phone, "אישור", None)
+
+    max_lag_ms = asyncio.run(_with_watchdog(scenario))
+    assert "✅ הסרטון מוכן!" in sent
+    assert max_lag_ms < EVENT_LOOP_BLOCK_WARN_MS
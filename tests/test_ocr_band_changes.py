@@ -0,0 +1,94 @@
+"""
+Frame OCR must skip sampled bands whose subtitle text has not changed, even
+when the background behind the subtitles keeps moving.
+
+The video is synthetic (a panning texture with outlined subtitles that change
+every few seconds) and Tesseract is replaced by an in-process stub that counts
+how many bands would have been OCR'd.
+"""
+from concurrent.futures import Future
+
+import cv2
+import numpy as np
+
+import services.ocr_service as ocr_service
+
+WIDTH, HEIGHT, FPS, DURATION = 640, 360, 10, 60
+SAMPLE_INTERVAL = 2.0
+SUBTITLES = [
+    (0, 6, "Hello and welcome back"),
+    (6, 12, "Today we talk about video"),
+    (12, 15, None),
+    (15, 21, "Subtitles burned into frames"),
+    (21, 27, "are read with OCR"),
+    (27, 33, "only when the text changes"),
+    (33, 39, "Hello and welcome home"),
+    (39, 45, None),
+    (45, 51, "The background keeps moving"),
+    (51, 60, "Thanks for watching"),
+]
+
+
+class _InlineExecutor:
+    """ProcessPoolExecutor stand-in that runs submitted calls right away."""
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def _subtitle_at(t):
+    return next((text for start, end, text in SUBTITLES if start <= t < end), None)
+
+
+def _write_video(path):
+    rng = np.random.default_rng(0)
+    texture = cv2.GaussianBlur(rng.uniform(0, 255, (HEIGHT, WIDTH * 4)).astype(np.float32), (0, 0), 8)
+    texture = cv2.normalize(texture, None, 30, 230, cv2.NORM_MINMAX).astype(np.uint8)
+
+    writer = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), FPS, (WIDTH, HEIGHT))
+    for i in range(FPS * DURATION):
+        t = i / FPS
+        x = int(t * 80) % (WIDTH * 3)  # The background pans 80 px/s under the subtitles
+        frame = cv2.cvtColor(np.ascontiguousarray(texture[:, x:x + WIDTH]), cv2.COLOR_GRAY2BGR)
+        text = _subtitle_at(t)
+        if text:
+            cv2.putText(frame, text, (40, 330), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (0, 0, 0), 6, cv2.LINE_AA)
+            cv2.putText(frame, text, (40, 330), cv2.FONT_HERSHEY_SIMPLEX, 1.0, (255, 255, 255), 2, cv2.LINE_AA)
+        writer.write(frame)
+    writer.release()
+
+
+def test_moving_background_does_not_trigger_ocr(monkeypatch, tmp_path):
+    video_path = tmp_path / "subtitled.avi"
+    _write_video(video_path)
+
+    calls = []
+
+    def _fake_ocr_band(band):
+        calls.append(band)
+        return f"subtitle line {len(calls)}"
+
+    monkeypatch.setattr(ocr_service, "ProcessPoolExecutor", _InlineExecutor)
+    monkeypatch.setattr(ocr_service, "_ocr_band", _fake_ocr_band)
+
+    _, entries = ocr_service.extract_text_from_video_ocr(str(video_path), sample_interval=SAMPLE_INTERVAL)
+
+    sample_times = [i * SAMPLE_INTERVAL for i in range(int(DURATION / SAMPLE_INTERVAL))]
+    shown = [_subtitle_at(t) for t in sample_times]
+    expected_calls = 1 + sum(1 for a, b in zip(shown, shown[1:]) if a != b)
+
+    assert expected_calls == 10
+    assert len(calls) == expected_calls
+    assert len(sample_times) - len(calls) == 20  # Skipped OCR calls
+    assert [entry['start'] for entry in entries] == [0.0, 6.0, 12.0, 16.0, 22.0, 28.0, 34.0, 40.0, 46.0, 52.0]
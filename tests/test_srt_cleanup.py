@@ -0,0 +1,108 @@
+"""
+clean_and_merge_srt must make exactly the decisions of the original
+all-pairs implementation - the pruning in _is_near_duplicate is only allowed
+to skip SequenceMatcher calls whose outcome is already known.
+"""
+import random
+
+from services.text_service import clean_and_merge_srt
+from utils.config import SRT_MIN_GAP_SECONDS, SRT_SIMILARITY_THRESHOLD
+from utils.helpers import text_similarity
+
+
+def _reference_clean_and_merge_srt(entries, min_gap_seconds=SRT_MIN_GAP_SECONDS):
+    """clean_and_merge_srt as it was before the similarity pruning."""
+    sorted_entries = sorted(entries, key=lambda x: x['start'])
+    cleaned = []
+    recent_texts = []
+
+    for entry in sorted_entries:
+        text = entry['text'].strip()
+        start = entry['start']
+        end = entry['end']
+        if not text:
+            continue
+
+        if len(text.split()) < 3:
+            recent_in_window = [t for t, ts in recent_texts if ts >= start - 10.0]
+            if any(text_similarity(text, recent) > SRT_SIMILARITY_THRESHOLD for recent in recent_in_window):
+                continue
+
+        recent_texts.append((text, start))
+        recent_texts = [(t, ts) for t, ts in recent_texts if ts >= start - 15.0]
+
+        if not cleaned:
+            cleaned.append({'index': 1, 'start': start, 'end': end, 'text': text})
+            continue
+
+        prev = cleaned[-1]
+        if text_similarity(prev['text'], text) > SRT_SIMILARITY_THRESHOLD:
+            prev['end'] = max(prev['end'], end)
+            if len(text) > len(prev['text']):
+                prev['text'] = text
+            continue
+
+        if start < prev['end'] + min_gap_seconds:
+            duration = end - start
+            start = prev['end'] + min_gap_seconds
+            end = start + max(duration, 0.5)
+
+        cleaned.append({'index': len(cleaned) + 1, 'start': start, 'end': end, 'text': text})
+
+    return cleaned
+
+
+def _mutate(rng, text):
+    chars = list(text)
+    for _ in range(rng.randint(0, 3)):
+        op = rng.random()
+        pos = rng.randrange(len(chars) + 1)
+        if op < 0.4:
+            chars.insert(pos, rng.choice("abcde "))
+        elif op < 0.8 and chars:
+            del chars[min(pos, len(chars) - 1)]
+        elif chars:
+            chars[min(pos, len(chars) - 1)] = rng.choice("abcde")
+    return "".join(chars) or "a"
+
+
+def _random_transcript(rng, count=40):
+    words = ["ab", "ba", "abc", "cab", "bca", "aab", "abb", "cc", "ca", "ac"]
+    entries = []
+    t = 0.0
+    last = "ab ba"
+    for _ in range(count):
+        if rng.random() < 0.5:
+            text = _mutate(rng, last)
+        else:
+            text = " ".join(rng.choice(words) for _ in range(rng.randint(1, 5)))
+        t += rng.uniform(0.0, 3.0)
+        entries.append({'start': round(t, 2), 'end': round(t + rng.uniform(0.3, 4.0), 2), 'text': text})
+        last = text
+    return entries
+
+
+def test_similarity_order_is_kept():
+    # SequenceMatcher.ratio() is not symmetric; pick a pair where it matters
+    rng = random.Random(7)
+    for _ in range(20000):
+        a, b = _mutate(rng, "abcab cab"), _mutate(rng, "abcab cab")
+        asymmetric = (text_similarity(a, b) > SRT_SIMILARITY_THRESHOLD) != (text_similarity(b, a) > SRT_SIMILARITY_THRESHOLD)
+        # Different distinct-character counts, so the pruning sees a "smaller" side
+        if asymmetric and len(set(a)) != len(set(b)):
+            break
+    else:
+        raise AssertionError("no asymmetric pair found")
+
+    for first, second in ((a, b), (b, a)):
+        entries = [{'start': 0.0, 'end': 1.0, 'text': first}, {'start': 1.5, 'end': 2.5, 'text': second}]
+        expected = _reference_clean_and_merge_srt([dict(e) for e in entries])
+        assert clean_and_merge_srt([dict(e) for e in entries]) == expected
+
+
+def test_matches_reference_on_random_transcripts():
+    rng = random.Random(2024)
+    for _ in range(3000):
+        entries = _random_transcript(rng)
+        expected = _reference_clean_and_merge_srt([dict(e) for e in entries])
+        assert clean_and_merge_srt([dict(e) for e in entries]) == expected
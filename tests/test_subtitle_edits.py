@@ -0,0 +1,63 @@
+"""
+replace_subtitles must turn a full-list save into the line edits it implies,
+so only the time ranges that really changed go stale downstream.
+"""
+from services.subtitle_edit_service import load_edit_state, replace_subtitles
+from services.text_service import parse_srt_file, write_srt_from_entries
+
+
+def _lines(count):
+    return [{'start': i * 3.0, 'end': i * 3.0 + 2.0, 'text': f"שורה {i}"} for i in range(count)]
+
+
+def _write(tmp_path, entries):
+    srt_path = str(tmp_path / "video.srt")
+    write_srt_from_entries(entries, srt_path)
+    return srt_path
+
+
+def _saved(srt_path):
+    return [(e['start'], e['end'], e['text']) for e in parse_srt_file(srt_path)]
+
+
+def test_insert_marks_only_its_own_range_stale(tmp_path):
+    old = _lines(10)
+    srt_path = _write(tmp_path, old)
+    new = old[:1] + [{'start': 2.25, 'end': 2.75, 'text': "שורה חדשה"}] + old[1:]
+
+    result = replace_subtitles(srt_path, new)
+
+    assert result["changed"] == 1
+    assert result["version"] == 1
+    for name in ("ass", "tts", "render"):
+        assert result["stale"][name] == [[2.25, 2.75]]
+    assert load_edit_state(srt_path)["log"][-1]["changes"][0]["op"] == "insert"
+    assert _saved(srt_path) == [(e['start'], e['end'], e['text']) for e in new]
+
+
+def test_mixed_edits_touch_only_changed_lines(tmp_path):
+    old = _lines(10)
+    srt_path = _write(tmp_path, old)
+    new = [dict(e) for e in old]
+    del new[7]
+    new[4]['text'] = "שורה ארבע מתוקנת"
+    del new[2]
+    new.insert(0, {'start': 0.0, 'end': 1.5, 'text': "פתיחה"})
+    new[1]['start'] = 1.6
+
+    result = replace_subtitles(srt_path, new)
+
+    assert result["changed"] == 5
+    assert result["stale"]["render"] == [[0.0, 2.0], [6.0, 8.0], [12.0, 14.0], [21.0, 23.0]]
+    assert _saved(srt_path) == [(e['start'], e['end'], e['text']) for e in new]
+
+
+def test_unchanged_save_keeps_version(tmp_path):
+    old = _lines(5)
+    srt_path = _write(tmp_path, old)
+
+    result = replace_subtitles(srt_path, [dict(e) for e in old])
+
+    assert result["changed"] == 0
+    assert result["version"] == 0
+    assert result["stale"]["tts"] == []
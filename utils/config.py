@@ -52,6 +52,12 @@ YOUTUBE_REFRESH_TOKEN = os.getenv("YOUTUBE_REFRESH_TOKEN", "")
 ELEVENLABS_VOICE_ID = os.getenv("DEFAULT_VOICE_ID", "1sl7XMHkUEezwYy9NbJU")
 ELEVENLABS_MODEL = "eleven_multilingual_v2"
 
+# Streaming synthesis: long texts are split at sentence boundaries into chunks
+# of at most this many characters and synthesized in parallel
+ELEVENLABS_CHUNK_CHARS = 1000
+ELEVENLABS_MAX_PARALLEL = 3  # Concurrent requests allowed by the ElevenLabs plan
+ELEVENLABS_STREAM_CHUNK_BYTES = 4096
+
 # Emotion presets for ElevenLabs voice settings
 ELEVENLABS_EMOTION_SETTINGS = {
     'emotional': {
@@ -85,6 +91,10 @@ ELEVENLABS_EMOTION_SETTINGS = {
 # =============================================================================
 EDGE_TTS_VOICE = "he-IL-AvriNeural"
 EDGE_TTS_RATE = "-5%"
+VOICEOVER_TTS_CONCURRENCY = 4  # Parallel Edge-TTS segment requests per voiceover job
+# Synthesized segments shared by all jobs (keyed by text, voice and slot), LRU-bounded
+VOICEOVER_CACHE_DIR = BASE_DIR / "cache" / "voiceover"
+VOICEOVER_CACHE_MAX_BYTES = 512 * 1024 * 1024
 
 # =============================================================================
 # Video Processing Configuration
@@ -100,20 +110,151 @@ MUSIC_STYLE_KEYWORDS = {
     'spiritual': ['spiritual', 'emotional', 'gentle', 'piano', 'nature', 'meditation']
 }
 
+# Music ducking: music drops to DUCKING_DEPTH x its volume while speech is active
+DUCKING_DEPTH = 0.4
+DUCKING_ATTACK_SECONDS = 0.3
+DUCKING_RELEASE_SECONDS = 0.8
+DUCKING_MAX_INTERVALS = 64  # Caps the size of the compiled volume expression
+
+# Music loudness normalization: tracks are analyzed once and mixed at a precomputed gain
+MUSIC_ANALYSIS_INDEX = BASE_DIR / "music_analysis.json"  # Outside MUSIC_DIR so writes keep its mtime stable
+MUSIC_TARGET_LUFS = -16.0
+MUSIC_PEAK_CEILING_DB = -1.0  # Gain never pushes the true peak above this
+MUSIC_MAX_GAIN_DB = 12.0
+
+# Final render: long videos are encoded as keyframe-aligned segments cached by
+# source range, subtitle events, style and encoder settings - re-renders only
+# re-encode the segments an edit touched
+RENDER_VIDEO_CODEC_ARGS = ['-c:v', 'libx264', '-preset', 'ultrafast']
+RENDER_CACHE_ENABLED = True
+RENDER_CACHE_DIR = BASE_DIR / "cache" / "render"
+RENDER_CACHE_MAX_BYTES = 5 * 1024 * 1024 * 1024
+RENDER_SEGMENT_SECONDS = 10.0
+RENDER_SEGMENT_MIN_VIDEO_SECONDS = 60.0  # Shorter videos render in a single pass
+RENDER_SEGMENT_WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Resumable chunked uploads (unfinished ones live in inputs/partial)
+UPLOADS_PARTIAL_DIR = INPUTS_DIR / "partial"
+UPLOAD_MAX_BYTES = 8 * 1024 * 1024 * 1024
+UPLOAD_PROBE_BYTES = 8 * 1024 * 1024  # Probe the partial file once this much has arrived
+UPLOAD_WRITE_BUFFER_BYTES = 1024 * 1024
+UPLOAD_EXPIRE_SECONDS = 24 * 3600  # Unfinished uploads untouched this long are deleted
+UPLOAD_WAIT_TIMEOUT_SECONDS = 6 * 3600  # A job queued on an upload gives up after this
+UPLOAD_STALL_SECONDS = 15 * 60  # ...or once no bytes have arrived for this long (client gone)
+
+# Input normalization: VFR, heavy-codec (HEVC/VP9/AV1/ProRes), 10-bit or oversized
+# uploads are transcoded once to a CFR H.264 mezzanine that all later stages read
+NORMALIZE_INPUTS = os.getenv("NORMALIZE_INPUTS", "1").lower() in ("1", "true", "yes")
+NORMALIZE_DIR = OUTPUTS_DIR / "normalized"
+NORMALIZE_MAX_SHORT_SIDE = 1080  # 4K phone footage -> 1080p (1920x1080 / 1080x1920)
+NORMALIZE_MAX_FPS = 60
+NORMALIZE_HEAVY_CODECS = ("hevc", "vp9", "av1", "prores")
+NORMALIZE_VFR_TOLERANCE = 0.01  # Nominal vs average frame rate difference that counts as VFR
+NORMALIZE_CRF = 18
+
+# Analysis proxy: encoded once per upload and decoded by every analysis and
+# preview stage (OCR, Gemini preview, thumbnails, style previews, review player)
+PROXY_DIR = OUTPUTS_DIR / "proxies"
+PROXY_HEIGHT = 540
+PROXY_GOP_FRAMES = 15  # Short GOP - seeks decode at most this many frames
+PROXY_CRF = 28
+
+# Single-frame subtitle style previews (served from /outputs/previews)
+STYLE_PREVIEW_DIR = OUTPUTS_DIR / "previews"
+STYLE_PREVIEW_MAX_HEIGHT = 720
+STYLE_PREVIEW_MAX_FILES = 300
+STYLE_PREVIEW_SAMPLE_TEXT = "כך ייראו הכתוביות"
+
 # =============================================================================
 # Tesseract OCR Configuration
 # =============================================================================
 TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
+# Frame OCR: only the subtitle band of sampled frames is read, unchanged bands are skipped
+OCR_SAMPLE_INTERVAL_SECONDS = 2.0
+OCR_BAND_TOP_RATIO = 0.75  # Subtitle band = bottom 25% of the frame
+OCR_BAND_DIFF_THRESHOLD = 0.03  # Fraction of band text-mask thumbnail cells that must change to OCR again
+OCR_SEEK_MIN_GAP_FRAMES = 90  # Wider gaps between samples seek instead of grabbing every frame
+OCR_MAX_WORKERS = max(1, (os.cpu_count() or 2) - 1)
+SUBTITLE_BAND_DETECT_SAMPLES = 12  # Frames averaged to locate the subtitle strip
+
+# Gemini subtitle extraction uploads a preview: "band" (subtitle strip only),
+# "band_changes" (strip, only frames where it changes) or "full" (whole frame)
+GEMINI_OCR_PREVIEW_MODE = "band"
+GEMINI_OCR_PREVIEW_WIDTH = 854
+GEMINI_OCR_PREVIEW_FPS = 4
+
 # =============================================================================
 # Subtitle Configuration
 # =============================================================================
 SRT_MIN_GAP_SECONDS = 0.3  # Minimum gap between subtitles
 SRT_SIMILARITY_THRESHOLD = 0.85  # Threshold for merging similar subtitles
 
+# AI subtitle correction works on windows of text lines (no timestamps)
+SUBTITLE_FIX_WINDOW_LINES = 40
+SUBTITLE_FIX_WINDOW_OVERLAP = 4  # Read-only context lines on each side of a window
+SUBTITLE_FIX_MAX_PARALLEL = 4
+
+# Deterministic pre-correction: glossary of known misspellings (merged with built-ins)
+GLOSSARY_PATH = BASE_DIR / "glossary.json"
+# Whisper segment stats that mark a subtitle line as uncertain
+ASR_MIN_AVG_LOGPROB = -0.7
+ASR_MAX_COMPRESSION_RATIO = 2.4
+ASR_MAX_NO_SPEECH_PROB = 0.6
+# Skip the Gemini correction pass when at most this fraction of lines is uncertain
+SUBTITLE_AI_SKIP_MAX_UNCERTAIN_RATIO = 0.02
+
+# Line-level subtitle edits: entries kept in each SRT's change log
+SUBTITLE_EDIT_LOG_MAX = 200
+
+# Combined post-transcript analysis (correction + marketing + voiceover text in one
+# Gemini call) - longer transcripts fall back to the separate passes
+COMBINED_ANALYSIS_MAX_LINES = 300
+
+# Marketing kit: longer transcripts are summarized per chunk concurrently (map-reduce).
+# Map calls run on Gemini when configured, otherwise on Groq, paced by the LLM
+# scheduler. Every chunk is mapped unless MARKETING_MAP_GROQ_MAX_CHUNKS is set,
+# which caps a Groq-only map to that many evenly spaced chunks (0 = no cap)
+MARKETING_MAP_CHUNK_CHARS = 4000
+MARKETING_MAP_MAX_PARALLEL = 4
+MARKETING_MAP_GROQ_MAX_CHUNKS = int(os.getenv("MARKETING_MAP_GROQ_MAX_CHUNKS", "0"))
+
+# =============================================================================
+# Server
+# =============================================================================
+EVENT_LOOP_BLOCK_WARN_MS = 250  # Watchdog logs any event loop stall longer than this
+
+# =============================================================================
+# LLM Clients
+# =============================================================================
+LLM_HTTP_MAX_CONNECTIONS = 20  # Keep-alive pool per provider client
+LLM_HTTP_TIMEOUT_SECONDS = 120.0
+
+# Outbound AI call scheduling - limits of the account tier per provider
+LLM_RATE_LIMITS = {
+    'groq': {'rpm': 30, 'tpm': 12000},
+    'groq-asr': {'rpm': 20},  # Whisper transcription
+    'gemini': {'rpm': 60, 'tpm': 1000000},
+    'default': {'rpm': 30},
+}
+LLM_MAX_RETRIES = 4
+LLM_BACKOFF_BASE_SECONDS = 1.0
+LLM_BACKOFF_MAX_SECONDS = 30.0
+LLM_HEDGE_AFTER_SECONDS = 8.0  # Short chat calls that pass hedge=True; None disables hedging
+LLM_QUEUE_TIMEOUT_SECONDS = 120.0
+LLM_SCHEDULER_MAX_WORKERS = 16
+
+# =============================================================================
+# LLM Response Cache
+# =============================================================================
+LLM_CACHE_DIR = BASE_DIR / "cache" / "llm"
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 3600  # Non-deterministic responses only
+LLM_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
 # =============================================================================
 # Green API (WhatsApp Integration)
 # =============================================================================
 GREEN_API_INSTANCE_ID = os.getenv("GREEN_API_INSTANCE_ID", "")
 GREEN_API_TOKEN = os.getenv("GREEN_API_TOKEN", "")
 SERVER_BASE_URL = os.getenv("SERVER_BASE_URL", "http://localhost:8000")
+WHATSAPP_REVIEW_CHUNK_SECONDS = 180  # Subtitle review is sent as one message per this much video
@@ -0,0 +1,178 @@
+"""
+Deterministic glossary pre-correction for transcripts.
+
+Whisper misspells the same religious and domain terms in the same ways, so a
+fixed table of {misspelling: correct form} fixes most of them without an LLM.
+All misspellings are matched in a single pass with an Aho-Corasick automaton,
+so the cost does not grow with the size of the glossary.
+
+The built-in table can be extended (or entries overridden) with a JSON file at
+GLOSSARY_PATH: {"corrections": {"misspelling": "correct form", ...}}
+"""
+import json
+import os
+import re
+import threading
+from collections import deque
+from typing import Dict, List, Optional, Tuple
+
+from utils.config import GLOSSARY_PATH
+
+# Known Whisper spellings -> the form used in our subtitles
+DEFAULT_GLOSSARY: Dict[str, str] = {
+    "הקבה": 'הקב"ה',
+    "הקב''ה": 'הקב"ה',
+    "חזל": 'חז"ל',
+    "חז''ל": 'חז"ל',
+    "רשי": 'רש"י',
+    "רש''י": 'רש"י',
+    "רמבם": 'רמב"ם',
+    "רמב''ם": 'רמב"ם',
+    "תנך": 'תנ"ך',
+    "תנ''ך": 'תנ"ך',
+    "זצל": 'זצ"ל',
+    "זצ''ל": 'זצ"ל',
+    "שליטא": 'שליט"א',
+    "שליט''א": 'שליט"א',
+    "זיעא": 'זיע"א',
+    "זיע''א": 'זיע"א',
+    "ב''ה": 'ב"ה',
+}
+
+# Single-letter prefixes that attach to Hebrew words (ו, ה, ב, ל, מ, ש, כ).
+# Short patterns only match whole words - "רשי" must not fire inside "ושרשי".
+HEBREW_PREFIXES = set("והבלמשכ")
+MAX_PREFIX_LETTERS = 3
+MIN_PREFIXED_PATTERN_LENGTH = 4
+
+# An immediately repeated word or phrase of up to 3 words ("אני אני", "כי אם כי אם");
+# words may contain gershayim ('הקב"ה')
+_REPEATED_PHRASE = re.compile(r'(?<![\w"\'])([\w"\']+(?:\s+[\w"\']+){0,2})(?:\s+\1)+(?![\w"\'])')
+
+
+class GlossaryMatcher:
+    """Aho-Corasick automaton over the glossary misspellings."""
+
+    def __init__(self, corrections: Dict[str, str]):
+        self.corrections = {k: v for k, v in corrections.items() if k and k != v}
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[str]] = [[]]
+
+        for pattern in self.corrections:
+            state = 0
+            for char in pattern:
+                if char not in self._goto[state]:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[state][char] = len(self._goto) - 1
+                state = self._goto[state][char]
+            self._out[state].append(pattern)
+
+        # Breadth-first construction of failure links
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, child in self._goto[state].items():
+                queue.append(child)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[child] = self._goto[fallback].get(char, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def find(self, text: str) -> List[Tuple[int, int, str]]:
+        """All (start, end, pattern) occurrences, in order of their end position."""
+        matches = []
+        state = 0
+        for i, char in enumerate(text):
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            for pattern in self._out[state]:
+                matches.append((i + 1 - len(pattern), i + 1, pattern))
+        return matches
+
+    @staticmethod
+    def _is_word_start(text: str, start: int, pattern: str) -> bool:
+        """True at a word boundary, or after up to MAX_PREFIX_LETTERS Hebrew prefix letters."""
+        allow_prefix = len(pattern) >= MIN_PREFIXED_PATTERN_LENGTH
+        i = start
+        while i > 0 and text[i - 1].isalnum():
+            if not allow_prefix or start - i >= MAX_PREFIX_LETTERS or text[i - 1] not in HEBREW_PREFIXES:
+                return False
+            i -= 1
+        return True
+
+    def replace(self, text: str) -> Tuple[str, int]:
+        """Replace whole-word misspellings (leftmost-longest). Returns (text, count)."""
+        candidates = [
+            (start, end, pattern) for start, end, pattern in self.find(text)
+            if (end == len(text) or not text[end].isalnum()) and self._is_word_start(text, start, pattern)
+        ]
+        if not candidates:
+            return text, 0
+
+        candidates.sort(key=lambda m: (m[0], -(m[1] - m[0])))
+        parts, position, count = [], 0, 0
+        for start, end, pattern in candidates:
+            if start < position:
+                continue
+            parts.append(text[position:start])
+            parts.append(self.corrections[pattern])
+            position = end
+            count += 1
+        parts.append(text[position:])
+        return ''.join(parts), count
+
+
+def remove_repeated_words(text: str) -> Tuple[str, int]:
+    """Collapse immediately repeated words or short phrases. Returns (text, count)."""
+    count = 0
+
+    def _collapse(match):
+        nonlocal count
+        count += 1
+        return match.group(1)
+
+    return _REPEATED_PHRASE.sub(_collapse, text), count
+
+
+_matcher: Optional[GlossaryMatcher] = None
+_matcher_mtime: Optional[float] = None
+_matcher_lock = threading.Lock()
+
+
+def load_glossary() -> Dict[str, str]:
+    """Built-in corrections merged with the user glossary file (file wins)."""
+    corrections = dict(DEFAULT_GLOSSARY)
+    if os.path.exists(GLOSSARY_PATH):
+        try:
+            with open(GLOSSARY_PATH, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            for wrong, right in (data.get("corrections") or {}).items():
+                if isinstance(wrong, str) and isinstance(right, str):
+                    corrections[wrong.strip()] = right.strip()
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[WARNING] Could not load glossary {GLOSSARY_PATH}: {e}")
+    return corrections
+
+
+def get_glossary_matcher() -> GlossaryMatcher:
+    """Shared matcher, rebuilt when the glossary file changes."""
+    global _matcher, _matcher_mtime
+    mtime = os.path.getmtime(GLOSSARY_PATH) if os.path.exists(GLOSSARY_PATH) else None
+    if _matcher is None or mtime != _matcher_mtime:
+        with _matcher_lock:
+            if _matcher is None or mtime != _matcher_mtime:
+                _matcher = GlossaryMatcher(load_glossary())
+                _matcher_mtime = mtime
+    return _matcher
+
+
+def apply_glossary(text: str) -> Tuple[str, int]:
+    """Glossary fixes plus repeated-word removal for one line. Returns (text, fixes)."""
+    text, glossary_fixes = get_glossary_matcher().replace(text)
+    text, repeat_fixes = remove_repeated_words(text)
+    return text, glossary_fixes + repeat_fixes
@@ -292,44 +292,50 @@ def parse_srt(srt_text):
     Parses SRT format text into a list of dictionaries for the UI.
     Each entry contains index, time range, and content.
     """
-    import re
-    entries = []
+    from utils.subtitles import SubtitleTrack
     if not srt_text:
-        return entries
-
-    # Clean up common Gemini artifacts
-    clean_text = srt_text.replace('```srt', '').replace('```', '').strip()
-    
-    # Split by double newlines to get individual subtitle blocks
-    blocks = re.split(r'\n\s*\n', clean_text)
-    
-    for block in blocks:
-        lines = [line.strip() for line in block.split('\n') if line.strip()]
-        if len(lines) >= 3:
-            entries.append({
-                "index": lines[0],
-                "time": lines[1],
-                "content": " ".join(lines[2:])
-            })
-            
-    return entries
-
-def create_preview_video(video_path, width=1280, fps=8, crf=20):
+        return []
+
+    return [
+        {
+            "index": str(cue.index),
+            "time": f"{format_srt_time(cue.start)} --> {format_srt_time(cue.end)}",
+            "content": cue.text
+        }
+        for cue in SubtitleTrack.from_srt(srt_text)
+    ]
+
+def create_preview_video(video_path, width=1280, fps=8, crf=20, band=None, changes_only=False):
     """
     Creates a temporary preview video for Gemini OCR.
+
+    band: optional (top, bottom) pixel rows - only that strip is encoded.
+    changes_only: drop frames identical to the previous one (mpdecimate); the
+                  remaining frames keep their original timestamps.
     """
     import subprocess
+    import uuid
     from pathlib import Path
-    
-    output_path = Path(video_path).parent / f"preview_{Path(video_path).name}"
-    
-    cmd = [
-        'ffmpeg', '-y', '-i', video_path,
-        '-vf', f'scale={width}:-2,fps={fps}',
+
+    # Per-job name so concurrent extractions of the same input never collide
+    output_path = Path(video_path).parent / f"preview_{uuid.uuid4().hex[:8]}_{Path(video_path).stem}.mp4"
+
+    filters = []
+    if band:
+        top, bottom = band
+        filters.append(f'crop=iw:{bottom - top}:0:{top}')
+    filters.append(f"scale='min({width},iw)':-2,fps={fps}")  # Never upscale (proxy input)
+    if changes_only:
+        filters.append('mpdecimate')
+
+    cmd = ['ffmpeg', '-y', '-i', str(video_path), '-vf', ','.join(filters)]
+    if changes_only:
+        cmd += ['-vsync', 'vfr']  # Keep the surviving frames at their original times
+    cmd += [
         '-c:v', 'libx264', '-crf', str(crf),
         '-preset', 'veryfast', '-an',
         str(output_path)
     ]
-    
+
     subprocess.run(cmd, check=True, capture_output=True)
     return str(output_path)
@@ -0,0 +1,208 @@
+"""
+Disk-backed cache for LLM responses (Gemini and Groq).
+
+Entries are keyed by model, temperature and a hash of the normalized prompt.
+Deterministic calls (temperature 0 or correction passes) never expire; other
+calls expire after LLM_CACHE_TTL_SECONDS. The cache directory is bounded by
+LLM_CACHE_MAX_BYTES, evicting the least recently used entries first.
+"""
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+from utils.config import LLM_CACHE_DIR, LLM_CACHE_TTL_SECONDS, LLM_CACHE_MAX_BYTES
+from utils.llm_scheduler import PRIORITY_BATCH, run_llm_call, estimate_tokens
+
+# Set LLM_CACHE_DISABLED=1 to bypass the cache process-wide
+LLM_CACHE_DISABLED = os.getenv("LLM_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+llm_cache_stats: Dict[str, int] = {
+    "hits": 0,
+    "misses": 0,
+    "stores": 0,
+    "evictions": 0,
+}
+
+_cache_lock = threading.Lock()
+_cache_size_bytes: Optional[int] = None
+
+
+def normalize_prompt(prompt) -> str:
+    """
+    Normalize a prompt so cosmetic differences do not split the cache.
+    Accepts a string or any JSON-serializable structure (chat messages, history).
+    """
+    if not isinstance(prompt, str):
+        prompt = json.dumps(prompt, ensure_ascii=False, sort_keys=True)
+    prompt = prompt.replace('\r\n', '\n').replace('\r', '\n')
+    prompt = '\n'.join(line.rstrip() for line in prompt.split('\n'))
+    prompt = re.sub(r'\n{3,}', '\n\n', prompt)
+    return prompt.strip()
+
+
+def make_cache_key(model: str, temperature: Optional[float], prompt) -> str:
+    """Hash of model, temperature and normalized prompt."""
+    raw = f"{model}\x00{temperature}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+
+def _entry_path(key: str) -> str:
+    return os.path.join(str(LLM_CACHE_DIR), f"{key}.json")
+
+
+def _current_size() -> int:
+    """Total bytes in the cache directory (scanned once, then tracked)."""
+    global _cache_size_bytes
+    if _cache_size_bytes is None:
+        total = 0
+        if os.path.isdir(LLM_CACHE_DIR):
+            with os.scandir(LLM_CACHE_DIR) as it:
+                for entry in it:
+                    if entry.is_file() and entry.name.endswith('.json'):
+                        total += entry.stat().st_size
+        _cache_size_bytes = total
+    return _cache_size_bytes
+
+
+def _evict_if_needed():
+    """Drop least recently used entries until the cache is under 90% of its budget."""
+    global _cache_size_bytes
+    if _current_size() <= LLM_CACHE_MAX_BYTES:
+        return
+
+    with os.scandir(LLM_CACHE_DIR) as it:
+        files = [
+            (entry.stat().st_mtime, entry.stat().st_size, entry.path)
+            for entry in it if entry.is_file() and entry.name.endswith('.json')
+        ]
+    files.sort()
+
+    target = int(LLM_CACHE_MAX_BYTES * 0.9)
+    for _, size, path in files:
+        if _cache_size_bytes <= target:
+            break
+        try:
+            os.remove(path)
+            _cache_size_bytes -= size
+            llm_cache_stats["evictions"] += 1
+        except OSError:
+            pass
+
+
+def cache_get(key: str) -> Optional[str]:
+    """Return a cached response, or None if missing or expired."""
+    global _cache_size_bytes
+    path = _entry_path(key)
+    with _cache_lock:
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        expires_at = entry.get("expires_at")
+        if expires_at is not None and expires_at < time.time():
+            try:
+                size = os.path.getsize(path)
+                os.remove(path)
+                if _cache_size_bytes is not None:
+                    _cache_size_bytes -= size
+            except OSError:
+                pass
+            return None
+
+        # Touch for LRU eviction
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return entry.get("response")
+
+
+def cache_put(key: str, model: str, response: str, ttl: Optional[float]):
+    """Store a response. ttl=None means the entry never expires."""
+    global _cache_size_bytes
+    entry = {
+        "model": model,
+        "created_at": time.time(),
+        "expires_at": time.time() + ttl if ttl is not None else None,
+        "response": response,
+    }
+    path = _entry_path(key)
+    with _cache_lock:
+        try:
+            os.makedirs(LLM_CACHE_DIR, exist_ok=True)
+            size = _current_size()
+            old_size = os.path.getsize(path) if os.path.exists(path) else 0
+            tmp_path = path + '.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+            _cache_size_bytes = size - old_size + os.path.getsize(path)
+            llm_cache_stats["stores"] += 1
+            _evict_if_needed()
+        except OSError as e:
+            print(f"[WARNING] Could not write LLM cache entry: {e}")
+
+
+def cached_completion(
+    model: str,
+    prompt,
+    call: Callable[[], Optional[str]],
+    temperature: Optional[float] = None,
+    deterministic: bool = False,
+    bypass: bool = False,
+    priority: int = PRIORITY_BATCH,
+    max_output_tokens: int = 0
+) -> Optional[str]:
+    """
+    Return the response text for `prompt`, calling the provider only on a miss.
+    Misses go through the rate-limit scheduler under the model's provider.
+
+    Args:
+        model: Provider-qualified model name, e.g. 'groq/...' (part of the key)
+        prompt: Prompt string or structure (messages, history) - part of the key
+        call: Performs the real request and returns the response text
+        temperature: Sampling temperature (part of the key; 0 never expires)
+        deterministic: Correction passes - cache without expiry at any temperature
+        bypass: Skip the lookup and refresh the stored entry
+        priority: Scheduler priority class
+        max_output_tokens: Output budget, for the provider's TPM bucket
+    """
+    key = make_cache_key(model, temperature, prompt)
+
+    if not LLM_CACHE_DISABLED and not bypass:
+        cached = cache_get(key)
+        if cached is not None:
+            llm_cache_stats["hits"] += 1
+            return cached
+
+    llm_cache_stats["misses"] += 1
+    provider = model.split('/', 1)[0]
+    response = run_llm_call(
+        provider, call, priority=priority,
+        estimated_tokens=estimate_tokens(prompt, max_output_tokens)
+    )
+
+    if response and not LLM_CACHE_DISABLED:
+        ttl = None if deterministic or temperature == 0 else LLM_CACHE_TTL_SECONDS
+        cache_put(key, model, response, ttl)
+
+    return response
+
+
+def get_llm_cache_stats() -> Dict:
+    """Hit/miss counters and current cache size."""
+    with _cache_lock:
+        size = _current_size()
+    lookups = llm_cache_stats["hits"] + llm_cache_stats["misses"]
+    return {
+        **llm_cache_stats,
+        "hit_rate": round(llm_cache_stats["hits"] / lookups, 3) if lookups else 0.0,
+        "size_bytes": size,
+        "enabled": not LLM_CACHE_DISABLED,
+    }
@@ -0,0 +1,111 @@
+"""
+Process-wide LLM provider registry.
+
+Groq clients and Gemini models are created once and shared by every caller, so
+requests reuse pooled keep-alive connections instead of paying client setup
+and a TLS handshake per call. SSL handling is configured once at startup by
+utils.helpers.setup_ssl_bypass - callers must not re-patch it.
+"""
+import threading
+from typing import Dict, Optional, Tuple
+
+from utils.config import (
+    GROQ_API_KEY,
+    GEMINI_API_KEY,
+    LLM_HTTP_MAX_CONNECTIONS,
+    LLM_HTTP_TIMEOUT_SECONDS
+)
+
+_registry_lock = threading.Lock()
+_groq_client = None
+_genai_client = None
+_gemini_configured = False
+_gemini_models: Dict[Tuple[str, Optional[str]], object] = {}
+
+
+def _pooled_httpx_client(verify: bool = True):
+    """httpx client with a bounded keep-alive pool (verify=False only where the old client had it)."""
+    import httpx
+    return httpx.Client(
+        verify=verify,
+        timeout=httpx.Timeout(LLM_HTTP_TIMEOUT_SECONDS, connect=10.0),
+        limits=httpx.Limits(
+            max_connections=LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=LLM_HTTP_MAX_CONNECTIONS
+        )
+    )
+
+
+def get_groq_client():
+    """Shared Groq client (chat + whisper transcription)."""
+    global _groq_client
+    if _groq_client is None:
+        with _registry_lock:
+            if _groq_client is None:
+                from groq import Groq
+                # Retries are owned by utils.llm_scheduler (shared backoff across jobs)
+                _groq_client = Groq(api_key=GROQ_API_KEY, http_client=_pooled_httpx_client(), max_retries=0)
+    return _groq_client
+
+
+def get_gemini():
+    """The google.generativeai module, configured once for REST transport."""
+    global _gemini_configured
+    import google.generativeai as genai
+    if not _gemini_configured:
+        with _registry_lock:
+            if not _gemini_configured:
+                # REST instead of gRPC - far more tolerant of SSL interception
+                genai.configure(api_key=GEMINI_API_KEY, transport='rest')
+                _gemini_configured = True
+    return genai
+
+
+def get_gemini_model(model_name: str, system_instruction: Optional[str] = None):
+    """Shared GenerativeModel per (model, system instruction)."""
+    key = (model_name, system_instruction)
+    model = _gemini_models.get(key)
+    if model is None:
+        genai = get_gemini()
+        with _registry_lock:
+            model = _gemini_models.get(key)
+            if model is None:
+                model = genai.GenerativeModel(model_name=model_name, system_instruction=system_instruction)
+                _gemini_models[key] = model
+    return model
+
+
+def get_genai_client():
+    """Shared google-genai Client (image generation)."""
+    global _genai_client
+    if _genai_client is None:
+        with _registry_lock:
+            if _genai_client is None:
+                from google import genai
+                _genai_client = genai.Client(
+                    api_key=GEMINI_API_KEY,
+                    http_options={"httpx_client": _pooled_httpx_client(verify=False)}
+                )
+    return _genai_client
+
+
+def warm_llm_clients():
+    """
+    Create all clients and open a Groq connection in the background, so the
+    first real request does not pay for imports, setup or the TLS handshake.
+    """
+    def _warm():
+        if GROQ_API_KEY:
+            try:
+                get_groq_client().models.list()
+                print("[LLM] Groq client warmed")
+            except Exception as e:
+                print(f"[LLM WARNING] Could not warm Groq client: {e}")
+        try:
+            get_gemini_model('gemini-2.0-flash')
+            get_gemini_model('models/gemini-2.5-flash')
+            print("[LLM] Gemini models ready")
+        except Exception as e:
+            print(f"[LLM WARNING] Could not prepare Gemini models: {e}")
+
+    threading.Thread(target=_warm, daemon=True).start()
@@ -0,0 +1,287 @@
+"""
+Rate-limit-aware scheduler for outbound AI calls (Groq, Gemini).
+
+Every call passes through a per-provider limiter holding two token buckets
+(requests and tokens per minute). Waiters are served by priority class, so an
+interactive chat message never queues behind a batch of correction windows.
+429s and transient errors are retried with exponential backoff and full jitter,
+and a 429 pauses the whole provider so concurrent jobs back off together.
+Short interactive calls can opt into hedging: if the first attempt is slow, a
+second one is started and whichever finishes first wins.
+
+Load-test offline with utils/llm_stub_server.py.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, Optional, TypeVar
+
+from utils.config import (
+    LLM_RATE_LIMITS,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE_SECONDS,
+    LLM_BACKOFF_MAX_SECONDS,
+    LLM_HEDGE_AFTER_SECONDS,
+    LLM_QUEUE_TIMEOUT_SECONDS,
+    LLM_SCHEDULER_MAX_WORKERS
+)
+
+T = TypeVar('T')
+
+# Priority classes - lower is served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BATCH = 1
+
+
+class RateLimitTimeout(Exception):
+    """Raised when a call waits longer than LLM_QUEUE_TIMEOUT_SECONDS for capacity."""
+
+
+class TokenBucket:
+    """Classic token bucket refilled continuously at `per_minute / 60` per second."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst or per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def time_until(self, amount: float, now: float) -> float:
+        """Seconds until `amount` tokens are available (amount is capped at capacity)."""
+        self._refill(now)
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def take(self, amount: float):
+        self.tokens -= min(amount, self.capacity)
+
+    def drain(self):
+        self.tokens = 0.0
+
+
+class ProviderLimiter:
+    """Request and token buckets for one provider, with a priority-ordered wait queue."""
+
+    def __init__(self, name: str, rpm: float, tpm: Optional[float] = None):
+        self.name = name
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm) if tpm else None
+        self.paused_until = 0.0
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.stats = {"calls": 0, "throttled": 0, "wait_seconds": 0.0,
+                      "retries": 0, "rate_limited": 0, "hedges": 0, "failures": 0}
+
+    def _time_until_ready(self, tokens: int) -> float:
+        now = time.monotonic()
+        wait_for = max(self.paused_until - now, self.requests.time_until(1, now))
+        if self.tokens:
+            wait_for = max(wait_for, self.tokens.time_until(tokens, now))
+        return wait_for
+
+    def acquire(self, priority: int, tokens: int, timeout: float) -> float:
+        """Block until this call may be sent. Returns the seconds spent waiting."""
+        started = time.monotonic()
+        deadline = started + timeout
+
+        with self._cond:
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            self._cond.notify_all()  # A higher-priority arrival displaces the current head
+            try:
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise RateLimitTimeout(f"{self.name}: no capacity within {timeout:.0f}s")
+
+                    if self._waiters[0] != ticket:
+                        self._cond.wait(remaining)
+                        continue
+
+                    wait_for = self._time_until_ready(tokens)
+                    if wait_for <= 0:
+                        self.requests.take(1)
+                        if self.tokens:
+                            self.tokens.take(tokens)
+                        waited = time.monotonic() - started
+                        self.stats["calls"] += 1
+                        if waited > 0.01:
+                            self.stats["throttled"] += 1
+                            self.stats["wait_seconds"] += waited
+                        return waited
+
+                    self._cond.wait(min(wait_for, remaining))
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def pause(self, seconds: float):
+        """Stop sending for `seconds` after the provider reported a rate limit."""
+        with self._cond:
+            self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+            self.requests.drain()
+            self._cond.notify_all()
+
+
+_limiters: Dict[str, ProviderLimiter] = {}
+_limiters_lock = threading.Lock()
+_hedge_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_limiter(provider: str) -> ProviderLimiter:
+    """Limiter for a provider key from LLM_RATE_LIMITS (unknown keys share 'default')."""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limits = LLM_RATE_LIMITS.get(provider) or LLM_RATE_LIMITS['default']
+                limiter = ProviderLimiter(provider, limits['rpm'], limits.get('tpm'))
+                _limiters[provider] = limiter
+    return limiter
+
+
+def estimate_tokens(prompt, max_output_tokens: int = 0) -> int:
+    """Rough token estimate for bucket accounting (Hebrew runs ~3 chars per token)."""
+    return len(str(prompt)) // 3 + max_output_tokens
+
+
+def _status_code(error: Exception) -> Optional[int]:
+    for attr in ('status_code', 'code'):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, 'response', None)
+    value = getattr(response, 'status_code', None)
+    return value if isinstance(value, int) else None
+
+
+def _is_rate_limited(error: Exception) -> bool:
+    if _status_code(error) == 429:
+        return True
+    message = str(error).lower()
+    return any(s in message for s in ('429', 'rate limit', 'rate_limit', 'resource exhausted',
+                                      'resource_exhausted', 'quota'))
+
+
+def _is_retryable(error: Exception) -> bool:
+    if _is_rate_limited(error):
+        return True
+    status = _status_code(error)
+    if status in (500, 502, 503, 504):
+        return True
+    name = type(error).__name__.lower()
+    return 'timeout' in name or 'connection' in name or 'unavailable' in name
+
+
+def _retry_after(error: Exception) -> Optional[float]:
+    """Seconds from a Retry-After header, if the provider sent one."""
+    headers = getattr(error, 'headers', None) or getattr(getattr(error, 'response', None), 'headers', None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+
+def _call_with_retries(limiter: ProviderLimiter, call: Callable[[], T],
+                       priority: int, tokens: int) -> T:
+    """Acquire capacity, run the call, and retry transient failures with backoff."""
+    attempt = 0
+    while True:
+        limiter.acquire(priority, tokens, LLM_QUEUE_TIMEOUT_SECONDS)
+        try:
+            return call()
+        except Exception as e:
+            if attempt >= LLM_MAX_RETRIES or not _is_retryable(e):
+                limiter.stats["failures"] += 1
+                raise
+
+            # Exponential backoff with full jitter
+            delay = random.uniform(0, min(LLM_BACKOFF_MAX_SECONDS, LLM_BACKOFF_BASE_SECONDS * 2 ** attempt))
+            if _is_rate_limited(e):
+                limiter.stats["rate_limited"] += 1
+                delay = max(delay, _retry_after(e) or 0)
+                limiter.pause(delay)
+
+            attempt += 1
+            limiter.stats["retries"] += 1
+            print(f"[LLM] {limiter.name} call failed ({e.__class__.__name__}), "
+                  f"retry {attempt}/{LLM_MAX_RETRIES} in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def _get_hedge_executor() -> ThreadPoolExecutor:
+    global _hedge_executor
+    if _hedge_executor is None:
+        with _limiters_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=LLM_SCHEDULER_MAX_WORKERS,
+                                                     thread_name_prefix="llm-hedge")
+    return _hedge_executor
+
+
+def _hedged(limiter: ProviderLimiter, call: Callable[[], T],
+            priority: int, tokens: int, hedge_after: float) -> T:
+    """Start a second attempt if the first has not finished after `hedge_after` seconds."""
+    executor = _get_hedge_executor()
+    pending = {executor.submit(_call_with_retries, limiter, call, priority, tokens)}
+
+    done, pending = wait(pending, timeout=hedge_after)
+    if not done:
+        limiter.stats["hedges"] += 1
+        pending.add(executor.submit(_call_with_retries, limiter, call, priority, tokens))
+
+    first_error = None
+    while True:
+        for future in done:
+            if future.exception() is None:
+                return future.result()
+            first_error = first_error or future.exception()
+        if not pending:
+            raise first_error
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+
+
+def run_llm_call(
+    provider: str,
+    call: Callable[[], T],
+    priority: int = PRIORITY_BATCH,
+    estimated_tokens: int = 0,
+    hedge: bool = False
+) -> T:
+    """
+    Run an outbound AI call under the provider's rate limits.
+
+    Args:
+        provider: Key into LLM_RATE_LIMITS ('groq', 'groq-asr', 'gemini')
+        call: Performs the request; must be idempotent if hedging is enabled
+        priority: PRIORITY_INTERACTIVE or PRIORITY_BATCH
+        estimated_tokens: Prompt + max output tokens, for the TPM bucket
+        hedge: Hedge attempts slower than LLM_HEDGE_AFTER_SECONDS. Only for
+               short chat replies - long generations would be paid twice.
+    """
+    limiter = get_limiter(provider)
+    if hedge and LLM_HEDGE_AFTER_SECONDS:
+        return _hedged(limiter, call, priority, estimated_tokens, LLM_HEDGE_AFTER_SECONDS)
+    return _call_with_retries(limiter, call, priority, estimated_tokens)
+
+
+def get_llm_scheduler_stats() -> Dict[str, Dict]:
+    """Per-provider call, throttle, retry and hedge counters."""
+    return {
+        name: {**limiter.stats, "wait_seconds": round(limiter.stats["wait_seconds"], 2)}
+        for name, limiter in _limiters.items()
+    }
@@ -0,0 +1,171 @@
+"""
+Local stub of an OpenAI-compatible chat endpoint (the Groq API shape) for
+load-testing utils.llm_scheduler offline.
+
+The stub enforces its own requests-per-minute window and answers 429 with a
+Retry-After header when it is exceeded, with a long-tailed response latency so
+hedging has something to cut.
+
+Usage:
+    python -m utils.llm_stub_server --rpm 30                    # serve on :8765
+    python -m utils.llm_stub_server --rpm 30 --load-test 120    # serve + fire 120 calls
+
+The Groq SDK can also be pointed at it with GROQ_BASE_URL=http://127.0.0.1:8765
+"""
+import argparse
+import collections
+import json
+import random
+import threading
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _StubState:
+    def __init__(self, rpm: int, median_latency: float, tail_ratio: float):
+        self.rpm = rpm
+        self.median_latency = median_latency
+        self.tail_ratio = tail_ratio
+        self.window = collections.deque()
+        self.lock = threading.Lock()
+        self.served = 0
+        self.rejected = 0
+
+    def admit(self) -> float:
+        """Return 0 if the request is admitted, otherwise seconds until it would be."""
+        now = time.monotonic()
+        with self.lock:
+            while self.window and now - self.window[0] > 60:
+                self.window.popleft()
+            if len(self.window) >= self.rpm:
+                self.rejected += 1
+                return 60 - (now - self.window[0])
+            self.window.append(now)
+            self.served += 1
+            return 0.0
+
+    def latency(self) -> float:
+        if random.random() < self.tail_ratio:
+            return self.median_latency * random.uniform(5, 10)
+        return random.lognormvariate(0, 0.3) * self.median_latency
+
+
+def _make_handler(state: _StubState):
+    class StubHandler(BaseHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status: int, body: dict, headers: dict = None):
+            data = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_POST(self):
+            length = int(self.headers.get('Content-Length', 0))
+            request = json.loads(self.rfile.read(length) or b'{}')
+
+            retry_after = state.admit()
+            if retry_after:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "rate_limit_exceeded"}},
+                                {"Retry-After": f"{retry_after:.1f}"})
+                return
+
+            time.sleep(state.latency())
+            self._send_json(200, {
+                "id": f"stub-{state.served}",
+                "object": "chat.completion",
+                "model": request.get("model", "stub"),
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": "stub response"}}],
+                "usage": {"prompt_tokens": 10, "completion_tokens": 2, "total_tokens": 12},
+            })
+
+    return StubHandler
+
+
+class _StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128  # Load tests open many connections at once
+
+
+def start_stub_server(port: int = 8765, rpm: int = 30, median_latency: float = 0.4,
+                      tail_ratio: float = 0.05) -> ThreadingHTTPServer:
+    """Start the stub in a daemon thread and return the server."""
+    state = _StubState(rpm, median_latency, tail_ratio)
+    server = _StubServer(('127.0.0.1', port), _make_handler(state))
+    server.stub_state = state
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    print(f"[STUB] Listening on http://127.0.0.1:{port} (rpm={rpm})")
+    return server
+
+
+def run_load_test(port: int, calls: int, interactive_ratio: float = 0.2, concurrency: int = 16):
+    """Fire `calls` requests at the stub through the scheduler and report latencies."""
+    from utils.llm_scheduler import (
+        PRIORITY_BATCH, PRIORITY_INTERACTIVE, run_llm_call, get_llm_scheduler_stats
+    )
+
+    url = f"http://127.0.0.1:{port}/openai/v1/chat/completions"
+    payload = json.dumps({"model": "stub", "messages": [{"role": "user", "content": "hi"}]}).encode('utf-8')
+
+    def _post():
+        req = urllib.request.Request(url, data=payload, headers={'Content-Type': 'application/json'})
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            return json.loads(resp.read())
+
+    latencies = {PRIORITY_INTERACTIVE: [], PRIORITY_BATCH: []}
+    failures = 0
+
+    def _one(i):
+        nonlocal failures
+        priority = PRIORITY_INTERACTIVE if random.random() < interactive_ratio else PRIORITY_BATCH
+        started = time.monotonic()
+        try:
+            run_llm_call('groq', _post, priority=priority, estimated_tokens=20,
+                         hedge=priority == PRIORITY_INTERACTIVE)
+            latencies[priority].append(time.monotonic() - started)
+        except Exception as e:
+            failures += 1
+            print(f"[LOAD] call {i} failed: {e}")
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        list(executor.map(_one, range(calls)))
+
+    def _p(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+    for priority, name in ((PRIORITY_INTERACTIVE, "interactive"), (PRIORITY_BATCH, "batch")):
+        values = latencies[priority]
+        print(f"[LOAD] {name}: {len(values)} ok, p50={_p(values, 0.5):.2f}s p95={_p(values, 0.95):.2f}s")
+    print(f"[LOAD] failures: {failures}")
+    print(f"[LOAD] scheduler: {get_llm_scheduler_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub LLM endpoint for offline scheduler load tests")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--rpm", type=int, default=30)
+    parser.add_argument("--latency", type=float, default=0.4, help="Median response latency (s)")
+    parser.add_argument("--tail", type=float, default=0.05, help="Fraction of very slow responses")
+    parser.add_argument("--load-test", type=int, default=0, metavar="CALLS")
+    args = parser.parse_args()
+
+    server = start_stub_server(args.port, args.rpm, args.latency, args.tail)
+    if args.load_test:
+        run_load_test(args.port, args.load_test)
+        state = server.stub_state
+        print(f"[STUB] served={state.served} rejected_429={state.rejected}")
+    else:
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,429 @@
+"""
+Compact subtitle track model - the one SRT parser and the subtitle serializers.
+
+A SubtitleTrack keeps its cues in parallel arrays (start and end seconds,
+original cue numbers) plus one text buffer with per-cue offsets, so a
+10k-cue track is a handful of objects instead of 10k dicts. Cue objects
+(__slots__) are created only when a caller iterates or indexes the track.
+
+The parser is a single pass over the lines with one compiled timing regex. It
+accepts standard SRT, SRT without blank lines between cues (AI corrections),
+"HH:MM:SS --> HH:MM:SS" timings and markdown-fenced model output.
+
+Time-range queries (shorts, trimmed renders, review chunks) use an interval
+index built once per track: cues sorted by start plus a running maximum of the
+end times, so a range is found with two binary searches and copied out as
+array slices - no re-parsing, no per-cue scan.
+
+Benchmark:
+    python -m utils.subtitles --benchmark 20000
+"""
+import os
+import re
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+from utils.helpers import format_srt_time, format_ass_time
+
+_TIMING_RE = re.compile(
+    r'(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?\s*-->\s*(\d{1,2}):(\d{2}):(\d{2})(?:[,.](\d{1,3}))?'
+)
+
+
+def _to_seconds(h: str, m: str, s: str, ms: Optional[str]) -> float:
+    seconds = int(h) * 3600 + int(m) * 60 + int(s)
+    if ms:
+        seconds += int(ms.ljust(3, '0')) / 1000
+    return seconds
+
+
+def _word_emphasis(word: str) -> str:
+    """Remotion lyrics emphasis for one word."""
+    if word.endswith("!") or (len(word) > 2 and word == word.upper()):
+        return "hero"
+    if "?" in word or '"' in word:
+        return "strong"
+    return "normal"
+
+
+class Cue:
+    """One subtitle cue (a view materialized from a SubtitleTrack)."""
+
+    __slots__ = ('index', 'start', 'end', 'text')
+
+    def __init__(self, index: int, start: float, end: float, text: str):
+        self.index = index
+        self.start = start
+        self.end = end
+        self.text = text
+
+    def to_dict(self) -> Dict:
+        """The {'index', 'start', 'end', 'text'} entry used across the services."""
+        return {'index': self.index, 'start': self.start, 'end': self.end, 'text': self.text}
+
+    def __repr__(self):
+        return f"Cue({self.index}, {self.start:.3f}-{self.end:.3f}, {self.text!r})"
+
+
+class SubtitleTrack:
+    """Subtitle cues stored as parallel arrays plus a shared text buffer."""
+
+    __slots__ = ('starts', 'ends', 'indexes', '_text', '_offsets', '_by_start', '_max_ends')
+
+    def __init__(self, starts: Iterable[float] = (), ends: Iterable[float] = (),
+                 texts: Iterable[str] = (), indexes: Optional[Iterable[int]] = None):
+        self.starts = array('d', starts)
+        self.ends = array('d', ends)
+        texts = list(texts)
+        self.indexes = array('q', indexes if indexes is not None else range(1, len(texts) + 1))
+        self._text = ''.join(texts)
+        self._offsets = array('q', [0])
+        position = 0
+        for text in texts:
+            position += len(text)
+            self._offsets.append(position)
+
+        self._by_start = None
+        self._max_ends = None
+
+        if not (len(self.starts) == len(self.ends) == len(texts) == len(self.indexes)):
+            raise ValueError("starts, ends, texts and indexes must have the same length")
+
+    @classmethod
+    def _from_arrays(cls, starts: array, ends: array, indexes: array,
+                     text: str, offsets: array) -> 'SubtitleTrack':
+        """Wrap already-built arrays without copying the cue texts."""
+        track = cls.__new__(cls)
+        track.starts, track.ends, track.indexes = starts, ends, indexes
+        track._text, track._offsets = text, offsets
+        track._by_start = None
+        track._max_ends = None
+        return track
+
+    # -------------------------------------------------------------------------
+    # Construction
+    # -------------------------------------------------------------------------
+
+    @classmethod
+    def from_srt(cls, content: str) -> 'SubtitleTrack':
+        """Parse SRT text (standard or without blank lines between cues)."""
+        starts, ends, texts, indexes = [], [], [], []
+        pending_index = None
+        cue = None  # (index, start, end) while collecting text lines
+        text_lines: List[str] = []
+
+        def _finish():
+            text = ' '.join(text_lines).strip()
+            if text:
+                index = cue[0] if cue[0] is not None else len(texts) + 1
+                indexes.append(index)
+                starts.append(cue[1])
+                ends.append(cue[2])
+                texts.append(text)
+
+        for line in content.replace('\r\n', '\n').replace('\r', '\n').split('\n'):
+            stripped = line.strip()
+            match = _TIMING_RE.search(stripped) if '-->' in stripped else None
+
+            if match:
+                if cue is not None:
+                    # No blank line before this cue: its number ended up as text
+                    if text_lines and text_lines[-1].isdigit():
+                        pending_index = int(text_lines.pop())
+                    _finish()
+                g = match.groups()
+                cue = (pending_index, _to_seconds(*g[0:4]), _to_seconds(*g[4:8]))
+                text_lines = []
+                pending_index = None
+            elif cue is None:
+                if stripped.isdigit():
+                    pending_index = int(stripped)
+            elif not stripped:
+                _finish()
+                cue = None
+            elif not stripped.startswith('```'):
+                text_lines.append(stripped)
+
+        if cue is not None:
+            _finish()
+
+        return cls(starts, ends, texts, indexes)
+
+    @classmethod
+    def from_file(cls, srt_path: str) -> 'SubtitleTrack':
+        with open(srt_path, 'r', encoding='utf-8') as f:
+            return cls.from_srt(f.read())
+
+    @classmethod
+    def from_entries(cls, entries: Iterable[Union[Dict, Cue]]) -> 'SubtitleTrack':
+        """Build from {'start', 'end', 'text'} dicts or Cue objects (renumbered from 1)."""
+        starts, ends, texts = [], [], []
+        for entry in entries:
+            if isinstance(entry, Cue):
+                start, end, text = entry.start, entry.end, entry.text
+            else:
+                start, end, text = entry.get('start', 0), entry.get('end', 0), entry.get('text', '')
+            starts.append(float(start))
+            ends.append(float(end))
+            texts.append(str(text))
+        return cls(starts, ends, texts)
+
+    # -------------------------------------------------------------------------
+    # Access
+    # -------------------------------------------------------------------------
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return self._text[self._offsets[i]:self._offsets[i + 1]]
+
+    def texts(self) -> List[str]:
+        offsets, buffer = self._offsets, self._text
+        return [buffer[offsets[i]:offsets[i + 1]] for i in range(len(self))]
+
+    def __getitem__(self, i: int) -> Cue:
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError("cue index out of range")
+        return Cue(self.indexes[i], self.starts[i], self.ends[i], self.text(i))
+
+    def __iter__(self) -> Iterator[Cue]:
+        for i in range(len(self)):
+            yield Cue(self.indexes[i], self.starts[i], self.ends[i], self.text(i))
+
+    @property
+    def duration(self) -> float:
+        return max(self.ends) if len(self) else 0.0
+
+    # -------------------------------------------------------------------------
+    # Time-Range Queries
+    # -------------------------------------------------------------------------
+
+    def _take(self, positions: Iterable[int]) -> 'SubtitleTrack':
+        positions = list(positions)
+        return SubtitleTrack(
+            (self.starts[i] for i in positions),
+            (self.ends[i] for i in positions),
+            (self.text(i) for i in positions),
+            (self.indexes[i] for i in positions)
+        )
+
+    def _slice(self, lo: int, hi: int) -> 'SubtitleTrack':
+        """Cues lo..hi-1 as a new track (array slices, one text-buffer slice)."""
+        base = self._offsets[lo]
+        return SubtitleTrack._from_arrays(
+            self.starts[lo:hi], self.ends[lo:hi], self.indexes[lo:hi],
+            self._text[base:self._offsets[hi]],
+            array('q', (offset - base for offset in self._offsets[lo:hi + 1]))
+        )
+
+    def _index(self) -> Tuple['SubtitleTrack', array]:
+        """(track sorted by start, running maximum of its end times), built once."""
+        if self._by_start is None:
+            starts = self.starts
+            if all(starts[i] <= starts[i + 1] for i in range(len(starts) - 1)):
+                by_start = self
+            else:
+                by_start = self._take(sorted(range(len(self)), key=starts.__getitem__))
+
+            max_ends = array('d')
+            running = float('-inf')
+            for end in by_start.ends:
+                running = max(running, end)
+                max_ends.append(running)
+            by_start._by_start, by_start._max_ends = by_start, max_ends
+            self._by_start, self._max_ends = by_start, max_ends
+        return self._by_start, self._max_ends
+
+    def window(self, start: float, end: float, offset: Optional[float] = None) -> 'SubtitleTrack':
+        """
+        Cues overlapping [start, end), in start order.
+
+        offset: subtract this from every time (clamped at 0) - pass the range
+        start to get a track for a clip that begins at 0.
+        """
+        track, max_ends = self._index()
+        # Cues before lo all end by `start`; cues from hi on start at or after `end`
+        lo = bisect_right(max_ends, start)
+        hi = max(lo, bisect_left(track.starts, end))
+        if all(track.ends[i] > start for i in range(lo, hi)):
+            result = track._slice(lo, hi)
+        else:
+            # A long cue raised the running maximum - drop the ones ending early
+            result = track._take(i for i in range(lo, hi) if track.ends[i] > start)
+        return result.shifted(offset) if offset else result
+
+    def starting_in(self, start: float, end: float) -> 'SubtitleTrack':
+        """Cues whose start lies in [start, end) - partitions the track without repeats."""
+        track, _ = self._index()
+        lo = bisect_left(track.starts, start)
+        return track._slice(lo, max(lo, bisect_left(track.starts, end)))
+
+    def shifted(self, offset: float) -> 'SubtitleTrack':
+        """All times moved earlier by `offset` (clamped at 0); texts are shared."""
+        return SubtitleTrack._from_arrays(
+            array('d', (max(0.0, t - offset) for t in self.starts)),
+            array('d', (max(0.0, t - offset) for t in self.ends)),
+            self.indexes, self._text, self._offsets
+        )
+
+    # -------------------------------------------------------------------------
+    # Serializers
+    # -------------------------------------------------------------------------
+
+    def to_entries(self, renumber: bool = False) -> List[Dict]:
+        """List of {'index', 'start', 'end', 'text'} dicts."""
+        entries = [cue.to_dict() for cue in self]
+        if renumber:
+            for i, entry in enumerate(entries, 1):
+                entry['index'] = i
+        return entries
+
+    def to_srt(self) -> str:
+        """SRT text, cues renumbered from 1."""
+        return ''.join(
+            f"{i}\n{format_srt_time(self.starts[i - 1])} --> {format_srt_time(self.ends[i - 1])}\n{self.text(i - 1)}\n\n"
+            for i in range(1, len(self) + 1)
+        )
+
+    def write_srt(self, output_path: str):
+        with open(output_path, 'w', encoding='utf-8', newline='\n') as f:
+            f.write(self.to_srt())
+
+    def to_webvtt(self) -> str:
+        """WebVTT text (for <track> elements in the browser)."""
+        parts = ["WEBVTT\n\n"]
+        for i in range(len(self)):
+            start = format_srt_time(self.starts[i]).replace(',', '.')
+            end = format_srt_time(self.ends[i]).replace(',', '.')
+            parts.append(f"{i + 1}\n{start} --> {end}\n{self.text(i)}\n\n")
+        return ''.join(parts)
+
+    def to_ass_events(self, style: str = "Default") -> str:
+        """ASS [Events] Dialogue lines (the caller supplies the header and styles)."""
+        return ''.join(
+            f"Dialogue: 0,{format_ass_time(self.starts[i])},{format_ass_time(self.ends[i])},"
+            f"{style},,0,0,0,,{self.text(i).replace(chr(10), chr(92) + 'N')}\n"
+            for i in range(len(self))
+        )
+
+    def to_lyrics_data(self) -> Dict:
+        """Remotion LyricsData: lines with evenly timed words and emphasis."""
+        lines = []
+        for i in range(len(self)):
+            words = self.text(i).split()
+            if not words:
+                continue
+            start, end = self.starts[i], self.ends[i]
+            word_duration = (end - start) / len(words)
+            lines.append({
+                "lineStart": round(start, 3),
+                "lineEnd": round(end, 3),
+                "words": [
+                    {
+                        "word": word,
+                        "start": round(start + idx * word_duration, 3),
+                        "end": round(start + (idx + 1) * word_duration, 3),
+                        "emphasis": _word_emphasis(word),
+                    }
+                    for idx, word in enumerate(words)
+                ],
+            })
+        return {"lines": lines, "duration": lines[-1]["lineEnd"] if lines else 0}
+
+
+# =============================================================================
+# Shared Tracks
+# =============================================================================
+
+TRACK_CACHE_SIZE = 16
+
+_track_cache: Dict[str, Tuple[Tuple[int, int], SubtitleTrack]] = {}
+_track_cache_lock = threading.Lock()
+
+
+def load_track(srt_path: str) -> SubtitleTrack:
+    """
+    Parsed track for an SRT file, shared until the file changes on disk.
+
+    Callers slicing one transcript many times (one short per viral moment)
+    parse it once. The returned track is shared - do not modify its arrays.
+    """
+    stat = os.stat(srt_path)
+    key, version = os.path.abspath(srt_path), (stat.st_mtime_ns, stat.st_size)
+    with _track_cache_lock:
+        cached = _track_cache.get(key)
+        if cached and cached[0] == version:
+            return cached[1]
+
+    track = SubtitleTrack.from_file(srt_path)
+    with _track_cache_lock:
+        _track_cache.pop(key, None)
+        while len(_track_cache) >= TRACK_CACHE_SIZE:
+            _track_cache.pop(next(iter(_track_cache)))
+        _track_cache[key] = (version, track)
+    return track
+
+
+# =============================================================================
+# Benchmark
+# =============================================================================
+
+def _benchmark(cues: int):
+    import sys
+    import time
+    import tracemalloc
+
+    sample = SubtitleTrack(
+        (i * 2.0 for i in range(cues)),
+        (i * 2.0 + 1.8 for i in range(cues)),
+        (f"שורת כתובית מספר {i} עם כמה מילים" for i in range(cues))
+    ).to_srt()
+    print(f"[BENCH] {cues} cues, {len(sample) / 1024:.0f} KB of SRT")
+
+    def _timed(name, fn, repeat=5):
+        best = float('inf')
+        for _ in range(repeat):
+            started = time.perf_counter()
+            result = fn()
+            best = min(best, time.perf_counter() - started)
+        print(f"[BENCH] {name:<16} {best * 1000:8.1f} ms  ({cues / best / 1000:.0f}k cues/s)")
+        return result
+
+    track = _timed("parse", lambda: SubtitleTrack.from_srt(sample))
+    _timed("to_srt", track.to_srt)
+    _timed("to_webvtt", track.to_webvtt)
+    _timed("to_ass_events", track.to_ass_events)
+    _timed("to_lyrics_data", track.to_lyrics_data)
+    _timed("to_entries", track.to_entries)
+
+    track.window(0, 1)  # Build the interval index outside the timing
+    starts = [cues * 2.0 * k / 100 for k in range(100)]
+    started = time.perf_counter()
+    for start in starts:
+        track.window(start, start + 30, offset=start)
+    print(f"[BENCH] {'window (30s)':<16} {(time.perf_counter() - started) * 10:8.3f} ms per short")
+
+    tracemalloc.start()
+    kept = SubtitleTrack.from_srt(sample)
+    track_bytes = tracemalloc.get_traced_memory()[0]
+    del kept
+    baseline = tracemalloc.get_traced_memory()[0]
+    kept = track.to_entries()
+    dicts_bytes = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del kept
+    print(f"[BENCH] retained memory: track {track_bytes / 1024:.0f} KB, dict entries {dicts_bytes / 1024:.0f} KB")
+    print(f"[BENCH] python {sys.version.split()[0]}")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Subtitle track benchmarks")
+    parser.add_argument("--benchmark", type=int, default=10000, metavar="CUES")
+    _benchmark(parser.parse_args().benchmark)